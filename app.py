@@ -1,29 +1,152 @@
+# En premier : la durée des imports figure dans le rapport de démarrage
+from modules.startup import StartupReport, process_memory
+
 import os
+import json
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 
-from modules.models import ChatRequest, ChatResponse
-from modules.vectorizer import Vectorizer
+from modules.models import (
+    ChatRequest,
+    ChatResponse,
+    ChatBatchRequest,
+    ChatBatchResponse,
+)
+from modules.vectorizer import Vectorizer, EmbeddingBatcher
 from modules.retriever import Retriever
-from modules.generator import generate_response
+from modules.reranker import CrossEncoderReranker
+from modules.generator import ResponseGenerator, ERROR_RESPONSE
+from modules.cache import SemanticCache, article_key, read_index_version
+from modules.domain import DomainGate
 from config import (
     INDEX_PATH,
     METADATA_PATH,
+    LEXICAL_INDEX_PATH,
+    REFERENCE_GRAPH_PATH,
+    HIERARCHY_PATH,
+    SENTENCE_INDEX_PATH,
+    DOMAIN_GATE_PATH,
+    INDEX_VERSION_PATH,
+    SEMANTIC_CACHE_PATH,
+    SEMANTIC_CACHE_ENABLED,
+    SEMANTIC_CACHE_SIZE,
+    SEMANTIC_CACHE_THRESHOLD,
+    SEMANTIC_CACHE_TTL,
+    SEMANTIC_CACHE_PERSIST,
     EMBEDDING_MODEL,
+    EMBEDDING_BACKEND,
+    ONNX_MODEL_DIR,
+    ONNX_QUANTIZED,
+    ONNX_THREADS,
+    QUERY_CACHE_SIZE,
+    QUERY_BATCHING_ENABLED,
+    QUERY_BATCH_MAX_SIZE,
+    QUERY_BATCH_MAX_WAIT,
     TOP_K_RESULTS,
+    INDEX_TYPE,
+    INDEX_PARAMS,
+    RESCORE_FACTOR,
+    RETRIEVAL_MODE,
+    HYBRID_CANDIDATES,
+    RRF_K,
+    HIERARCHICAL_SEARCH,
+    HIERARCHY_TOP_CHAPTERS,
+    HIERARCHY_TOP_SECTIONS,
+    RESULT_DIVERSIFICATION,
+    MMR_LAMBDA,
+    MMR_FETCH_FACTOR,
+    FILTER_EXACT_SEARCH_MAX,
+    RERANKER_ENABLED,
+    RERANKER_MODEL,
+    RERANK_CANDIDATES,
+    RERANK_BATCH_SIZE,
+    RERANK_CACHE_SIZE,
+    RERANK_TIME_BUDGET,
+    DOMAIN_GATE_ENABLED,
+    MIN_SIMILARITY_SCORE,
+    ANSWERABLE_SIMILARITY_SCORE,
+    ARTICLE_FAST_PATH,
+    REFERENCE_EXPANSION,
+    REFERENCE_CONTEXT_BUDGET,
+    REFERENCE_MAX_ARTICLES,
     GEMINI_API_KEY,
+    GEMINI_MODEL,
+    GEMINI_TRANSPORT,
+    BATCH_MAX_QUESTIONS,
+    BATCH_GENERATION_CONCURRENCY,
+    CPU_THREAD_POOL_SIZE,
+    LLM_MAX_CONCURRENCY,
+    WARM_UP_ENABLED,
+    INDEX_MMAP,
+    API_PRODUCTION,
+    API_WORKERS,
 )
 
 # Variables globales pour les services
 vectorizer = None
 retriever = None
+generator = None
+semantic_cache = None
+reranker = None
+domain_gate = None
+# File de regroupement des vectorisations de requêtes concurrentes
+embedding_batcher = None
+# Pool de threads borné pour les étapes CPU (vectorisation, recherche FAISS)
+cpu_executor = None
+# Limite globale du nombre d'appels Gemini simultanés
+llm_semaphore = None
+# Durées des phases de démarrage ; ready passe à True après le préchauffage
+startup_report = StartupReport()
+warm_up_task = None
+
+# Question utilisée pour le préchauffage (encodage, recherche, ré-ordonnancement)
+WARM_UP_QUERY = "Quels sont les droits des personnes concernées par un traitement de données personnelles ?"
+
+HORS_SUJET_RESPONSE = """
+        Je suis un assistant spécialisé dans la loi sénégalaise sur la protection des données personnelles (Loi n° 2008-12 du 25 janvier 2008).
+
+        Votre question ne semble pas porter sur ce sujet. Je peux vous aider avec des questions comme :
+        - Qu'est-ce que la Commission des Données Personnelles (CDP) et quelles sont ses missions ?,
+        - Quels sont les droits des personnes concernées par un traitement de données ?
+        - Comment la Commission des Données Personnelles (CDP) est-elle organisée ?
+        - Quelles sont les formalités préalables à un traitement de données ?
+        - Quelles sont les obligations de sécurité pour un responsable de traitement ?
+        - Comment les transferts internationaux de données sont-ils encadrés au Sénégal ?
+
+        Je vous invite à poser question en lien avec cette législation.
+        """
+
+# Message pour les questions pertinentes sans réponse
+PERTINENT_SANS_REPONSE = """
+        Votre question sur la protection des données personnelles au Sénégal est pertinente, mais je ne dispose pas d'informations suffisantes dans ma base de connaissances pour y répondre avec précision.
+
+        La loi n° 2008-12 du 25 janvier 2008 comporte de nombreuses dispositions, et il est possible que votre question concerne :
+        - Des aspects spécifiques non couverts par ma base documentaire actuelle
+        - Des détails d'application pratique de la loi
+        - Des modifications législatives récentes
+        - Des interprétations jurisprudentielles particulières
+
+        Puis-je vous suggérer de :
+        1. Reformuler votre question différemment
+        2. Me demander des informations sur un sujet connexe
+        3. Consulter directement le site de la Commission des Données Personnelles du Sénégal pour des informations plus spécifiques
+
+        Je reste à votre disposition pour répondre à d'autres questions sur cette législation.
+        """
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Initialisation: code exécuté au démarrage de l'application
-    global vectorizer, retriever
+    global vectorizer, retriever, generator, semantic_cache, reranker, domain_gate
+    global embedding_batcher, warm_up_task
+    global cpu_executor, llm_semaphore
+    startup_report.mark("imports")
 
     # Vérification de l'existence de l'index
     if not os.path.exists(INDEX_PATH) or not os.path.exists(METADATA_PATH):
@@ -32,16 +155,122 @@ async def lifespan(app: FastAPI):
         )
 
     # Initialisation du vectorizer et du retriever
-    vectorizer = Vectorizer(model_name=EMBEDDING_MODEL)
-    retriever = Retriever()
-    retriever.load_index(INDEX_PATH, METADATA_PATH)
+    vectorizer = Vectorizer(
+        model_name=EMBEDDING_MODEL,
+        query_cache_size=QUERY_CACHE_SIZE,
+        backend=EMBEDDING_BACKEND,
+        onnx_dir=ONNX_MODEL_DIR,
+        onnx_quantized=ONNX_QUANTIZED,
+        onnx_threads=ONNX_THREADS,
+    )
+    startup_report.mark("modèle d'embeddings")
+    if QUERY_BATCHING_ENABLED:
+        embedding_batcher = EmbeddingBatcher(
+            vectorizer,
+            max_batch_size=QUERY_BATCH_MAX_SIZE,
+            max_wait=QUERY_BATCH_MAX_WAIT,
+        )
+    if RERANKER_ENABLED:
+        reranker = CrossEncoderReranker(
+            RERANKER_MODEL,
+            batch_size=RERANK_BATCH_SIZE,
+            cache_size=RERANK_CACHE_SIZE,
+            time_budget=RERANK_TIME_BUDGET,
+        )
+        startup_report.mark("modèle de ré-ordonnancement")
+    retriever = Retriever(
+        index_type=INDEX_TYPE,
+        index_params=INDEX_PARAMS,
+        retrieval_mode=RETRIEVAL_MODE,
+        hybrid_candidates=HYBRID_CANDIDATES,
+        rrf_k=RRF_K,
+        reference_budget=REFERENCE_CONTEXT_BUDGET if REFERENCE_EXPANSION else 0,
+        max_reference_articles=REFERENCE_MAX_ARTICLES,
+        diversify=RESULT_DIVERSIFICATION,
+        mmr_lambda=MMR_LAMBDA,
+        mmr_fetch_factor=MMR_FETCH_FACTOR,
+        filter_exact_max=FILTER_EXACT_SEARCH_MAX,
+        reranker=reranker,
+        rerank_candidates=RERANK_CANDIDATES,
+        rescore_factor=RESCORE_FACTOR,
+        hierarchical=HIERARCHICAL_SEARCH,
+        top_chapters=HIERARCHY_TOP_CHAPTERS,
+        top_sections=HIERARCHY_TOP_SECTIONS,
+    )
+    retriever.load_index(INDEX_PATH, METADATA_PATH, mmap=INDEX_MMAP)
+    startup_report.mark("index FAISS et magasin")
+    if RETRIEVAL_MODE == "hybrid":
+        if os.path.exists(LEXICAL_INDEX_PATH):
+            retriever.load_lexical_index(LEXICAL_INDEX_PATH)
+        else:
+            print("Index BM25 introuvable: recherche dense uniquement")
+    if RETRIEVAL_MODE == "sentence":
+        if os.path.exists(SENTENCE_INDEX_PATH):
+            retriever.load_sentence_index(SENTENCE_INDEX_PATH)
+        else:
+            print("Index des phrases introuvable: recherche dense uniquement")
+    if HIERARCHICAL_SEARCH:
+        if os.path.exists(HIERARCHY_PATH):
+            retriever.load_hierarchy(HIERARCHY_PATH)
+        else:
+            print("Hiérarchie introuvable: recherche sur l'ensemble des chunks")
+    if REFERENCE_EXPANSION:
+        if os.path.exists(REFERENCE_GRAPH_PATH):
+            retriever.load_reference_graph(REFERENCE_GRAPH_PATH)
+        else:
+            print("Graphe des renvois introuvable: pas d'expansion du contexte")
+    if DOMAIN_GATE_ENABLED:
+        if os.path.exists(DOMAIN_GATE_PATH):
+            domain_gate = DomainGate.load(DOMAIN_GATE_PATH)
+        else:
+            print("Filtre de domaine introuvable: seuils de pertinence par défaut")
+    startup_report.mark("index auxiliaires")
+
+    # Client Gemini unique, réutilisé par toutes les requêtes
+    generator = ResponseGenerator(
+        api_key=GEMINI_API_KEY, model_name=GEMINI_MODEL, transport=GEMINI_TRANSPORT
+    )
+    startup_report.mark("client Gemini")
+
+    # Cache sémantique des réponses, lié à la version courante de l'index
+    if SEMANTIC_CACHE_ENABLED:
+        semantic_cache = SemanticCache(
+            dimension=retriever.store.vectors.shape[1],
+            capacity=SEMANTIC_CACHE_SIZE,
+            similarity_threshold=SEMANTIC_CACHE_THRESHOLD,
+            ttl_seconds=SEMANTIC_CACHE_TTL,
+            persist_path=SEMANTIC_CACHE_PATH if SEMANTIC_CACHE_PERSIST else None,
+        )
+        semantic_cache.bind_index_version(read_index_version(INDEX_VERSION_PATH))
+        semantic_cache.load()
+        startup_report.mark("cache sémantique")
+
+    cpu_executor = ThreadPoolExecutor(
+        max_workers=CPU_THREAD_POOL_SIZE, thread_name_prefix="rag-cpu"
+    )
+    llm_semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
 
     print("Services initialisés avec succès")
 
+    # Préchauffage en arrière-plan : /health répond déjà, /ready après le préchauffage
+    if WARM_UP_ENABLED:
+        warm_up_task = asyncio.create_task(run_cpu_bound(warm_up))
+    else:
+        finish_startup()
+
     yield  # Ceci est où l'application s'exécute
 
     # Nettoyage: code exécuté à l'arrêt de l'application
     print("Arrêt des services...")
+    if warm_up_task is not None:
+        warm_up_task.cancel()
+    cpu_executor.shutdown(wait=False)
+    if embedding_batcher is not None:
+        embedding_batcher.close()
+    if reranker is not None:
+        reranker.close()
+    if semantic_cache is not None:
+        semantic_cache.save()
     # Libérer les ressources si nécessaire
     # Par exemple: fermer les connexions, libérer la mémoire, etc.
 
@@ -64,6 +293,171 @@ app.add_middleware(
 )
 
 
+async def run_cpu_bound(func, *args, **kwargs):
+    """Exécute une étape bloquante (CPU) dans le pool de threads dédié"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(cpu_executor, partial(func, *args, **kwargs))
+
+
+def finish_startup():
+    startup_report.ready = True
+    startup_report.print_report()
+    memory = process_memory()
+    if memory:
+        print(
+            f"Mémoire du worker {memory['pid']}: RSS {memory['rss_mb']} Mo, "
+            f"PSS {memory['pss_mb']} Mo (partagée {memory['shared_mb']} Mo)"
+        )
+
+
+def warm_up():
+    """
+    Passes factices d'encodage, de recherche et de ré-ordonnancement : la
+    première vraie requête ne paie ni l'initialisation paresseuse des modèles
+    ni le chargement à la demande des pages de l'index projetées en mémoire.
+    Le cache des embeddings de requêtes n'est pas alimenté.
+    """
+    try:
+        with startup_report.phase("préchauffage encodage"):
+            query_embedding = vectorizer.encode_texts([WARM_UP_QUERY])[0]
+            vectorizer.encode_texts([WARM_UP_QUERY, WARM_UP_QUERY[:40]])
+        with startup_report.phase("préchauffage recherche"):
+            if domain_gate is not None:
+                domain_gate.scores(query_embedding)
+            retriever.retrieve_relevant_chunks(
+                query_embedding, top_k=TOP_K_RESULTS, query_text=WARM_UP_QUERY
+            )
+    except Exception as e:
+        print(f"Erreur lors du préchauffage: {str(e)}")
+    finish_startup()
+
+
+async def embed_query(query):
+    """
+    Vectorisation d'une requête. Avec la file de regroupement, l'attente du
+    lot n'occupe aucun thread du pool CPU.
+    """
+    if embedding_batcher is None:
+        return await run_cpu_bound(vectorizer.vectorize_query, query)
+    return await asyncio.wrap_future(embedding_batcher.submit(query))
+
+
+async def lookup_cached_answer(query_embedding, retrieved_chunks):
+    """Cherche une réponse déjà générée pour une question équivalente"""
+    if semantic_cache is None or query_embedding is None:
+        return None
+    return await run_cpu_bound(
+        semantic_cache.lookup, query_embedding, article_key(retrieved_chunks)
+    )
+
+
+def remember_answer(query_embedding, retrieved_chunks, response_text):
+    """Met en cache une réponse générée (hors erreurs de génération)"""
+    if semantic_cache is None or query_embedding is None:
+        return
+    if response_text != ERROR_RESPONSE:
+        semantic_cache.store(
+            query_embedding, article_key(retrieved_chunks), response_text
+        )
+
+
+async def generate_answer(query, query_embedding, retrieved_chunks):
+    """
+    Appel asynchrone à Gemini, borné par la limite globale de concurrence.
+    Le cache sémantique est consulté avant l'appel et alimenté après
+    (sauf pour les accès directs par article, qui n'ont pas d'embedding).
+    """
+    cached = await lookup_cached_answer(query_embedding, retrieved_chunks)
+    if cached is not None:
+        return cached
+
+    async with llm_semaphore:
+        response_text = await generator.generate_async(query, retrieved_chunks)
+
+    remember_answer(query_embedding, retrieved_chunks, response_text)
+    return response_text
+
+
+def resolve_article_reference(query, filters=None):
+    """
+    Passages des articles cités explicitement dans la question, ou None.
+    Cette recherche directe évite la vectorisation et la recherche FAISS.
+    """
+    if not ARTICLE_FAST_PATH:
+        return None
+    return retriever.retrieve_by_article_reference(
+        query, max_articles=TOP_K_RESULTS, filters=filters
+    )
+
+
+def build_sources(retrieved_chunks):
+    """Prépare la liste des sources renvoyée au client"""
+    sources = []
+    for chunk in retrieved_chunks:
+        source = {
+            "chapitre": chunk["metadata"].get("chapter", ""),
+            "section": chunk["metadata"].get("section", ""),
+            "article": chunk["metadata"].get("article", ""),
+            "score": float(chunk.get("similarity_score", 0)),
+            # "relevance": chunk.get("relevance", 0),
+        }
+        sources.append(source)
+    return sources
+
+
+def format_sse(event: str, data) -> str:
+    """Formate un événement Server-Sent Events"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def relevance_thresholds():
+    """
+    Seuils de pertinence des passages (hors sujet, sans réponse) : calibrés
+    avec l'index par indexer.py, ou valeurs par défaut de config.py.
+    """
+    if domain_gate is not None:
+        return domain_gate.min_similarity_score, domain_gate.answerable_score
+    return MIN_SIMILARITY_SCORE, ANSWERABLE_SIMILARITY_SCORE
+
+
+def is_off_topic(query_embedding):
+    """Filtre de domaine : quelques produits scalaires, avant toute recherche"""
+    return domain_gate is not None and not domain_gate.accepts(query_embedding)
+
+
+def off_topic_response():
+    return ChatResponse(response=HORS_SUJET_RESPONSE, sources=[])
+
+
+def check_relevance(retrieved_chunks):
+    """
+    Vérifie la pertinence des passages récupérés.
+
+    Returns:
+        ChatResponse de repli si les passages ne permettent pas de répondre,
+        None si la génération peut avoir lieu.
+    """
+    min_similarity_score, answerable_score = relevance_thresholds()
+
+    # Récupérer le meilleur score de similarité (en mode hybride, le premier
+    # passage n'est pas forcément le plus proche sémantiquement)
+    best_score = max(
+        (chunk.get("similarity_score", 0) for chunk in retrieved_chunks), default=0
+    )
+
+    # Vérifier si les passages récupérés sont suffisamment pertinents
+    # Sous le seuil hors sujet, considérer qu'aucun passage n'est pertinent
+    if not retrieved_chunks or best_score < min_similarity_score:
+        return off_topic_response()
+    # Sous le seuil de réponse, la question relève du domaine mais le texte n'y répond pas
+    if best_score < answerable_score:
+        return ChatResponse(
+            response=PERTINENT_SANS_REPONSE,
+            sources=[],
+        )
+    return None
+
+
 @app.get("/")
 async def root():
     """Endpoint de base"""
@@ -78,96 +472,242 @@ async def health_check():
     return {"status": "ok", "version": "1.0.0"}
 
 
+@app.get("/ready")
+async def readiness_check():
+    """Disponibilité du service : 503 tant que le préchauffage n'est pas terminé"""
+    if not startup_report.ready:
+        return JSONResponse(status_code=503, content={"status": "warming_up"})
+    return {"status": "ready", "startup": startup_report.as_dict()}
+
+
+@app.get("/metrics")
+async def metrics():
+    """Compteurs de fonctionnement du service"""
+    return {
+        "semantic_cache": semantic_cache.stats() if semantic_cache else None,
+        "query_cache": (
+            vectorizer.query_cache.stats()
+            if vectorizer and vectorizer.query_cache
+            else None
+        ),
+        "reranker": reranker.stats() if reranker else None,
+        "domain_gate": domain_gate.stats() if domain_gate else None,
+        "embedding_batcher": embedding_batcher.stats() if embedding_batcher else None,
+        "startup": startup_report.as_dict(),
+        "memory": process_memory(),
+    }
+
+
 @app.post("/chat", response_model=ChatResponse)
 async def chat(request: ChatRequest):
     """Endpoint principal pour les requêtes de chat"""
     try:
-        # Vectorisation de la requête
-        query_embedding = vectorizer.vectorize_query(request.message)
-
-        # Récupération des passages pertinents
-        retrieved_chunks = retriever.retrieve_relevant_chunks(
-            query_embedding, top_k=TOP_K_RESULTS
-        )
-
-        HORS_SUJET_RESPONSE = """
-        Je suis un assistant spécialisé dans la loi sénégalaise sur la protection des données personnelles (Loi n° 2008-12 du 25 janvier 2008).
-
-        Votre question ne semble pas porter sur ce sujet. Je peux vous aider avec des questions comme :
-        - Qu'est-ce que la Commission des Données Personnelles (CDP) et quelles sont ses missions ?,
-        - Quels sont les droits des personnes concernées par un traitement de données ?
-        - Comment la Commission des Données Personnelles (CDP) est-elle organisée ?
-        - Quelles sont les formalités préalables à un traitement de données ?
-        - Quelles sont les obligations de sécurité pour un responsable de traitement ?
-        - Comment les transferts internationaux de données sont-ils encadrés au Sénégal ?
+        filters = request.search_filters()
+
+        # Article cité explicitement : accès direct, sans vectorisation
+        query_embedding = None
+        retrieved_chunks = resolve_article_reference(request.message, filters)
+
+        if retrieved_chunks is None:
+            # Vectorisation de la requête
+            query_embedding = await embed_query(request.message)
+
+            # Question hors du domaine : ni recherche ni appel à Gemini
+            if is_off_topic(query_embedding):
+                return off_topic_response()
+
+            # Récupération des passages pertinents
+            retrieved_chunks = await run_cpu_bound(
+                retriever.retrieve_relevant_chunks,
+                query_embedding,
+                top_k=TOP_K_RESULTS,
+                min_similarity_score=relevance_thresholds()[0],
+                query_text=request.message,
+                filters=filters,
+            )
 
-        Je vous invite à poser question en lien avec cette législation.
-        """
+            fallback = check_relevance(retrieved_chunks)
+            if fallback is not None:
+                return fallback
 
-        # Message pour les questions pertinentes sans réponse
-        PERTINENT_SANS_REPONSE = """
-        Votre question sur la protection des données personnelles au Sénégal est pertinente, mais je ne dispose pas d'informations suffisantes dans ma base de connaissances pour y répondre avec précision.
+        # Génération de la réponse
+        response_text = await generate_answer(
+            request.message, query_embedding, retrieved_chunks
+        )
 
-        La loi n° 2008-12 du 25 janvier 2008 comporte de nombreuses dispositions, et il est possible que votre question concerne :
-        - Des aspects spécifiques non couverts par ma base documentaire actuelle
-        - Des détails d'application pratique de la loi
-        - Des modifications législatives récentes
-        - Des interprétations jurisprudentielles particulières
+        return ChatResponse(
+            response=response_text, sources=build_sources(retrieved_chunks)
+        )
 
-        Puis-je vous suggérer de :
-        1. Reformuler votre question différemment
-        2. Me demander des informations sur un sujet connexe
-        3. Consulter directement le site de la Commission des Données Personnelles du Sénégal pour des informations plus spécifiques
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"Erreur lors du traitement de la requête: {str(e)}"
+        )
 
-        Je reste à votre disposition pour répondre à d'autres questions sur cette législation.
-        """
 
-        # Récupérer le meilleur score de similarité
-        best_score = retrieved_chunks[0].get("similarity_score", 0)
+@app.post("/chat/batch", response_model=ChatBatchResponse)
+async def chat_batch(request: ChatBatchRequest):
+    """
+    Traitement groupé de plusieurs questions.
+    Toutes les questions sont vectorisées en un seul appel au modèle et
+    recherchées en une seule requête matricielle sur l'index FAISS ; la
+    génération est ensuite parallélisée avec une concurrence bornée.
+    """
+    if len(request.messages) > BATCH_MAX_QUESTIONS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Trop de questions dans le lot (maximum {BATCH_MAX_QUESTIONS})",
+        )
+    if not request.messages:
+        return ChatBatchResponse(responses=[])
 
-        # Vérifier si les passages récupérés sont suffisamment pertinents
-        # Si le meilleur score de similarité est inférieur à 0.5, considérer qu'aucun passage n'est pertinent
-        if not retrieved_chunks or best_score < 0.5:
-            return ChatResponse(
-                response=HORS_SUJET_RESPONSE,
-                sources=[],
+    try:
+        # Les questions citant un article sont résolues directement
+        filters = request.search_filters()
+        batch_chunks = [
+            resolve_article_reference(message, filters) for message in request.messages
+        ]
+        query_embeddings = [None] * len(request.messages)
+        pending = [i for i, chunks in enumerate(batch_chunks) if chunks is None]
+
+        # Vectorisation et recherche groupées des autres questions
+        if pending:
+            pending_messages = [request.messages[i] for i in pending]
+            pending_embeddings = await run_cpu_bound(
+                vectorizer.vectorize_queries, pending_messages
             )
-        # Si le meilleur score de similarité est inférieur à 0.6, considérer qu'aucun passage n'est pertinent
-        if retrieved_chunks[0].get("similarity_score", 0) < 0.6:
+            for i, query_embedding in zip(pending, pending_embeddings):
+                query_embeddings[i] = query_embedding
+                # Questions hors du domaine : aucun passage (réponse hors sujet)
+                batch_chunks[i] = []
+
+            if domain_gate is not None:
+                in_domain = domain_gate.accepts_batch(pending_embeddings).tolist()
+            else:
+                in_domain = [True] * len(pending)
+            searched = [j for j, accepted in enumerate(in_domain) if accepted]
+            if searched:
+                pending_chunks = await run_cpu_bound(
+                    retriever.retrieve_relevant_chunks_batch,
+                    pending_embeddings[searched],
+                    top_k=TOP_K_RESULTS,
+                    min_similarity_score=relevance_thresholds()[0],
+                    query_texts=[pending_messages[j] for j in searched],
+                    filters=filters,
+                )
+                for j, retrieved_chunks in zip(searched, pending_chunks):
+                    batch_chunks[pending[j]] = retrieved_chunks
+
+        semaphore = asyncio.Semaphore(BATCH_GENERATION_CONCURRENCY)
+
+        async def answer(message, query_embedding, retrieved_chunks):
+            if query_embedding is not None:
+                fallback = check_relevance(retrieved_chunks)
+                if fallback is not None:
+                    return fallback
+            async with semaphore:
+                response_text = await generate_answer(
+                    message, query_embedding, retrieved_chunks
+                )
             return ChatResponse(
-                response=PERTINENT_SANS_REPONSE,
-                sources=[],
+                response=response_text, sources=build_sources(retrieved_chunks)
             )
 
-        # Génération de la réponse
-        response_text = generate_response(
-            query=request.message,
-            retrieved_chunks=retrieved_chunks,
-            api_key=GEMINI_API_KEY,
+        # asyncio.gather conserve l'ordre des questions
+        responses = await asyncio.gather(
+            *[
+                answer(message, query_embedding, retrieved_chunks)
+                for message, query_embedding, retrieved_chunks in zip(
+                    request.messages, query_embeddings, batch_chunks
+                )
+            ]
         )
+        return ChatBatchResponse(responses=list(responses))
 
-        # Préparation des sources
-        sources = []
-        for chunk in retrieved_chunks:
-            source = {
-                "chapitre": chunk["metadata"].get("chapter", ""),
-                "section": chunk["metadata"].get("section", ""),
-                "article": chunk["metadata"].get("article", ""),
-                "score": chunk.get("similarity_score", 0),
-                # "relevance": chunk.get("relevance", 0),
-            }
-            sources.append(source)
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"Erreur lors du traitement du lot: {str(e)}"
+        )
 
-        return ChatResponse(response=response_text, sources=sources)
 
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """
+    Variante en flux (Server-Sent Events) de /chat.
+    Les sources sont envoyées dès la fin de la recherche (événement "sources"),
+    puis la réponse est transmise fragment par fragment (événements "token")
+    jusqu'à l'événement final "done".
+    """
+    try:
+        filters = request.search_filters()
+        query_embedding = None
+        fallback = None
+        retrieved_chunks = resolve_article_reference(request.message, filters)
+        if retrieved_chunks is None:
+            query_embedding = await embed_query(request.message)
+            if is_off_topic(query_embedding):
+                fallback = off_topic_response()
+            else:
+                retrieved_chunks = await run_cpu_bound(
+                    retriever.retrieve_relevant_chunks,
+                    query_embedding,
+                    top_k=TOP_K_RESULTS,
+                    min_similarity_score=relevance_thresholds()[0],
+                    query_text=request.message,
+                    filters=filters,
+                )
+                fallback = check_relevance(retrieved_chunks)
     except Exception as e:
         raise HTTPException(
             status_code=500, detail=f"Erreur lors du traitement de la requête: {str(e)}"
         )
 
+    async def event_stream():
+        if fallback is not None:
+            yield format_sse("sources", [])
+            yield format_sse("token", {"text": fallback.response})
+            yield format_sse("done", {})
+            return
+
+        yield format_sse("sources", build_sources(retrieved_chunks))
+        try:
+            cached = await lookup_cached_answer(query_embedding, retrieved_chunks)
+            if cached is not None:
+                yield format_sse("token", {"text": cached})
+                yield format_sse("done", {})
+                return
+
+            parts = []
+            async with llm_semaphore:
+                async for text in generator.stream_async(
+                    request.message, retrieved_chunks
+                ):
+                    parts.append(text)
+                    yield format_sse("token", {"text": text})
+            if ERROR_RESPONSE not in parts:
+                remember_answer(
+                    query_embedding, retrieved_chunks, "".join(parts).strip()
+                )
+        except Exception as e:
+            yield format_sse("error", {"detail": str(e)})
+        yield format_sse("done", {})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 
 # Point d'entrée pour uvicorn
 if __name__ == "__main__":
     import uvicorn
 
-    uvicorn.run("app:app", host="0.0.0.0", port=8000, reload=True)
+    # Production : plusieurs workers, sans rechargement automatique
+    uvicorn.run(
+        "app:app",
+        host="0.0.0.0",
+        port=int(os.getenv("PORT", 8000)),
+        reload=not API_PRODUCTION,
+        workers=API_WORKERS if API_PRODUCTION else None,
+    )
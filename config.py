@@ -15,16 +15,141 @@ INDEX_DIR = os.path.join(DATA_DIR, "index")
 LAW_STRUCTURE_PATH = os.path.join(PROCESSED_DIR, "law_structure.json")
 CHUNKS_PATH = os.path.join(PROCESSED_DIR, "chunks.json")
 INDEX_PATH = os.path.join(INDEX_DIR, "faiss_index.bin")
-METADATA_PATH = os.path.join(INDEX_DIR, "metadata.pkl")
+METADATA_PATH = os.path.join(INDEX_DIR, "metadata.npz")
+LEXICAL_INDEX_PATH = os.path.join(INDEX_DIR, "bm25.npz")
+REFERENCE_GRAPH_PATH = os.path.join(INDEX_DIR, "references.npz")
+HIERARCHY_PATH = os.path.join(INDEX_DIR, "hierarchy.npz")
+SENTENCE_INDEX_PATH = os.path.join(INDEX_DIR, "sentences.npz")
+DOMAIN_GATE_PATH = os.path.join(INDEX_DIR, "domain_gate.npz")
+EMBEDDING_CACHE_DIR = os.path.join(INDEX_DIR, "embeddings")
+INDEX_VERSION_PATH = os.path.join(INDEX_DIR, "index_version.txt")
+SEMANTIC_CACHE_PATH = os.path.join(INDEX_DIR, "semantic_cache.pkl")
 
 # Configuration du modèle
 EMBEDDING_MODEL = "dangvantuan/sentence-camembert-base"
 TOP_K_RESULTS = 5
 MAX_CHUNK_SIZE = 1200
 OVERLAP_SIZE = 250
+# Téléchargement des ressources NLTK (punkt) autorisé lors de la segmentation ;
+# sinon découpage en phrases par expression régulière si elles sont absentes
+NLTK_DOWNLOAD = os.getenv("NLTK_DOWNLOAD", "false").lower() == "true"
+EMBEDDING_BATCH_SIZE = 32  # Taille des lots lors de la vectorisation des chunks
+# Processus d'encodage pour l'indexation (0 : processus courant)
+EMBEDDING_PROCESSES = 0
+
+# Moteur d'encodage : "torch" (sentence-transformers) ou "onnx" (ONNX Runtime sur
+# CPU, modèle exporté par export_onnx.py dans ONNX_MODEL_DIR)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+ONNX_MODEL_DIR = os.path.join(DATA_DIR, "onnx")
+ONNX_QUANTIZED = os.getenv("ONNX_QUANTIZED", "true").lower() == "true"  # Poids int8
+ONNX_THREADS = 0  # Threads ONNX Runtime par encodage (0 : tous les cœurs)
+
+# Cache des embeddings de requêtes, par texte normalisé (0 : désactivé)
+QUERY_CACHE_SIZE = 1024
+
+# Regroupement des vectorisations de requêtes concurrentes (/chat, /chat/stream)
+QUERY_BATCHING_ENABLED = True
+QUERY_BATCH_MAX_SIZE = 16  # Requêtes encodées ensemble au maximum
+QUERY_BATCH_MAX_WAIT = 0.005  # Secondes d'attente d'autres requêtes avant l'encodage
+
+# Index FAISS : "flat" (recherche exacte), "ivf_flat", "hnsw", "ivf_pq",
+# ou vecteurs compressés "sq8" (int8), "fp16" et "binary" (1 bit par composante)
+INDEX_TYPE = os.getenv("INDEX_TYPE", "flat")
+IVF_NLIST = 256  # Nombre de listes inversées (IVF)
+IVF_NPROBE = 16  # Listes explorées par requête (IVF)
+HNSW_M = 32  # Voisins par nœud du graphe (HNSW)
+HNSW_EF_CONSTRUCTION = 200  # Largeur de recherche à la construction (HNSW)
+HNSW_EF_SEARCH = 64  # Largeur de recherche à la requête (HNSW)
+PQ_M = 48  # Sous-quantifieurs par vecteur (IVF-PQ), doit diviser la dimension
+PQ_NBITS = 8  # Bits par sous-quantifieur (IVF-PQ)
+RESCORE_FACTOR = 10  # Index compressés : candidats re-classés exactement (x k)
+INDEX_PARAMS = {
+    "nlist": IVF_NLIST,
+    "nprobe": IVF_NPROBE,
+    "hnsw_m": HNSW_M,
+    "ef_construction": HNSW_EF_CONSTRUCTION,
+    "ef_search": HNSW_EF_SEARCH,
+    "pq_m": PQ_M,
+    "pq_nbits": PQ_NBITS,
+}
+
+# Mode de recherche : "dense" (FAISS), "hybrid" (FAISS + BM25, fusion RRF)
+# ou "sentence" (un embedding par phrase, article noté par sa meilleure phrase)
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "dense")
+HYBRID_CANDIDATES = 50  # Candidats récupérés par chaque méthode avant fusion
+RRF_K = 60  # Constante de la fusion par rang réciproque
+
+# Recherche hiérarchique : chapitres, puis sections, puis chunks des sections
+# retenues (centroïdes calculés par indexer.py)
+HIERARCHICAL_SEARCH = os.getenv("HIERARCHICAL_SEARCH", "false").lower() == "true"
+HIERARCHY_TOP_CHAPTERS = 2  # Chapitres retenus
+HIERARCHY_TOP_SECTIONS = 4  # Sections retenues parmi ces chapitres
+
+# Regroupement des fragments d'un même article et diversification (MMR)
+RESULT_DIVERSIFICATION = True
+MMR_LAMBDA = 0.7  # Compromis pertinence / diversité (1 : pertinence seule)
+MMR_FETCH_FACTOR = 4  # Candidats récupérés par résultat final avant la MMR
+
+# Ré-ordonnancement des candidats par un cross-encoder français
+RERANKER_ENABLED = os.getenv("RERANKER_ENABLED", "false").lower() == "true"
+RERANKER_MODEL = "antoinelouis/crossencoder-camembert-base-mmarcoFR"
+RERANK_CANDIDATES = 20  # Candidats du bi-encoder soumis au cross-encoder
+RERANK_BATCH_SIZE = 32  # Couples (question, passage) par lot
+RERANK_CACHE_SIZE = 8192  # Scores de couples conservés en cache
+RERANK_TIME_BUDGET = 0.8  # Secondes ; au-delà, l'ordre du bi-encoder est conservé
+
+# Recherche filtrée (chapitre, section, intervalle d'articles) : en dessous de
+# ce nombre de chunks sélectionnés, recherche exacte sur les seuls vecteurs retenus
+FILTER_EXACT_SEARCH_MAX = 4096
+
+# Filtre de domaine : rejet des questions hors sujet dès la vectorisation
+# (centroïdes et seuils calibrés par indexer.py dans DOMAIN_GATE_PATH)
+DOMAIN_GATE_ENABLED = True
+DOMAIN_GATE_QUANTILE = 0.05  # Part des questions du domaine tolérée sous les seuils
+# Seuils de pertinence des passages utilisés en l'absence de calibration
+MIN_SIMILARITY_SCORE = 0.5  # En dessous : question hors sujet
+ANSWERABLE_SIMILARITY_SCORE = 0.6  # En dessous : pas de réponse dans le texte
+
+# Accès direct aux articles cités dans la question ("Que dit l'article 22 ?")
+ARTICLE_FAST_PATH = True
+
+# Ajout au contexte des articles cités par les passages retenus (renvois)
+REFERENCE_EXPANSION = True
+REFERENCE_CONTEXT_BUDGET = 3000  # Caractères ajoutables au contexte (0 : désactivé)
+REFERENCE_MAX_ARTICLES = 3  # Nombre maximal d'articles cités ajoutés
+
+# Traitement par lots (/chat/batch)
+BATCH_MAX_QUESTIONS = 500  # Nombre maximal de questions par requête
+BATCH_GENERATION_CONCURRENCY = 8  # Appels Gemini simultanés pour un lot
+
+# Préchauffage des modèles et de l'index au démarrage de l'API (voir /ready)
+WARM_UP_ENABLED = True
+
+# Service de l'API en production (python run.py --workers N) : plusieurs
+# processus, sans rechargement automatique. Chaque worker charge son modèle ;
+# l'index FAISS et les vecteurs du magasin, projetés en mémoire, sont partagés
+API_PRODUCTION = os.getenv("API_PRODUCTION", "false").lower() == "true"
+API_WORKERS = int(os.getenv("API_WORKERS", 1))
+# Index FAISS projeté en mémoire en lecture seule
+INDEX_MMAP = os.getenv("INDEX_MMAP", "true").lower() == "true"
+
+# Exécution concurrente dans l'API
+# Threads de vectorisation et de recherche FAISS
+CPU_THREAD_POOL_SIZE = int(os.getenv("CPU_THREAD_POOL_SIZE", 4))
+# Appels Gemini simultanés (toutes requêtes confondues)
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 32))
+
+# Cache sémantique des réponses
+SEMANTIC_CACHE_ENABLED = True
+SEMANTIC_CACHE_SIZE = 2048  # Nombre maximal de réponses en cache
+SEMANTIC_CACHE_THRESHOLD = 0.95  # Similarité cosinus minimale entre questions
+SEMANTIC_CACHE_TTL = 24 * 3600  # Durée de vie d'une entrée (secondes)
+SEMANTIC_CACHE_PERSIST = True  # Sauvegarde sur disque à l'arrêt de l'API
 
 # Clé API Gemini
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "")
+GEMINI_MODEL = "gemini-1.5-flash"
+GEMINI_TRANSPORT = os.getenv("GEMINI_TRANSPORT", "grpc")  # "grpc" ou "rest"
 
 # Création des répertoires nécessaires
 for directory in [DATA_DIR, RAW_DIR, PROCESSED_DIR, INDEX_DIR]:
@@ -0,0 +1,156 @@
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+from modules.vectorizer import Vectorizer
+from modules.onnx_encoder import export_onnx_model, INT8_MODEL_FILE
+from modules.evaluation import exact_neighbors, recall_at_k
+from config import CHUNKS_PATH, EMBEDDING_MODEL, ONNX_MODEL_DIR, TOP_K_RESULTS
+
+
+def query_latency(vectorizer, queries, repeats=3):
+    """Latence médiane (ms) de vectorisation d'une requête isolée, comme dans l'API"""
+    vectorizer.vectorize_query(queries[0])  # préchauffage
+    timings = []
+    for _ in range(repeats):
+        for query in queries:
+            start = time.perf_counter()
+            vectorizer.vectorize_query(query)
+            timings.append(time.perf_counter() - start)
+    return float(np.median(timings)) * 1000
+
+
+def compare_backends(texts, queries, variants, k=TOP_K_RESULTS):
+    """
+    Compare les moteurs d'encodage au modèle PyTorch de référence :
+    similarité cosinus des vecteurs des chunks, accord des k plus proches
+    voisins des requêtes, latence par requête et débit d'indexation.
+    """
+    rows = []
+    reference_chunks = reference_queries = true_ids = None
+    ids = np.arange(len(texts))
+    for name, vectorizer in variants:
+        start = time.perf_counter()
+        chunk_vectors = vectorizer.encode_texts(texts)
+        throughput = len(texts) / (time.perf_counter() - start)
+        query_vectors = vectorizer.vectorize_queries(queries)
+
+        if reference_chunks is None:
+            reference_chunks, reference_queries = chunk_vectors, query_vectors
+            true_ids = exact_neighbors(reference_chunks, ids, reference_queries, k)
+        cosines = np.sum(chunk_vectors * reference_chunks, axis=1)
+        query_cosines = np.sum(query_vectors * reference_queries, axis=1)
+        # Requêtes encodées par le moteur testé, corpus encodé par la référence
+        found_ids = exact_neighbors(reference_chunks, ids, query_vectors, k)
+        rows.append(
+            {
+                "name": name,
+                "cosine_mean": float(cosines.mean()),
+                "cosine_min": float(min(cosines.min(), query_cosines.min())),
+                "recall": recall_at_k(found_ids, true_ids),
+                "latency_ms": query_latency(vectorizer, queries[:50]),
+                "throughput": throughput,
+            }
+        )
+    return rows
+
+
+def print_comparison(rows, k):
+    print(
+        f"\n{'moteur':<12} {'cos moyen':>10} {'cos min':>9} "
+        f"{f'accord@{k}':>9} {'requête (ms)':>13} {'chunks/s':>9}"
+    )
+    for row in rows:
+        print(
+            f"{row['name']:<12} {row['cosine_mean']:>10.5f} {row['cosine_min']:>9.5f} "
+            f"{row['recall']:>9.3f} {row['latency_ms']:>13.2f} {row['throughput']:>9.1f}"
+        )
+
+
+def main():
+    """Export du modèle d'embeddings au format ONNX et vérification de parité"""
+    parser = argparse.ArgumentParser(
+        description="Export ONNX (int8) du modèle d'embeddings et comparaison avec PyTorch"
+    )
+    parser.add_argument(
+        "--model",
+        default=EMBEDDING_MODEL,
+        help=f"Modèle sentence-transformers (défaut: {EMBEDDING_MODEL})",
+    )
+    parser.add_argument(
+        "--output",
+        default=ONNX_MODEL_DIR,
+        help=f"Répertoire du modèle exporté (défaut: {ONNX_MODEL_DIR})",
+    )
+    parser.add_argument(
+        "--no-quantize",
+        action="store_true",
+        help="Ne pas produire le modèle quantifié int8",
+    )
+    parser.add_argument(
+        "--skip-export",
+        action="store_true",
+        help="Vérifier un modèle déjà exporté sans le ré-exporter",
+    )
+    parser.add_argument(
+        "--queries",
+        help="Fichier de questions (une par ligne) pour l'accord des voisins et la latence",
+    )
+    parser.add_argument(
+        "--min-cosine",
+        type=float,
+        default=0.97,
+        help="Similarité cosinus minimale exigée avec PyTorch (défaut: 0.97)",
+    )
+    args = parser.parse_args()
+
+    if not args.skip_export:
+        print(f"Export de {args.model} au format ONNX dans {args.output}...")
+        export_onnx_model(args.model, args.output, quantize=not args.no_quantize)
+
+    with open(CHUNKS_PATH, "r", encoding="utf-8") as f:
+        texts = [chunk["text"] for chunk in json.load(f)]
+    if args.queries:
+        with open(args.queries, "r", encoding="utf-8") as f:
+            queries = [line.strip() for line in f if line.strip()]
+    else:
+        # À défaut de questions réelles : débuts des articles, sans en-tête
+        queries = [text.split("\n\n", 1)[-1][:200] for text in texts[:200]]
+    print(f"Comparaison sur {len(texts)} chunks et {len(queries)} requêtes")
+
+    variants = [("torch", Vectorizer(model_name=args.model))]
+    variants.append(
+        (
+            "onnx",
+            Vectorizer(
+                model_name=args.model,
+                backend="onnx",
+                onnx_dir=args.output,
+                onnx_quantized=False,
+            ),
+        )
+    )
+    if os.path.exists(os.path.join(args.output, INT8_MODEL_FILE)):
+        variants.append(
+            (
+                "onnx-int8",
+                Vectorizer(model_name=args.model, backend="onnx", onnx_dir=args.output),
+            )
+        )
+
+    rows = compare_backends(texts, queries, variants)
+    print_comparison(rows, TOP_K_RESULTS)
+
+    failed = [row["name"] for row in rows if row["cosine_min"] < args.min_cosine]
+    if failed:
+        print(
+            f"\nParité insuffisante (cosinus < {args.min_cosine}): {', '.join(failed)}"
+        )
+        sys.exit(1)
+    print("\nParité vérifiée : EMBEDDING_BACKEND=onnx peut remplacer le modèle PyTorch")
+
+
+if __name__ == "__main__":
+    main()
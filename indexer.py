@@ -1,20 +1,117 @@
 import os
 import json
 import argparse
-from modules.processor import load_json, save_json, segment_from_json
-from modules.vectorizer import Vectorizer
-from modules.retriever import Retriever
+import numpy as np
+from modules.processor import (
+    load_json,
+    save_json,
+    segment_from_json,
+    load_sentence_tokenizer,
+)
+from modules.vectorizer import Vectorizer, EmbeddingStore
+from modules.retriever import (
+    Retriever,
+    chunk_id,
+    index_type_of,
+    build_faiss_index,
+    INDEX_TYPES,
+    RESCORED_INDEX_TYPES,
+)
+from modules.evaluation import (
+    sample_queries,
+    exact_neighbors,
+    measure_search,
+    index_search,
+    rescored_search,
+    index_memory_bytes,
+    print_report,
+)
+from modules.cache import write_index_version
+from modules.domain import DomainGate, IN_DOMAIN_PROBES, OFF_TOPIC_PROBES
 from config import (
     LAW_STRUCTURE_PATH,
     CHUNKS_PATH,
     INDEX_PATH,
     METADATA_PATH,
+    LEXICAL_INDEX_PATH,
+    REFERENCE_GRAPH_PATH,
+    HIERARCHY_PATH,
+    SENTENCE_INDEX_PATH,
+    DOMAIN_GATE_PATH,
+    DOMAIN_GATE_QUANTILE,
+    MIN_SIMILARITY_SCORE,
+    ANSWERABLE_SIMILARITY_SCORE,
+    INDEX_VERSION_PATH,
+    EMBEDDING_CACHE_DIR,
     EMBEDDING_MODEL,
+    EMBEDDING_BACKEND,
+    ONNX_MODEL_DIR,
+    ONNX_QUANTIZED,
+    ONNX_THREADS,
+    INDEX_TYPE,
+    RETRIEVAL_MODE,
+    INDEX_PARAMS,
+    RESCORE_FACTOR,
+    TOP_K_RESULTS,
+    EMBEDDING_BATCH_SIZE,
+    EMBEDDING_PROCESSES,
+    NLTK_DOWNLOAD,
     MAX_CHUNK_SIZE,
     OVERLAP_SIZE,
 )
 
 
+def benchmark_index_types(retriever, vectorizer, queries_path=None, k=TOP_K_RESULTS):
+    """
+    Compare les types d'index FAISS sur le corpus indexé : rappel@k par rapport
+    à la recherche exacte, latence par requête et taille de l'index.
+    """
+    store = retriever.store
+    if queries_path:
+        with open(queries_path, "r", encoding="utf-8") as f:
+            questions = [line.strip() for line in f if line.strip()]
+        queries = vectorizer.vectorize_queries(questions)
+    else:
+        queries = sample_queries(store.vectors)
+    true_ids = exact_neighbors(store.vectors, store.ids, queries, k)
+
+    rows = []
+    for index_type in INDEX_TYPES:
+        try:
+            index = build_faiss_index(
+                store.ids, store.vectors, index_type, INDEX_PARAMS
+            )
+        except Exception as e:
+            print(f"{index_type}: construction impossible ({str(e)})")
+            continue
+        memory_bytes = index_memory_bytes(index)
+        result = measure_search(index_search(index), queries, true_ids, k)
+        rows.append({"name": index_type, **result, "memory_bytes": memory_bytes})
+        if index_type in RESCORED_INDEX_TYPES:
+            # Re-classement exact de la liste restreinte (vecteurs projetés en mémoire)
+            result = measure_search(
+                rescored_search(index, store, RESCORE_FACTOR), queries, true_ids, k
+            )
+            rows.append(
+                {
+                    "name": f"{index_type}+rescore",
+                    **result,
+                    "memory_bytes": memory_bytes,
+                }
+            )
+
+    print_report(
+        f"Comparaison des index FAISS ({len(store)} vecteurs, {len(queries)} requêtes)",
+        rows,
+        k,
+    )
+    vectors_bytes = store.vectors.size * store.vectors.itemsize
+    print(
+        f"Vecteurs pleine précision (re-classement, projetés en mémoire): "
+        f"{vectors_bytes / 1024 / 1024:.2f} Mo sur disque"
+    )
+
+
 def main():
     """Script d'indexation des documents"""
     parser = argparse.ArgumentParser(
@@ -25,6 +122,52 @@ def main():
         action="store_true",
         help="Forcer la re-segmentation des documents",
     )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=EMBEDDING_BATCH_SIZE,
+        help=f"Taille des lots de vectorisation (défaut: {EMBEDDING_BATCH_SIZE})",
+    )
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=EMBEDDING_PROCESSES,
+        help="Nombre de processus d'encodage sur CPU multi-cœurs (défaut: processus courant)",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Mettre à jour l'index existant avec les seuls chunks ajoutés, modifiés ou supprimés",
+    )
+    parser.add_argument(
+        "--index-type",
+        choices=INDEX_TYPES,
+        default=INDEX_TYPE,
+        help=f"Type d'index FAISS à construire (défaut: {INDEX_TYPE})",
+    )
+    parser.add_argument(
+        "--benchmark",
+        action="store_true",
+        help="Comparer rappel et latence des différents types d'index après l'indexation",
+    )
+    parser.add_argument(
+        "--benchmark-queries",
+        help="Fichier de questions (une par ligne) utilisé pour la comparaison des index",
+    )
+    parser.add_argument(
+        "--no-embedding-cache",
+        action="store_true",
+        help="Recalculer tous les embeddings sans utiliser le cache disque",
+    )
+    parser.add_argument(
+        "--sentence-index",
+        action="store_true",
+        help="Construire l'index des phrases des articles (mode de recherche sentence)",
+    )
+    parser.add_argument(
+        "--calibration-queries",
+        help="Fichier de questions du domaine (une par ligne) pour calibrer le filtre de domaine",
+    )
     args = parser.parse_args()
 
     print("Démarrage de l'indexation des documents...")
@@ -47,6 +190,7 @@ def main():
             chunks = json.load(f)
     else:
         print("Segmentation de la structure de la loi...")
+        load_sentence_tokenizer(download=NLTK_DOWNLOAD)
         chunks = segment_from_json(
             law_structure, max_chunk_size=MAX_CHUNK_SIZE, overlap=OVERLAP_SIZE
         )
@@ -56,19 +200,147 @@ def main():
 
     print(f"Nombre de chunks: {len(chunks)}")
 
-    # Vectorisation des chunks
-    print("Vectorisation des chunks...")
-    vectorizer = Vectorizer(model_name=EMBEDDING_MODEL)
-    vectors = vectorizer.vectorize_chunks(chunks)
+    vectorizer = Vectorizer(
+        model_name=EMBEDDING_MODEL,
+        backend=EMBEDDING_BACKEND,
+        onnx_dir=ONNX_MODEL_DIR,
+        onnx_quantized=ONNX_QUANTIZED,
+        onnx_threads=ONNX_THREADS,
+    )
+    store = None
+    if not args.no_embedding_cache:
+        store = EmbeddingStore(EMBEDDING_CACHE_DIR, vectorizer.cache_name)
+        print(f"Cache d'embeddings: {len(store)} vecteurs disponibles")
+
+    def vectorize(chunks_to_embed):
+        """Vectorisation des chunks avec réutilisation du cache d'embeddings"""
+        print(f"Vectorisation de {len(chunks_to_embed)} chunks...")
+        vectors = vectorizer.vectorize_chunks(
+            chunks_to_embed,
+            batch_size=args.batch_size,
+            num_processes=args.processes,
+            store=store,
+        )
+        print(
+            f"Embeddings réutilisés: {vectorizer.last_stats['reused']}, "
+            f"calculés: {vectorizer.last_stats['computed']}"
+        )
+        if store is not None:
+            store.save()
+        return vectors
 
-    # Construction et sauvegarde de l'index FAISS
-    print("Construction de l'index FAISS...")
-    retriever = Retriever()
-    retriever.build_index(vectors)
+    retriever = Retriever(index_type=args.index_type, index_params=INDEX_PARAMS)
+    incremental = (
+        args.incremental
+        and os.path.exists(INDEX_PATH)
+        and os.path.exists(METADATA_PATH)
+    )
+    if incremental:
+        retriever.load_index(INDEX_PATH, METADATA_PATH)
+        if not retriever.supports_incremental():
+            print("Index existant au format ancien: reconstruction complète")
+            incremental = False
+    elif args.incremental:
+        print("Aucun index existant: reconstruction complète")
+
+    if incremental:
+        # Comparaison des chunks courants avec ceux déjà indexés
+        current = {chunk_id(chunk): chunk for chunk in chunks}
+        indexed = retriever.indexed_ids()
+        removed_ids = indexed - current.keys()
+        new_chunks = [chunk for cid, chunk in current.items() if cid not in indexed]
+        print(
+            f"Mise à jour incrémentale: {len(new_chunks)} chunks à ajouter, "
+            f"{len(removed_ids)} à retirer, "
+            f"{len(current) - len(new_chunks)} inchangés"
+        )
+        index_type_changed = index_type_of(retriever.index) != args.index_type
+        if not new_chunks and not removed_ids and not index_type_changed:
+            print("L'index est déjà à jour.")
+            if args.benchmark:
+                benchmark_index_types(retriever, vectorizer, args.benchmark_queries)
+            return
+
+        vectors = vectorize(new_chunks) if new_chunks else []
+        added, removed = retriever.update_chunks(
+            vectors, removed_ids, order=list(current.keys())
+        )
+        print(f"Chunks ajoutés: {added}, retirés: {removed}")
+        if index_type_changed:
+            print(f"Reconstruction de l'index au format {args.index_type}...")
+            retriever.rebuild_index()
+    else:
+        vectors = vectorize(chunks)
+
+        # Construction de l'index FAISS
+        print(f"Construction de l'index FAISS ({args.index_type})...")
+        retriever.build_index(vectors)
 
     print(f"Sauvegarde de l'index dans {INDEX_PATH}")
     retriever.save_index(INDEX_PATH, METADATA_PATH)
 
+    # Index lexical BM25, aligné sur le magasin de chunks (recherche hybride)
+    print(f"Construction de l'index BM25 dans {LEXICAL_INDEX_PATH}")
+    retriever.build_lexical_index()
+    retriever.save_lexical_index(LEXICAL_INDEX_PATH)
+
+    # Graphe des renvois entre articles (expansion du contexte)
+    retriever.build_reference_graph(chunks)
+    print(
+        f"Graphe des renvois: {len(retriever.reference_graph.targets)} renvois "
+        f"entre {len(retriever.reference_graph)} articles"
+    )
+    retriever.save_reference_graph(REFERENCE_GRAPH_PATH)
+
+    # Centroïdes des sections et chapitres (recherche hiérarchique)
+    retriever.build_hierarchy()
+    print(
+        f"Hiérarchie: {len(retriever.hierarchy.chapter_vectors)} chapitres, "
+        f"{len(retriever.hierarchy.section_vectors)} sections"
+    )
+    retriever.save_hierarchy(HIERARCHY_PATH)
+
+    # Un embedding par phrase de chaque article (recherche multi-vecteurs)
+    if args.sentence_index or RETRIEVAL_MODE == "sentence":
+
+        def encode_sentences(sentences):
+            vectors = vectorize([{"text": sentence} for sentence in sentences])
+            return np.array([vec["embedding"] for vec in vectors], dtype="float32")
+
+        retriever.build_sentence_index(encode_sentences)
+        print(
+            f"Index des phrases: {len(retriever.sentence_index.vectors)} phrases "
+            f"pour {len(retriever.sentence_index)} articles"
+        )
+        retriever.save_sentence_index(SENTENCE_INDEX_PATH)
+
+    # Filtre de domaine : centroïdes et seuils calibrés sur des questions du
+    # domaine et des questions hors sujet
+    if args.calibration_queries:
+        with open(args.calibration_queries, "r", encoding="utf-8") as f:
+            in_domain = [line.strip() for line in f if line.strip()]
+    else:
+        in_domain = IN_DOMAIN_PROBES
+    domain_gate = DomainGate.calibrate(
+        retriever.store,
+        vectorizer.encode_texts(in_domain),
+        vectorizer.encode_texts(OFF_TOPIC_PROBES),
+        quantile=DOMAIN_GATE_QUANTILE,
+        min_gap=ANSWERABLE_SIMILARITY_SCORE - MIN_SIMILARITY_SCORE,
+    )
+    thresholds = ", ".join(
+        f"{name}={value:.3f}" for name, value in domain_gate.thresholds().items()
+    )
+    print(f"Filtre de domaine ({len(in_domain)} questions): {thresholds}")
+    domain_gate.save(DOMAIN_GATE_PATH)
+
+    # Nouvelle version d'index : invalide le cache sémantique des réponses
+    version = write_index_version(INDEX_VERSION_PATH)
+    print(f"Version de l'index: {version}")
+
+    if args.benchmark:
+        benchmark_index_types(retriever, vectorizer, args.benchmark_queries)
+
     print("Indexation terminée avec succès!")
 
 
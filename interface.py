@@ -58,41 +58,71 @@ def convert_to_messages_format(history):
     return messages
 
 
+def iter_sse_events(response):
+    """Décode un flux Server-Sent Events en couples (événement, données)"""
+    event, data_lines = "message", []
+    for line in response.iter_lines(decode_unicode=True):
+        if line is None:
+            continue
+        if line == "":
+            # Ligne vide : fin de l'événement courant
+            if data_lines:
+                yield event, json.loads("\n".join(data_lines))
+            event, data_lines = "message", []
+        elif line.startswith("event:"):
+            event = line[len("event:") :].strip()
+        elif line.startswith("data:"):
+            data_lines.append(line[len("data:") :].strip())
+
+
 def query_chatbot(message, history, progress=gr.Progress()):
-    """Fonction qui communique avec l'API du chatbot et met à jour l'historique"""
+    """
+    Fonction qui communique avec l'API du chatbot et met à jour l'historique.
+    La réponse est consommée en flux (/chat/stream) et affichée au fur et à
+    mesure de sa génération.
+    """
+    # Convertir l'historique existant au format "messages" si nécessaire
+    messages_history = convert_to_messages_format(history)
+    messages_history.append({"role": "user", "content": message})
+
     try:
         # Afficher le progrès
         progress(0, desc="Envoi de la requête...")
 
-        # Requête à l'API
+        # Requête à l'API en mode flux
         response = requests.post(
-            f"{API_URL}/chat",
+            f"{API_URL}/chat/stream",
             json={"message": message},
-            headers={"Content-Type": "application/json"},
+            headers={"Content-Type": "application/json", "Accept": "text/event-stream"},
+            stream=True,
         )
 
-        progress(0.5, desc="Traitement de la réponse...")
-
         # Vérification de la réponse
         if response.status_code == 200:
-            data = response.json()
-            response_text = data.get("response", "")
-            sources = data.get("sources", [])
+            messages_history.append({"role": "assistant", "content": ""})
+            response_text = ""
+            sources = []
+
+            for event, data in iter_sse_events(response):
+                if event == "sources":
+                    sources = data
+                    progress(0.5, desc="Génération de la réponse...")
+                elif event == "token":
+                    response_text += data.get("text", "")
+                    messages_history[-1]["content"] = response_text
+                    yield messages_history
+                elif event == "error":
+                    response_text += f"\n\n⚠️ Erreur: {data.get('detail', '')}"
+                elif event == "done":
+                    break
 
             # Ajouter les sources formatées à la réponse
             if sources:
                 response_text += "\n\n" + format_sources(sources)
 
             progress(1.0, desc="Terminé!")
-
-            # Convertir l'historique existant au format "messages" si nécessaire
-            messages_history = convert_to_messages_format(history)
-
-            # Ajouter le nouveau message et la réponse
-            messages_history.append({"role": "user", "content": message})
-            messages_history.append({"role": "assistant", "content": response_text})
-
-            return messages_history
+            messages_history[-1]["content"] = response_text
+            yield messages_history
 
         else:
             progress(1.0, desc="Erreur!")
@@ -103,34 +133,31 @@ def query_chatbot(message, history, progress=gr.Progress()):
             else:
                 error_msg = f"⚠️ Erreur: Impossible de communiquer avec l'API (Statut: {response.status_code})"
 
-            # Convertir l'historique et ajouter le message d'erreur
-            messages_history = convert_to_messages_format(history)
-            messages_history.append({"role": "user", "content": message})
+            # Ajouter le message d'erreur
             messages_history.append({"role": "assistant", "content": error_msg})
 
-            return messages_history
+            yield messages_history
 
     except requests.exceptions.ConnectionError:
         progress(1.0, desc="Erreur de connexion!")
         error_msg = f"⚠️ Erreur de connexion: Impossible d'atteindre l'API. Vérifiez l'URL ({API_URL}) et que le serveur est en cours d'exécution."
 
-        # Convertir l'historique et ajouter le message d'erreur
-        messages_history = convert_to_messages_format(history)
-        messages_history.append({"role": "user", "content": message})
+        if messages_history[-1]["role"] == "assistant":
+            messages_history.pop()
         messages_history.append({"role": "assistant", "content": error_msg})
 
-        return messages_history
+        yield messages_history
 
     except Exception as e:
         progress(1.0, desc="Erreur!")
         error_msg = f"⚠️ Erreur: {str(e)}"
 
-        # Convertir l'historique et ajouter le message d'erreur
-        messages_history = convert_to_messages_format(history)
-        messages_history.append({"role": "user", "content": message})
+        # Remplacer une réponse partielle éventuelle par le message d'erreur
+        if messages_history[-1]["role"] == "assistant":
+            messages_history.pop()
         messages_history.append({"role": "assistant", "content": error_msg})
 
-        return messages_history
+        yield messages_history
 
 
 def reset_conversation():
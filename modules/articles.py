@@ -0,0 +1,146 @@
+import numpy as np
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional
+
+from modules.processor import (
+    normalize_article_number,
+    merge_partial_chunks,
+    extract_article_references,
+)
+
+
+class ArticleIndex:
+    """
+    Index en mémoire des articles du magasin de chunks.
+
+    Chaque article (chapitre, section, article) est associé à la liste
+    ordonnée des lignes de ses chunks ; les articles sont accessibles par
+    numéro, ou par couple (section, numéro) lorsque plusieurs textes
+    partagent une même numérotation.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        # (chapitre, section, article) -> lignes des chunks de l'article
+        self.articles = OrderedDict()
+        # Numéro d'article -> clés des articles portant ce numéro
+        self.by_number = {}
+        # (section, numéro) -> clés des articles
+        self.by_section_number = {}
+
+        chapters = store.columns["chapter"]
+        sections = store.columns["section"]
+        articles = store.columns["article"]
+        for row in range(len(store)):
+            key = (int(chapters[row]), int(sections[row]), int(articles[row]))
+            rows = self.articles.get(key)
+            if rows is not None:
+                rows.append(row)
+                continue
+            self.articles[key] = [row]
+
+            number = store.value("article_number", row)
+            if number is None:
+                continue
+            number = normalize_article_number(number)
+            self.by_number.setdefault(number, []).append(key)
+            section = store.value("section", row) or ""
+            self.by_section_number.setdefault((section, number), []).append(key)
+
+        # Position de chaque article (ordre du magasin)
+        self.positions = {key: i for i, key in enumerate(self.articles)}
+        self.keys = list(self.articles)
+        # Ligne du magasin -> position de son article
+        self.row_positions = np.empty(len(store), dtype=np.int32)
+        for position, rows in enumerate(self.articles.values()):
+            self.row_positions[rows] = position
+
+    def __len__(self):
+        return len(self.articles)
+
+    def position_of_row(self, row: int) -> int:
+        """Position de l'article auquel appartient une ligne"""
+        return int(self.row_positions[row])
+
+    def lookup(self, number: str, section: Optional[str] = None) -> List[List[int]]:
+        """Lignes des chunks des articles portant ce numéro (et de cette section)"""
+        number = normalize_article_number(number)
+        if section is not None:
+            keys = self.by_section_number.get((section, number), [])
+        else:
+            keys = self.by_number.get(number, [])
+        return [self.articles[key] for key in keys]
+
+    def article_chunk(self, rows: List[int]) -> Dict[str, Any]:
+        """Chunk unique d'un article, les chunks partiels étant réassemblés dans l'ordre"""
+        texts = [self.store.text(row) for row in rows]
+        metadata = self.store.metadata(rows[0])
+        metadata.pop("is_partial", None)
+        return {
+            "text": merge_partial_chunks(texts) if len(texts) > 1 else texts[0],
+            "metadata": metadata,
+            "chunk_ids": [int(self.store.ids[row]) for row in rows],
+        }
+
+
+class ReferenceGraph:
+    """
+    Graphe des renvois entre articles ("articles 29 à 32", "article 4.14"),
+    au format CSR : les articles cités par l'article i sont
+    targets[indptr[i]:indptr[i + 1]], les articles étant désignés par leur
+    position dans l'ArticleIndex.
+    """
+
+    def __init__(self, indptr: np.ndarray, targets: np.ndarray):
+        self.indptr = indptr
+        self.targets = targets
+
+    def __len__(self):
+        return len(self.indptr) - 1
+
+    @classmethod
+    def build(
+        cls,
+        article_index: ArticleIndex,
+        references: Optional[Dict[int, List[str]]] = None,
+    ) -> "ReferenceGraph":
+        """
+        Construit le graphe à partir des références calculées lors de la
+        segmentation (position de l'article -> numéros cités). Pour les
+        articles sans références connues, elles sont extraites du texte.
+        """
+        references = references or {}
+        indptr = np.zeros(len(article_index) + 1, dtype=np.int64)
+        targets = []
+        for position, key in enumerate(article_index.keys):
+            rows = article_index.articles[key]
+            numbers = references.get(position)
+            if numbers is None:
+                # Texte des chunks sans leur en-tête (chapitre | section | article)
+                bodies = [
+                    article_index.store.text(row).split("\n\n", 1)[-1] for row in rows
+                ]
+                numbers = extract_article_references(" ".join(bodies))
+
+            cited = []
+            for number in numbers:
+                for cited_rows in article_index.lookup(number):
+                    target = article_index.position_of_row(cited_rows[0])
+                    if target != position and target not in cited:
+                        cited.append(target)
+            targets.extend(cited)
+            indptr[position + 1] = len(targets)
+        return cls(indptr, np.array(targets, dtype=np.int32))
+
+    def neighbors(self, position: int) -> np.ndarray:
+        """Positions des articles cités par un article"""
+        return self.targets[self.indptr[position] : self.indptr[position + 1]]
+
+    def save(self, path: str):
+        with open(path, "wb") as f:
+            np.savez(f, indptr=self.indptr, targets=self.targets)
+
+    @classmethod
+    def load(cls, path: str) -> "ReferenceGraph":
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data["indptr"], data["targets"])
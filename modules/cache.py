@@ -0,0 +1,281 @@
+import os
+import re
+import time
+import pickle
+import tempfile
+import threading
+import unicodedata
+import numpy as np
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, FrozenSet, Tuple
+
+
+def article_key(retrieved_chunks: List[Dict[str, Any]]) -> FrozenSet[Tuple[str, str]]:
+    """Ensemble des articles (chapitre, article) couverts par les chunks récupérés"""
+    return frozenset(
+        (chunk["metadata"].get("chapter", ""), chunk["metadata"].get("article", ""))
+        for chunk in retrieved_chunks
+    )
+
+
+def normalize_query_text(query: str) -> str:
+    """
+    Forme normalisée d'une question : minuscules, sans accents ni ponctuation,
+    espaces réduits ("Qu'est-ce que la CDP ?" -> "qu est ce que la cdp")
+    """
+    text = unicodedata.normalize("NFKD", query.casefold())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    text = re.sub(r"[^\w\s]|_", " ", text)
+    return " ".join(text.split())
+
+
+def read_index_version(version_path: str) -> Optional[str]:
+    """Lit la version de l'index écrite par indexer.py (None si absente)"""
+    if not os.path.exists(version_path):
+        return None
+    with open(version_path, "r", encoding="utf-8") as f:
+        return f.read().strip() or None
+
+
+def write_index_version(version_path: str) -> str:
+    """Écrit une nouvelle version d'index et la renvoie"""
+    version = f"{time.time_ns():x}"
+    with open(version_path, "w", encoding="utf-8") as f:
+        f.write(version)
+    return version
+
+
+class SemanticCache:
+    """
+    Cache sémantique des réponses générées.
+
+    Une réponse est réutilisée lorsque l'embedding de la nouvelle question a une
+    similarité cosinus supérieure au seuil avec celui d'une question en cache
+    ET que les articles récupérés sont identiques. Les embeddings sont stockés
+    dans une matrice préallouée (mémoire bornée) ; l'éviction est LRU, avec
+    une durée de vie maximale par entrée. Le cache est invalidé lorsque la
+    version de l'index FAISS change.
+    """
+
+    def __init__(
+        self,
+        dimension: int,
+        capacity: int = 2048,
+        similarity_threshold: float = 0.95,
+        ttl_seconds: float = 86400,
+        persist_path: Optional[str] = None,
+    ):
+        self.dimension = dimension
+        self.capacity = capacity
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_seconds
+        self.persist_path = persist_path
+        self.index_version = None
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        """Vide le cache (les compteurs sont conservés)"""
+        self.embeddings = np.zeros((self.capacity, self.dimension), dtype="float32")
+        self.valid = np.zeros(self.capacity, dtype=bool)
+        # slot -> (articles, réponse, date de création), dans l'ordre LRU
+        self.entries = OrderedDict()
+        self.free_slots = list(range(self.capacity - 1, -1, -1))
+
+    def _evict(self, slot: int):
+        del self.entries[slot]
+        self.valid[slot] = False
+        self.free_slots.append(slot)
+
+    def bind_index_version(self, version: Optional[str]):
+        """Associe le cache à une version d'index ; le vide si elle a changé"""
+        with self._lock:
+            if self.index_version is not None and version != self.index_version:
+                print("Nouvelle version de l'index détectée: invalidation du cache")
+                self._reset()
+            self.index_version = version
+
+    def lookup(
+        self, query_embedding: np.ndarray, articles: FrozenSet[Tuple[str, str]]
+    ) -> Optional[str]:
+        """Renvoie la réponse en cache correspondant à la requête, ou None"""
+        with self._lock:
+            if self.entries:
+                similarities = self.embeddings @ query_embedding
+                similarities[~self.valid] = -np.inf
+                candidates = np.flatnonzero(similarities >= self.similarity_threshold)
+                now = time.time()
+                for slot in candidates[np.argsort(-similarities[candidates])]:
+                    slot = int(slot)
+                    cached_articles, response, created_at = self.entries[slot]
+                    if now - created_at > self.ttl_seconds:
+                        self._evict(slot)
+                        self.evictions += 1
+                        continue
+                    if cached_articles == articles:
+                        self.entries.move_to_end(slot)
+                        self.hits += 1
+                        return response
+            self.misses += 1
+            return None
+
+    def store(
+        self,
+        query_embedding: np.ndarray,
+        articles: FrozenSet[Tuple[str, str]],
+        response: str,
+        created_at: Optional[float] = None,
+    ):
+        """Ajoute une réponse au cache, en évinçant l'entrée la moins récemment utilisée si besoin"""
+        with self._lock:
+            if not self.free_slots:
+                lru_slot = next(iter(self.entries))
+                self._evict(lru_slot)
+                self.evictions += 1
+            slot = self.free_slots.pop()
+            self.embeddings[slot] = query_embedding
+            self.valid[slot] = True
+            self.entries[slot] = (
+                articles,
+                response,
+                time.time() if created_at is None else created_at,
+            )
+
+    def stats(self) -> Dict[str, Any]:
+        """Compteurs du cache"""
+        total = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "capacity": self.capacity,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    def save(self):
+        """
+        Sauvegarde le cache sur disque (si un chemin est configuré).
+
+        Écriture atomique (fichier temporaire du même répertoire, puis
+        os.replace) : plusieurs workers peuvent sauvegarder en même temps,
+        le fichier reste toujours complet (le dernier l'emporte).
+        """
+        if not self.persist_path:
+            return
+        with self._lock:
+            slots = list(self.entries.keys())
+            state = {
+                "index_version": self.index_version,
+                "dimension": self.dimension,
+                "embeddings": self.embeddings[slots].copy(),
+                "entries": [self.entries[slot] for slot in slots],
+            }
+        directory = os.path.dirname(os.path.abspath(self.persist_path))
+        fd, tmp_path = tempfile.mkstemp(
+            dir=directory, prefix=os.path.basename(self.persist_path), suffix=".tmp"
+        )
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(state, f)
+            os.replace(tmp_path, self.persist_path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def load(self):
+        """Recharge le cache depuis le disque, en ignorant les entrées expirées"""
+        if not self.persist_path or not os.path.exists(self.persist_path):
+            return
+        try:
+            with open(self.persist_path, "rb") as f:
+                state = pickle.load(f)
+        except Exception as e:
+            print(f"Impossible de charger le cache sémantique: {str(e)}")
+            return
+
+        if state.get("dimension") != self.dimension:
+            return
+        if (
+            self.index_version is not None
+            and state["index_version"] != self.index_version
+        ):
+            print("Cache sémantique obsolète (index reconstruit): ignoré")
+            return
+
+        now = time.time()
+        # Les entrées sont sauvegardées dans l'ordre LRU : on ne garde que les plus récentes
+        kept = [
+            (embedding, entry)
+            for embedding, entry in zip(state["embeddings"], state["entries"])
+            if now - entry[2] <= self.ttl_seconds
+        ][-self.capacity :]
+        for embedding, (articles, response, created_at) in kept:
+            self.store(embedding, articles, response, created_at=created_at)
+        print(f"Cache sémantique rechargé: {len(kept)} entrées")
+
+
+class QueryEmbeddingCache:
+    """
+    Cache LRU des embeddings de requêtes, indexé par le texte normalisé de la
+    question (voir normalize_query_text). Les vecteurs sont stockés dans une
+    matrice préallouée : aucune allocation par entrée.
+    """
+
+    def __init__(self, dimension: int, capacity: int = 1024):
+        self.dimension = dimension
+        self.capacity = capacity
+        self.embeddings = np.zeros((capacity, dimension), dtype="float32")
+        # texte normalisé -> slot, dans l'ordre LRU
+        self.slots = OrderedDict()
+        self.free_slots = list(range(capacity - 1, -1, -1))
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    def get(self, query: str) -> Optional[np.ndarray]:
+        """Renvoie (une copie de) l'embedding en cache de la question, ou None"""
+        key = normalize_query_text(query)
+        with self._lock:
+            slot = self.slots.get(key)
+            if slot is None:
+                self.misses += 1
+                return None
+            self.slots.move_to_end(key)
+            self.hits += 1
+            return self.embeddings[slot].copy()
+
+    def put(self, query: str, embedding: np.ndarray):
+        """Ajoute un embedding, en évinçant l'entrée la moins récemment utilisée si besoin"""
+        key = normalize_query_text(query)
+        with self._lock:
+            slot = self.slots.get(key)
+            if slot is None:
+                if not self.free_slots:
+                    _, lru_slot = self.slots.popitem(last=False)
+                    self.free_slots.append(lru_slot)
+                    self.evictions += 1
+                slot = self.free_slots.pop()
+                self.slots[key] = slot
+            else:
+                self.slots.move_to_end(key)
+            self.embeddings[slot] = embedding
+
+    def stats(self) -> Dict[str, Any]:
+        """Compteurs du cache"""
+        total = self.hits + self.misses
+        return {
+            "size": len(self.slots),
+            "capacity": self.capacity,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
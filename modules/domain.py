@@ -0,0 +1,203 @@
+import numpy as np
+from typing import Dict
+
+# Questions relevant de la loi, formulées comme celles des utilisateurs,
+# utilisées pour calibrer les seuils (indexer.py --calibration-queries pour
+# en fournir d'autres). Les intitulés des chapitres et sections ne conviennent
+# pas : ils figurent mot pour mot dans l'en-tête de chaque chunk.
+IN_DOMAIN_PROBES = [
+    "Qu'est-ce qu'une donnée à caractère personnel ?",
+    "Quelles sont les missions de la Commission des Données Personnelles ?",
+    "Comment sont désignés les membres de la CDP ?",
+    "Faut-il déclarer un traitement de données avant de le mettre en œuvre ?",
+    "Dans quels cas une autorisation de la CDP est-elle nécessaire ?",
+    "Le consentement de la personne est-il toujours obligatoire ?",
+    "Peut-on traiter des données sur la santé ou les opinions religieuses ?",
+    "Quelles informations doivent être données à la personne dont on collecte les données ?",
+    "Comment exercer mon droit d'accès à mes données ?",
+    "Puis-je m'opposer à l'utilisation de mes données à des fins de prospection ?",
+    "Comment faire corriger ou supprimer des données inexactes me concernant ?",
+    "Combien de temps une entreprise peut-elle conserver mes données ?",
+    "Quelles mesures de sécurité le responsable du traitement doit-il prendre ?",
+    "Un sous-traitant a-t-il des obligations envers les données qu'il traite ?",
+    "Peut-on transférer des données personnelles vers un pays étranger ?",
+    "Quelles sanctions la Commission peut-elle prononcer en cas de manquement ?",
+    "Est-il permis d'interconnecter deux fichiers contenant des données personnelles ?",
+    "La loi s'applique-t-elle aux traitements effectués à des fins journalistiques ?",
+    "Qui est le responsable du traitement au sens de la loi ?",
+    "Peut-on utiliser la vidéosurveillance sur un lieu de travail ?",
+    "Les données des mineurs bénéficient-elles d'une protection particulière ?",
+    "Que risque une entreprise qui collecte des données de façon déloyale ?",
+]
+
+# Questions hors du domaine de la loi, utilisées pour calibrer les seuils
+OFF_TOPIC_PROBES = [
+    "Quelle est la recette du thiéboudienne ?",
+    "Qui a gagné la Coupe d'Afrique des nations de football ?",
+    "Quel temps fera-t-il demain à Dakar ?",
+    "Comment réparer une fuite d'eau sous l'évier ?",
+    "Quels sont les meilleurs films de l'année ?",
+    "Comment apprendre à jouer de la guitare rapidement ?",
+    "Quelle est la capitale de l'Australie ?",
+    "Donne-moi une blague drôle.",
+    "Combien de calories contient une banane ?",
+    "Comment entretenir un jardin potager pendant la saison sèche ?",
+    "Quel est le prix d'un billet d'avion pour Paris ?",
+    "Écris un poème sur la mer.",
+    "Comment calculer l'aire d'un cercle ?",
+    "Quels exercices faire pour se muscler le dos ?",
+    "Qui a écrit le roman Une si longue lettre ?",
+    "Comment faire pousser des tomates ?",
+    "Quelle est la distance entre la Terre et la Lune ?",
+    "Peux-tu me conseiller une destination de vacances ?",
+    "Comment préparer un bon café ?",
+    "Quelles sont les règles du basket-ball ?",
+]
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def _separating_threshold(
+    in_domain: np.ndarray, off_topic: np.ndarray, quantile: float
+) -> float:
+    """
+    Seuil entre les scores des questions du domaine (quantile bas) et ceux
+    des questions hors sujet (maximum) ; en cas de recouvrement, le quantile
+    bas du domaine est retenu afin de ne pas rejeter de question pertinente.
+    """
+    in_low = float(np.quantile(in_domain, quantile))
+    off_high = float(np.max(off_topic))
+    return min((in_low + off_high) / 2, in_low)
+
+
+class DomainGate:
+    """
+    Filtre de domaine appliqué juste après la vectorisation de la requête.
+
+    La requête est comparée aux centroïdes du corpus (corpus entier et chaque
+    chapitre) : un produit matriciel de quelques vecteurs, sans recherche ni
+    appel à Gemini. Les seuils de pertinence des passages récupérés sont
+    calibrés en même temps et stockés avec l'index.
+    """
+
+    def __init__(
+        self,
+        centroids: np.ndarray,
+        gate_threshold: float,
+        min_similarity_score: float,
+        answerable_score: float,
+    ):
+        """
+        Args:
+            centroids: Centroïdes normalisés (corpus, puis chapitres)
+            gate_threshold: Similarité minimale avec le centroïde le plus proche
+            min_similarity_score: Score de passage en dessous duquel la
+                question est hors sujet
+            answerable_score: Score de passage en dessous duquel la question
+                relève du domaine mais reste sans réponse dans le texte
+        """
+        self.centroids = centroids
+        self.gate_threshold = gate_threshold
+        self.min_similarity_score = min_similarity_score
+        self.answerable_score = answerable_score
+
+        self.checked = 0
+        self.rejected = 0
+
+    @staticmethod
+    def corpus_centroids(store) -> np.ndarray:
+        """Centroïde du corpus et centroïde de chaque chapitre du magasin"""
+        vectors = np.asarray(store.vectors, dtype=np.float32)
+        chapters = store.columns["chapter"].astype(np.int64)
+        _, groups = np.unique(chapters, return_inverse=True)
+        sums = np.zeros((groups.max() + 1, vectors.shape[1]), dtype=np.float32)
+        np.add.at(sums, groups, vectors)
+        centroids = np.vstack([vectors.sum(axis=0, keepdims=True), sums])
+        return _normalize(centroids).astype(np.float32)
+
+    @classmethod
+    def calibrate(
+        cls,
+        store,
+        in_domain: np.ndarray,
+        off_topic: np.ndarray,
+        quantile: float = 0.05,
+        min_gap: float = 0.1,
+    ) -> "DomainGate":
+        """
+        Calcule les centroïdes et calibre les seuils à partir de questions du
+        domaine et de questions hors sujet (embeddings normalisés).
+
+        Args:
+            store: Magasin de chunks (vecteurs du corpus)
+            in_domain: Embeddings de questions relevant de la loi
+            off_topic: Embeddings de questions hors sujet (OFF_TOPIC_PROBES)
+            quantile: Part des questions du domaine tolérée sous les seuils
+            min_gap: Écart appliqué entre les deux seuils de pertinence lorsque
+                les distributions se recouvrent (le seuil "sans réponse" reste
+                strictement supérieur au seuil "hors sujet")
+        """
+        centroids = cls.corpus_centroids(store)
+        gate_threshold = _separating_threshold(
+            (in_domain @ centroids.T).max(axis=1),
+            (off_topic @ centroids.T).max(axis=1),
+            quantile,
+        )
+
+        # Meilleur score de passage (similarité ramenée dans [0, 1]) de chaque question
+        vectors = np.asarray(store.vectors, dtype=np.float32)
+        in_best = ((in_domain @ vectors.T).max(axis=1) + 1) / 2
+        off_best = ((off_topic @ vectors.T).max(axis=1) + 1) / 2
+        min_similarity_score = _separating_threshold(in_best, off_best, quantile)
+        answerable_score = float(np.quantile(in_best, quantile))
+        if answerable_score <= min_similarity_score:
+            answerable_score = min_similarity_score + min_gap
+        return cls(centroids, gate_threshold, min_similarity_score, answerable_score)
+
+    def scores(self, query_embeddings: np.ndarray) -> np.ndarray:
+        """Similarité de chaque requête avec le centroïde le plus proche"""
+        return (np.atleast_2d(query_embeddings) @ self.centroids.T).max(axis=1)
+
+    def accepts_batch(self, query_embeddings: np.ndarray) -> np.ndarray:
+        """Masque des requêtes relevant du domaine"""
+        accepted = self.scores(query_embeddings) >= self.gate_threshold
+        self.checked += len(accepted)
+        self.rejected += int((~accepted).sum())
+        return accepted
+
+    def accepts(self, query_embedding: np.ndarray) -> bool:
+        return bool(self.accepts_batch(query_embedding)[0])
+
+    def thresholds(self) -> Dict[str, float]:
+        return {
+            "gate_threshold": self.gate_threshold,
+            "min_similarity_score": self.min_similarity_score,
+            "answerable_score": self.answerable_score,
+        }
+
+    def stats(self) -> Dict[str, float]:
+        """Compteurs des requêtes filtrées et seuils en vigueur"""
+        return {"checked": self.checked, "rejected": self.rejected, **self.thresholds()}
+
+    def save(self, path: str):
+        with open(path, "wb") as f:
+            np.savez(
+                f,
+                centroids=self.centroids,
+                **{
+                    name: np.float32(value) for name, value in self.thresholds().items()
+                },
+            )
+
+    @classmethod
+    def load(cls, path: str) -> "DomainGate":
+        with np.load(path, allow_pickle=False) as data:
+            return cls(
+                data["centroids"],
+                float(data["gate_threshold"]),
+                float(data["min_similarity_score"]),
+                float(data["answerable_score"]),
+            )
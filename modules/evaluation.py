@@ -0,0 +1,120 @@
+import time
+import faiss
+import numpy as np
+from typing import List, Dict, Any, Callable
+
+from modules.retriever import exact_rescore
+
+
+def sample_queries(
+    vectors: np.ndarray, n_queries: int = 200, seed: int = 0
+) -> np.ndarray:
+    """
+    Requêtes de test tirées du corpus : vecteurs de chunks légèrement bruités
+    puis renormalisés (à défaut de questions réelles).
+    """
+    rng = np.random.default_rng(seed)
+    n_queries = min(n_queries, len(vectors))
+    rows = rng.choice(len(vectors), size=n_queries, replace=False)
+    queries = np.asarray(vectors[np.sort(rows)], dtype="float32")
+    queries = queries + rng.normal(scale=0.02, size=queries.shape).astype("float32")
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    return queries
+
+
+def exact_neighbors(
+    vectors: np.ndarray, ids: np.ndarray, queries: np.ndarray, k: int
+) -> np.ndarray:
+    """Identifiants des k plus proches voisins exacts (produit scalaire)"""
+    index = faiss.IndexFlatIP(vectors.shape[1])
+    index.add(np.ascontiguousarray(vectors, dtype="float32"))
+    _, rows = index.search(queries, k)
+    return np.where(rows >= 0, np.asarray(ids)[rows], -1)
+
+
+def recall_at_k(found_ids: np.ndarray, true_ids: np.ndarray) -> float:
+    """Proportion moyenne des vrais k plus proches voisins retrouvés"""
+    k = true_ids.shape[1]
+    hits = [
+        len(set(found[found >= 0].tolist()) & set(true[true >= 0].tolist()))
+        for found, true in zip(found_ids, true_ids)
+    ]
+    return float(np.mean(hits)) / k
+
+
+def measure_search(
+    search: Callable[[np.ndarray, int], np.ndarray],
+    queries: np.ndarray,
+    true_ids: np.ndarray,
+    k: int,
+) -> Dict[str, float]:
+    """
+    Rappel@k et latence par requête (une requête à la fois, comme dans l'API)
+    d'une fonction de recherche renvoyant des identifiants de chunks.
+    """
+    latencies = []
+    found = np.full((len(queries), k), -1, dtype="int64")
+    for i, query in enumerate(queries):
+        start = time.perf_counter()
+        result = search(query.reshape(1, -1), k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        found[i, : result.shape[1]] = result[0, :k]
+    latencies = np.array(latencies)
+    return {
+        "recall": recall_at_k(found, true_ids),
+        "latency_ms_mean": float(latencies.mean()),
+        "latency_ms_p50": float(np.percentile(latencies, 50)),
+        "latency_ms_p95": float(np.percentile(latencies, 95)),
+    }
+
+
+def index_search(index) -> Callable[[np.ndarray, int], np.ndarray]:
+    """Fonction de recherche renvoyant les identifiants d'un index FAISS"""
+
+    def search(query: np.ndarray, k: int) -> np.ndarray:
+        if isinstance(index, faiss.IndexBinary):
+            query = np.packbits(query > 0, axis=1)
+        _, ids = index.search(query, k)
+        return ids
+
+    return search
+
+
+def rescored_search(
+    index, store, rescore_factor: int = 10
+) -> Callable[[np.ndarray, int], np.ndarray]:
+    """
+    Recherche en deux temps : liste restreinte de k * rescore_factor
+    candidats dans l'index compressé, puis re-classement exact sur les
+    vecteurs pleine précision du magasin.
+    """
+    coarse = index_search(index)
+
+    def search(query: np.ndarray, k: int) -> np.ndarray:
+        return exact_rescore(coarse(query, k * rescore_factor), query, store, k)
+
+    return search
+
+
+def index_memory_bytes(index) -> int:
+    """Taille sérialisée d'un index FAISS (approximation de son empreinte mémoire)"""
+    if isinstance(index, faiss.IndexBinary):
+        return int(faiss.serialize_index_binary(index).size)
+    return int(faiss.serialize_index(index).size)
+
+
+def print_report(title: str, rows: List[Dict[str, Any]], k: int):
+    """Affiche un tableau comparatif des variantes évaluées"""
+    print(f"\n{title}")
+    print(
+        f"{'variante':<16} {'recall@' + str(k):>10} {'perte':>8} {'moy. (ms)':>10} "
+        f"{'p50 (ms)':>10} {'p95 (ms)':>10} {'mémoire':>12}"
+    )
+    for row in rows:
+        memory = row.get("memory_bytes")
+        memory = f"{memory / 1024 / 1024:.2f} Mo" if memory is not None else "-"
+        print(
+            f"{row['name']:<16} {row['recall']:>10.3f} {1 - row['recall']:>8.3f} "
+            f"{row['latency_ms_mean']:>10.3f} {row['latency_ms_p50']:>10.3f} "
+            f"{row['latency_ms_p95']:>10.3f} {memory:>12}"
+        )
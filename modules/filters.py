@@ -0,0 +1,103 @@
+import numpy as np
+from typing import Optional, Tuple
+
+from modules.processor import normalize_article_number
+
+_ROMAN_NUMERALS = {"i": 1, "v": 5, "x": 10, "l": 50, "c": 100}
+
+
+def _ordinal(token: str) -> str:
+    """Numéro de chapitre ou de section en décimal ("premier" -> "1", "iv" -> "4")"""
+    if token in ("premier", "première", "premiere", "1er", "1ère"):
+        return "1"
+    if token and all(c in _ROMAN_NUMERALS for c in token):
+        total = 0
+        for current, following in zip(token, token[1:] + " "):
+            value = _ROMAN_NUMERALS[current]
+            total += -value if _ROMAN_NUMERALS.get(following, 0) > value else value
+        return str(total)
+    return token
+
+
+def _label(value: str) -> str:
+    """
+    Partie identifiante d'un intitulé, numéro normalisé
+    ("Chapitre V: ..." -> "chapitre 5", "Section première: ..." -> "section 1")
+    """
+    words = value.split(":", 1)[0].strip().lower().split()
+    return " ".join(words[:1] + [_ordinal(word) for word in words[1:]])
+
+
+class MetadataBitmapIndex:
+    """
+    Index bitmap des métadonnées du magasin de chunks.
+
+    Pour chaque chapitre et chaque section, l'ensemble des lignes concernées
+    est précalculé sous forme de bitmap compacte (np.packbits) ; un filtre se
+    résout par quelques opérations binaires, sans parcourir les chunks. Les
+    numéros d'article sont conservés dans une colonne entière pour les
+    filtres par intervalle.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.n_rows = len(store)
+        self.bitmaps = {}
+        for name in ("chapter", "section"):
+            column = store.columns[name]
+            self.bitmaps[name] = [
+                np.packbits(column == position)
+                for position in range(len(store.tables[name]))
+            ]
+
+        # Numéro d'article entier (-1 si non numérique)
+        numbers = []
+        for value in store.tables["article_number"]:
+            number = normalize_article_number(value)
+            numbers.append(int(number) if number.isdigit() else -1)
+        numbers = np.array(numbers + [-1], dtype=np.int32)
+        # La position -1 (numéro absent) désigne le dernier élément
+        self.article_numbers = numbers[store.columns["article_number"]]
+
+    def _value_bitmap(self, name: str, query: str) -> np.ndarray:
+        """Union des bitmaps des valeurs correspondant au filtre ("Chapitre V", ...)"""
+        query = query.strip().lower()
+        bitmap = np.zeros((self.n_rows + 7) // 8, dtype=np.uint8)
+        for position, value in enumerate(self.store.tables[name]):
+            if value.lower() == query or _label(value) == _label(query):
+                bitmap |= self.bitmaps[name][position]
+        return bitmap
+
+    def mask(
+        self,
+        chapter: Optional[str] = None,
+        section: Optional[str] = None,
+        article_range: Optional[Tuple[int, int]] = None,
+    ) -> Optional[np.ndarray]:
+        """
+        Masque booléen des lignes satisfaisant tous les filtres,
+        ou None si aucun filtre n'est demandé.
+
+        La numérotation des sections reprend dans chaque chapitre ("Section
+        II" existe dans plusieurs chapitres) : une section n'est donc
+        identifiée que par le couple (chapitre, section), et le filtre de
+        section exige un chapitre.
+        """
+        if section and not chapter:
+            raise ValueError("Le filtre de section exige un filtre de chapitre")
+        bitmaps = []
+        if chapter:
+            bitmaps.append(self._value_bitmap("chapter", chapter))
+        if section:
+            bitmaps.append(self._value_bitmap("section", section))
+        if not bitmaps and article_range is None:
+            return None
+
+        mask = np.ones(self.n_rows, dtype=bool)
+        if bitmaps:
+            combined = np.bitwise_and.reduce(bitmaps)
+            mask &= np.unpackbits(combined, count=self.n_rows).astype(bool)
+        if article_range is not None:
+            first, last = article_range
+            mask &= (self.article_numbers >= first) & (self.article_numbers <= last)
+        return mask
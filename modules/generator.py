@@ -1,61 +1,21 @@
 import os
-from typing import List, Dict, Any
-import google.generativeai as genai
+from typing import List, Dict, Any, AsyncIterator, Optional
 
+ERROR_RESPONSE = "Je suis désolé, je ne peux pas générer une réponse en ce moment en raison d'une erreur technique."
 
-def generate_response(
-    query: str, retrieved_chunks: List[Dict[Any, Any]], api_key: str = None
-) -> str:
-    """
-    Génère une réponse à la requête de l'utilisateur en utilisant les chunks récupérés comme contexte.
-    Fonction adaptée depuis la base de connaissance fournie.
-
-    Args:
-        query: La question posée par l'utilisateur
-        retrieved_chunks: Liste des chunks pertinents récupérés par le retriever
-        api_key: Clé API pour Gemini (peut être définie comme variable d'environnement)
-
-    Returns:
-        str: Réponse générée
-    """
-    try:
-        # Configuration de l'API Gemini
-        if api_key is None:
-            api_key = os.environ.get("GEMINI_API_KEY")
-
-        if not api_key:
-            raise ValueError(
-                "Aucune clé API Gemini fournie. Utilisez le paramètre api_key ou définissez la variable d'environnement GEMINI_API_KEY."
-            )
-
-        genai.configure(api_key=api_key)
-
-        # Sélection du modèle
-        model = genai.GenerativeModel(
-            "gemini-1.5-flash",
-            generation_config={
-                "temperature": 0.2,  # Valeur basse pour favoriser la précision et la cohérence
-                "top_p": 0.95,  # Contrôle la diversité de manière plus fine que la température
-                "top_k": 40,  # Limite le nombre de tokens considérés à chaque étape
-                "max_output_tokens": 2048,  # Longueur maximale de la réponse générée
-                "presence_penalty": 0.2,  # Pénalise légèrement la répétition de contenu
-            },
-        )
+DEFAULT_MODEL_NAME = "gemini-1.5-flash"
 
-        # Construction du contexte à partir des chunks récupérés
-        context = ""
-        for i, chunk in enumerate(retrieved_chunks):
-            # Extraction des métadonnées pertinentes
-            chapter = chunk["metadata"].get("chapter", "Chapitre non spécifié")
-            section = chunk["metadata"].get("section", "Section non spécifiée")
-            article = chunk["metadata"].get("article", "Article non spécifié")
+GENERATION_CONFIG = {
+    "temperature": 0.2,  # Valeur basse pour favoriser la précision et la cohérence
+    "top_p": 0.95,  # Contrôle la diversité de manière plus fine que la température
+    "top_k": 40,  # Limite le nombre de tokens considérés à chaque étape
+    "max_output_tokens": 2048,  # Longueur maximale de la réponse générée
+    "presence_penalty": 0.2,  # Pénalise légèrement la répétition de contenu
+}
 
-            # Ajouter le chunk au contexte avec ses références
-            context += f"Référence {i+1}: {chapter} | {section} | {article}\n"
-            context += f"{chunk['text']}\n\n"
-
-        # Construction du prompt pour le modèle
-        prompt = f"""
+# Gabarit du prompt, construit une seule fois au chargement du module.
+# Seuls {query} et {context} sont substitués à chaque requête.
+PROMPT_TEMPLATE = """
         # Contexte
         Vous êtes en train d'assister un utilisateur qui recherche des informations sur la loi sénégalaise sur la protection des données personnelles. L'utilisateur a posé la question suivante: "{query}"
         
@@ -84,18 +44,159 @@ def generate_response(
         ## Réponse:
         """
 
-        # Génération de la réponse
-        response = model.generate_content(prompt)
 
-        # Nettoyage et formatage de la réponse
-        answer = response.text.strip()
+class ResponseGenerator:
+    """
+    Générateur de réponses Gemini à longue durée de vie.
 
-        return answer
+    Une instance est créée une seule fois au démarrage de l'API : l'API Gemini
+    est configurée une fois, le modèle (et ses clients synchrone et asynchrone,
+    qui conservent leur canal de transport ouvert entre les requêtes) est
+    réutilisé, et le gabarit du prompt est précompilé.
+    """
 
-    except Exception as e:
-        # Gestion des erreurs
-        error_message = (
-            f"Une erreur s'est produite lors de la génération de la réponse: {str(e)}"
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        model_name: str = DEFAULT_MODEL_NAME,
+        transport: Optional[str] = None,
+    ):
+        """
+        Args:
+            api_key: Clé API pour Gemini (peut être définie comme variable d'environnement)
+            model_name: Nom du modèle Gemini à utiliser
+            transport: Transport de l'API Gemini ("grpc" ou "rest"). Le canal gRPC
+                (HTTP/2) et la session REST sont tous deux persistants.
+        """
+        if api_key is None:
+            api_key = os.environ.get("GEMINI_API_KEY")
+
+        self.model = None
+        if not api_key:
+            print(
+                "Aucune clé API Gemini fournie. Utilisez le paramètre api_key ou définissez la variable d'environnement GEMINI_API_KEY."
+            )
+            return
+
+        # Import différé : le client Gemini n'est chargé que si une clé est fournie
+        import google.generativeai as genai
+
+        genai.configure(api_key=api_key, transport=transport)
+        self.model = genai.GenerativeModel(
+            model_name, generation_config=GENERATION_CONFIG
         )
-        print(error_message)
-        return "Je suis désolé, je ne peux pas générer une réponse en ce moment en raison d'une erreur technique."
+
+    def _get_model(self):
+        if self.model is None:
+            raise ValueError(
+                "Aucune clé API Gemini fournie. Utilisez le paramètre api_key ou définissez la variable d'environnement GEMINI_API_KEY."
+            )
+        return self.model
+
+    @staticmethod
+    def build_prompt(query: str, retrieved_chunks: List[Dict[Any, Any]]) -> str:
+        """Construit le prompt envoyé au modèle à partir des chunks récupérés"""
+        # Construction du contexte à partir des chunks récupérés
+        parts = []
+        for i, chunk in enumerate(retrieved_chunks):
+            # Extraction des métadonnées pertinentes
+            chapter = chunk["metadata"].get("chapter", "Chapitre non spécifié")
+            section = chunk["metadata"].get("section", "Section non spécifiée")
+            article = chunk["metadata"].get("article", "Article non spécifié")
+
+            # Ajouter le chunk au contexte avec ses références
+            parts.append(f"Référence {i+1}: {chapter} | {section} | {article}\n")
+            parts.append(f"{chunk['text']}\n\n")
+
+        return PROMPT_TEMPLATE.format(query=query, context="".join(parts))
+
+    def generate(self, query: str, retrieved_chunks: List[Dict[Any, Any]]) -> str:
+        """
+        Génère une réponse à la requête de l'utilisateur en utilisant les chunks récupérés comme contexte.
+
+        Args:
+            query: La question posée par l'utilisateur
+            retrieved_chunks: Liste des chunks pertinents récupérés par le retriever
+
+        Returns:
+            str: Réponse générée
+        """
+        try:
+            model = self._get_model()
+            prompt = self.build_prompt(query, retrieved_chunks)
+
+            # Génération de la réponse
+            response = model.generate_content(prompt)
+
+            # Nettoyage et formatage de la réponse
+            return response.text.strip()
+
+        except Exception as e:
+            # Gestion des erreurs
+            error_message = f"Une erreur s'est produite lors de la génération de la réponse: {str(e)}"
+            print(error_message)
+            return ERROR_RESPONSE
+
+    async def generate_async(
+        self, query: str, retrieved_chunks: List[Dict[Any, Any]]
+    ) -> str:
+        """
+        Version asynchrone de generate.
+        L'appel à Gemini passe par le client asynchrone et ne bloque donc pas
+        la boucle d'événements de l'API pendant la génération.
+        """
+        try:
+            model = self._get_model()
+            prompt = self.build_prompt(query, retrieved_chunks)
+
+            # Génération de la réponse sans bloquer la boucle d'événements
+            response = await model.generate_content_async(prompt)
+
+            return response.text.strip()
+
+        except Exception as e:
+            error_message = f"Une erreur s'est produite lors de la génération de la réponse: {str(e)}"
+            print(error_message)
+            return ERROR_RESPONSE
+
+    async def stream_async(
+        self, query: str, retrieved_chunks: List[Dict[Any, Any]]
+    ) -> AsyncIterator[str]:
+        """
+        Génère la réponse en flux : les fragments de texte sont renvoyés au fur
+        et à mesure de leur production par Gemini.
+        """
+        try:
+            model = self._get_model()
+            prompt = self.build_prompt(query, retrieved_chunks)
+
+            response = await model.generate_content_async(prompt, stream=True)
+            async for chunk in response:
+                # Certains fragments (métadonnées, filtrage) ne contiennent pas de texte
+                text = chunk.text if chunk.parts else ""
+                if text:
+                    yield text
+
+        except Exception as e:
+            error_message = f"Une erreur s'est produite lors de la génération de la réponse: {str(e)}"
+            print(error_message)
+            yield ERROR_RESPONSE
+
+
+def generate_response(
+    query: str, retrieved_chunks: List[Dict[Any, Any]], api_key: str = None
+) -> str:
+    """
+    Génère une réponse à la requête de l'utilisateur en utilisant les chunks récupérés comme contexte.
+    Fonction conservée pour les usages ponctuels (scripts) ; l'API réutilise
+    une instance unique de ResponseGenerator.
+
+    Args:
+        query: La question posée par l'utilisateur
+        retrieved_chunks: Liste des chunks pertinents récupérés par le retriever
+        api_key: Clé API pour Gemini (peut être définie comme variable d'environnement)
+
+    Returns:
+        str: Réponse générée
+    """
+    return ResponseGenerator(api_key=api_key).generate(query, retrieved_chunks)
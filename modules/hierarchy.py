@@ -0,0 +1,135 @@
+import numpy as np
+from typing import Optional
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+class LawHierarchy:
+    """
+    Représentation hiérarchique (chapitre -> section -> chunks) du magasin.
+
+    Chaque section et chaque chapitre est représenté par le centroïde
+    normalisé des vecteurs de ses chunks. Les lignes de chaque section sont
+    stockées de manière contiguë (format CSR) : les lignes de la section s
+    sont section_rows[section_indptr[s]:section_indptr[s + 1]].
+    """
+
+    def __init__(
+        self,
+        section_indptr: np.ndarray,
+        section_rows: np.ndarray,
+        section_chapters: np.ndarray,
+        section_vectors: np.ndarray,
+        chapter_vectors: np.ndarray,
+    ):
+        self.section_indptr = section_indptr
+        self.section_rows = section_rows
+        self.section_chapters = section_chapters
+        self.section_vectors = section_vectors
+        self.chapter_vectors = chapter_vectors
+
+    @property
+    def n_rows(self) -> int:
+        return len(self.section_rows)
+
+    @classmethod
+    def build(cls, store) -> "LawHierarchy":
+        """Calcule les centroïdes des sections et des chapitres du magasin"""
+        chapters = store.columns["chapter"].astype(np.int64)
+        sections = store.columns["section"].astype(np.int64)
+        vectors = np.asarray(store.vectors, dtype=np.float32)
+
+        # Une section est identifiée par le couple (chapitre, section)
+        keys = (chapters + 1) * (len(store.tables["section"]) + 1) + sections + 1
+        section_keys, row_sections = np.unique(keys, return_inverse=True)
+        section_rows = np.argsort(row_sections, kind="stable").astype(np.int32)
+        counts = np.bincount(row_sections, minlength=len(section_keys))
+        section_indptr = np.zeros(len(section_keys) + 1, dtype=np.int64)
+        np.cumsum(counts, out=section_indptr[1:])
+
+        sums = np.add.reduceat(vectors[section_rows], section_indptr[:-1], axis=0)
+        section_vectors = _normalize(sums)
+
+        # Chapitre de chaque section, puis centroïdes des chapitres
+        first_rows = section_rows[section_indptr[:-1]]
+        chapter_ids, section_chapters = np.unique(
+            chapters[first_rows], return_inverse=True
+        )
+        chapter_sums = np.zeros((len(chapter_ids), vectors.shape[1]), np.float32)
+        np.add.at(chapter_sums, section_chapters, sums)
+
+        return cls(
+            section_indptr,
+            section_rows,
+            section_chapters.astype(np.int32),
+            section_vectors.astype(np.float32),
+            _normalize(chapter_sums).astype(np.float32),
+        )
+
+    def candidate_rows(
+        self,
+        query_embedding: np.ndarray,
+        top_chapters: int = 2,
+        top_sections: int = 4,
+        mask: Optional[np.ndarray] = None,
+    ) -> np.ndarray:
+        """
+        Lignes des chunks des top_sections sections les plus proches de la
+        requête, choisies parmi les sections des top_chapters chapitres les
+        plus proches. Avec un masque de lignes (filtres), seuls les chapitres
+        et sections contenant au moins une ligne sélectionnée sont considérés,
+        et seules les lignes sélectionnées sont renvoyées.
+        """
+        allowed_sections = np.ones(len(self.section_vectors), dtype=bool)
+        if mask is not None:
+            allowed_sections = (
+                np.add.reduceat(mask[self.section_rows], self.section_indptr[:-1]) > 0
+            )
+            if not allowed_sections.any():
+                return np.zeros(0, dtype=self.section_rows.dtype)
+
+        allowed_chapters = np.unique(self.section_chapters[allowed_sections])
+        chapter_scores = self.chapter_vectors[allowed_chapters] @ query_embedding
+        top_chapters = min(top_chapters, len(chapter_scores))
+        best_chapters = allowed_chapters[
+            np.argpartition(-chapter_scores, top_chapters - 1)[:top_chapters]
+        ]
+
+        sections = np.flatnonzero(
+            allowed_sections & np.isin(self.section_chapters, best_chapters)
+        )
+        section_scores = self.section_vectors[sections] @ query_embedding
+        top_sections = min(top_sections, len(sections))
+        best = np.argpartition(-section_scores, top_sections - 1)[:top_sections]
+
+        starts = self.section_indptr[sections[best]]
+        ends = self.section_indptr[sections[best] + 1]
+        rows = np.concatenate(
+            [self.section_rows[start:end] for start, end in zip(starts, ends)]
+        )
+        return rows if mask is None else rows[mask[rows]]
+
+    def save(self, path: str):
+        with open(path, "wb") as f:
+            np.savez(
+                f,
+                section_indptr=self.section_indptr,
+                section_rows=self.section_rows,
+                section_chapters=self.section_chapters,
+                section_vectors=self.section_vectors,
+                chapter_vectors=self.chapter_vectors,
+            )
+
+    @classmethod
+    def load(cls, path: str) -> "LawHierarchy":
+        with np.load(path, allow_pickle=False) as data:
+            return cls(
+                data["section_indptr"],
+                data["section_rows"],
+                data["section_chapters"],
+                data["section_vectors"],
+                data["chapter_vectors"],
+            )
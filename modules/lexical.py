@@ -0,0 +1,192 @@
+import re
+import unicodedata
+import numpy as np
+from typing import List, Optional, Tuple
+
+# Mots vides français (sans accents, après normalisation)
+FRENCH_STOPWORDS = frozenset("""
+    a au aux avec ce ces cet cette dans de des du elle elles en et eux il ils je
+    la le les leur leurs lui ma mais me meme mes moi mon ne nos notre nous on ou
+    par pas pour qu que qui sa se ses son sur ta te tes toi ton tu un une vos
+    votre vous y est sont ete etre avoir ont a etait sera seront fait peut
+    peuvent doit doivent tout tous toute toutes comme si sans sous entre selon
+    ainsi dont quel quelle quels quelles lorsque afin cas
+    """.split())
+
+# Articles et pronoms élidés : l', d', qu', jusqu'...
+_ELISION = re.compile(r"\b(?:l|d|j|m|n|s|t|c|qu|lorsqu|puisqu|jusqu|quoiqu)'")
+_TOKEN = re.compile(r"[a-z0-9]+(?:-[a-z0-9]+)*")
+
+
+def strip_accents(text: str) -> str:
+    """Supprime les accents (é -> e, ç -> c)"""
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def _stem(token: str) -> str:
+    """Racinisation légère : suppression du pluriel"""
+    if len(token) > 4 and token[-1] in "sx" and not token.isdigit():
+        return token[:-1]
+    return token
+
+
+def tokenize_fr(text: str) -> List[str]:
+    """
+    Tokenisation adaptée au français juridique : minuscules, accents supprimés,
+    élisions retirées, mots vides ignorés, pluriels ramenés au singulier.
+    Les mots composés ("sous-traitant") sont conservés entiers et leurs
+    composants significatifs sont également indexés.
+    """
+    text = strip_accents(text.lower()).replace("’", "'")
+    text = _ELISION.sub(" ", text)
+    tokens = []
+    for token in _TOKEN.findall(text):
+        if "-" in token:
+            parts = token.split("-")
+            if not all(part in FRENCH_STOPWORDS for part in parts):
+                tokens.append(_stem(token))
+        else:
+            parts = [token]
+        for part in parts:
+            if part not in FRENCH_STOPWORDS and (len(part) > 1 or part.isdigit()):
+                tokens.append(_stem(part))
+    return tokens
+
+
+def reciprocal_rank_fusion(
+    rankings: List[np.ndarray], k: int = 60
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Fusion par rang réciproque (RRF) de plusieurs classements de lignes.
+
+    Returns:
+        (lignes triées par score fusionné décroissant, scores fusionnés)
+    """
+    rankings = [np.asarray(ranking, dtype=np.int64) for ranking in rankings]
+    rankings = [ranking for ranking in rankings if len(ranking)]
+    if not rankings:
+        return np.zeros(0, dtype=np.int64), np.zeros(0)
+    rows = np.concatenate(rankings)
+    contributions = np.concatenate(
+        [1.0 / (k + np.arange(1, len(ranking) + 1)) for ranking in rankings]
+    )
+    unique_rows, inverse = np.unique(rows, return_inverse=True)
+    scores = np.bincount(inverse, weights=contributions)
+    order = np.argsort(-scores, kind="stable")
+    return unique_rows[order], scores[order]
+
+
+class BM25Index:
+    """
+    Index inversé BM25 au format CSR.
+
+    Pour chaque terme du vocabulaire, les listes de documents (int32) et les
+    poids BM25 déjà calculés (float32) sont stockés de manière contiguë ; le
+    score d'une requête est une simple accumulation vectorisée de ces poids.
+    Les documents correspondent aux lignes du ChunkStore.
+    """
+
+    def __init__(self, vocabulary, indptr, doc_ids, weights, n_docs):
+        self.vocabulary = vocabulary
+        self.indptr = indptr
+        self.doc_ids = doc_ids
+        self.weights = weights
+        self.n_docs = n_docs
+
+    @classmethod
+    def build(cls, texts: List[str], k1: float = 1.5, b: float = 0.75) -> "BM25Index":
+        """Construit l'index à partir des textes (un document par ligne du magasin)"""
+        vocabulary = {}
+        term_ids, doc_ids, counts = [], [], []
+        doc_lengths = np.zeros(len(texts), dtype=np.float32)
+        for doc, text in enumerate(texts):
+            tokens = tokenize_fr(text)
+            doc_lengths[doc] = len(tokens)
+            frequencies = {}
+            for token in tokens:
+                term = vocabulary.setdefault(token, len(vocabulary))
+                frequencies[term] = frequencies.get(term, 0) + 1
+            term_ids.extend(frequencies.keys())
+            doc_ids.extend([doc] * len(frequencies))
+            counts.extend(frequencies.values())
+
+        term_ids = np.array(term_ids, dtype=np.int64)
+        doc_ids = np.array(doc_ids, dtype=np.int32)
+        counts = np.array(counts, dtype=np.float32)
+
+        # Tri par terme puis par document : disposition CSR
+        order = np.lexsort((doc_ids, term_ids))
+        term_ids, doc_ids, counts = term_ids[order], doc_ids[order], counts[order]
+        document_frequency = np.bincount(term_ids, minlength=len(vocabulary))
+        indptr = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        np.cumsum(document_frequency, out=indptr[1:])
+
+        n_docs = len(texts)
+        idf = np.log(
+            1 + (n_docs - document_frequency + 0.5) / (document_frequency + 0.5)
+        )
+        average_length = doc_lengths.mean() if n_docs else 0.0
+        norm = k1 * (1 - b + b * doc_lengths[doc_ids] / max(average_length, 1e-9))
+        weights = idf[term_ids] * counts * (k1 + 1) / (counts + norm)
+        weights = weights.astype(np.float32)
+
+        return cls(vocabulary, indptr, doc_ids, weights, n_docs)
+
+    def scores(self, query: str) -> np.ndarray:
+        """Score BM25 de chaque document pour la requête"""
+        term_ids = [
+            self.vocabulary[token]
+            for token in set(tokenize_fr(query))
+            if token in self.vocabulary
+        ]
+        if not term_ids:
+            return np.zeros(self.n_docs, dtype=np.float32)
+        slices = [slice(self.indptr[t], self.indptr[t + 1]) for t in term_ids]
+        docs = np.concatenate([self.doc_ids[s] for s in slices])
+        weights = np.concatenate([self.weights[s] for s in slices])
+        return np.bincount(docs, weights=weights, minlength=self.n_docs)
+
+    def search(
+        self, query: str, top_k: int = 10, mask: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Lignes des top_k documents (score > 0) et leurs scores, par score
+        décroissant ; mask restreint la recherche à certaines lignes.
+        """
+        scores = self.scores(query)
+        selected = scores > 0
+        if mask is not None:
+            selected &= mask
+        candidates = np.flatnonzero(selected)
+        if len(candidates) > top_k:
+            best = np.argpartition(-scores[candidates], top_k - 1)[:top_k]
+            candidates = candidates[best]
+        order = np.argsort(-scores[candidates], kind="stable")
+        rows = candidates[order]
+        return rows, scores[rows]
+
+    def save(self, path: str):
+        """Sauvegarde compacte (npz, sans pickle)"""
+        terms = sorted(self.vocabulary, key=self.vocabulary.get)
+        with open(path, "wb") as f:
+            np.savez(
+                f,
+                terms=np.array(terms, dtype=str),
+                indptr=self.indptr,
+                doc_ids=self.doc_ids,
+                weights=self.weights,
+                n_docs=np.array(self.n_docs),
+            )
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        with np.load(path, allow_pickle=False) as data:
+            vocabulary = {term: i for i, term in enumerate(data["terms"].tolist())}
+            return cls(
+                vocabulary,
+                data["indptr"],
+                data["doc_ids"],
+                data["weights"],
+                int(data["n_docs"]),
+            )
@@ -1,8 +1,38 @@
-from pydantic import BaseModel, Field
-from typing import List, Dict, Any, Union
+from pydantic import BaseModel, Field, model_validator
+from typing import List, Dict, Any, Union, Optional, Tuple
 
 
-class ChatRequest(BaseModel):
+class SearchFilters(BaseModel):
+    """Filtres optionnels restreignant la recherche à une partie de la loi"""
+
+    chapter: Optional[str] = Field(
+        default=None,
+        description='Chapitre (intitulé complet ou "Chapitre V")',
+    )
+    section: Optional[str] = Field(
+        default=None,
+        description='Section du chapitre choisi (intitulé complet ou "Section 2")',
+    )
+    article_range: Optional[Tuple[int, int]] = Field(
+        default=None, description="Intervalle de numéros d'articles (bornes incluses)"
+    )
+
+    @model_validator(mode="after")
+    def section_requires_chapter(self):
+        # Les sections sont numérotées dans chaque chapitre
+        if self.section and not self.chapter:
+            raise ValueError("Le filtre de section exige un filtre de chapitre")
+        return self
+
+    def search_filters(self) -> Optional[Dict[str, Any]]:
+        """Filtres renseignés, au format attendu par le Retriever (None si aucun)"""
+        filters = self.model_dump(
+            include={"chapter", "section", "article_range"}, exclude_none=True
+        )
+        return filters or None
+
+
+class ChatRequest(SearchFilters):
     """Requête de chat"""
 
     message: str = Field(..., description="Message de l'utilisateur")
@@ -15,3 +45,20 @@ class ChatResponse(BaseModel):
     sources: List[Dict[str, Union[str, float]]] = Field(
         default=[], description="Sources utilisées"
     )
+
+
+class ChatBatchRequest(SearchFilters):
+    """
+    Requête de chat groupée (plusieurs questions en un seul appel).
+    Les filtres éventuels s'appliquent à toutes les questions.
+    """
+
+    messages: List[str] = Field(..., description="Questions de l'utilisateur")
+
+
+class ChatBatchResponse(BaseModel):
+    """Réponses du chatbot, dans l'ordre des questions reçues"""
+
+    responses: List[ChatResponse] = Field(
+        default=[], description="Réponses générées, une par question"
+    )
@@ -0,0 +1,192 @@
+import os
+import json
+import numpy as np
+from typing import List, Union
+
+# Fichiers du modèle exporté (répertoire ONNX_MODEL_DIR)
+ENCODER_CONFIG_FILE = "encoder.json"
+FP32_MODEL_FILE = "model.onnx"
+INT8_MODEL_FILE = "model.int8.onnx"
+
+
+def export_onnx_model(
+    model_name: str, output_dir: str, quantize: bool = True, opset: int = 17
+) -> str:
+    """
+    Exporte le transformer d'un modèle sentence-transformers au format ONNX
+    (embeddings des tokens), avec une variante quantifiée int8 (quantification
+    dynamique des poids). Le regroupement par moyenne est refait à l'encodage,
+    comme dans le modèle d'origine.
+
+    Args:
+        model_name: Modèle sentence-transformers (Transformer + Pooling moyen)
+        output_dir: Répertoire de sortie (modèles, tokenizer, configuration)
+        quantize: Produit aussi le modèle quantifié int8
+        opset: Version de l'opset ONNX
+
+    Returns:
+        Chemin du modèle ONNX pleine précision
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer(model_name, device="cpu")
+    transformer, pooling = model[0], model[1]
+    if pooling.get_pooling_mode_str() != "mean":
+        raise ValueError(
+            f"Regroupement {pooling.get_pooling_mode_str()} non pris en charge (moyenne attendue)"
+        )
+    extra_modules = [type(module).__name__ for module in list(model)[2:]]
+    if any(name != "Normalize" for name in extra_modules):
+        raise ValueError(f"Modules non pris en charge: {', '.join(extra_modules)}")
+
+    class TokenEmbeddings(torch.nn.Module):
+        """Sortie du transformer seule : embeddings des tokens"""
+
+        def __init__(self, auto_model):
+            super().__init__()
+            self.auto_model = auto_model
+
+        def forward(self, input_ids, attention_mask):
+            outputs = self.auto_model(
+                input_ids=input_ids, attention_mask=attention_mask
+            )
+            return outputs[0]
+
+    os.makedirs(output_dir, exist_ok=True)
+    transformer.tokenizer.save_pretrained(output_dir)
+
+    fp32_path = os.path.join(output_dir, FP32_MODEL_FILE)
+    dummy = transformer.tokenizer(
+        ["Article premier. Au sens de la présente loi"], return_tensors="pt"
+    )
+    dynamic_axes = {0: "batch", 1: "sequence"}
+    with torch.no_grad():
+        torch.onnx.export(
+            TokenEmbeddings(transformer.auto_model.eval()),
+            (dummy["input_ids"], dummy["attention_mask"]),
+            fp32_path,
+            input_names=["input_ids", "attention_mask"],
+            output_names=["token_embeddings"],
+            dynamic_axes={
+                "input_ids": dynamic_axes,
+                "attention_mask": dynamic_axes,
+                "token_embeddings": dynamic_axes,
+            },
+            opset_version=opset,
+        )
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        quantize_dynamic(
+            fp32_path,
+            os.path.join(output_dir, INT8_MODEL_FILE),
+            weight_type=QuantType.QInt8,
+        )
+
+    with open(
+        os.path.join(output_dir, ENCODER_CONFIG_FILE), "w", encoding="utf-8"
+    ) as f:
+        json.dump(
+            {
+                "model_name": model_name,
+                "max_seq_length": model.get_max_seq_length(),
+                "dimension": model.get_sentence_embedding_dimension(),
+                "quantized": quantize,
+            },
+            f,
+            indent=2,
+        )
+    return fp32_path
+
+
+class OnnxSentenceEncoder:
+    """
+    Encodeur de phrases sur ONNX Runtime (CPU), sans PyTorch.
+
+    Reprend l'interface utilisée de SentenceTransformer (encode,
+    get_sentence_embedding_dimension) : tokenisation identique (troncature à
+    max_seq_length), puis moyenne des embeddings des tokens pondérée par le
+    masque d'attention, comme le module Pooling du modèle d'origine.
+    """
+
+    def __init__(self, model_dir: str, quantized: bool = True, num_threads: int = 0):
+        """
+        Args:
+            model_dir: Répertoire produit par export_onnx_model
+            quantized: Utilise le modèle quantifié int8 s'il a été exporté
+                (sinon, repli sur le modèle fp32)
+            num_threads: Threads ONNX Runtime par encodage (0 : tous les cœurs)
+        """
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        with open(os.path.join(model_dir, ENCODER_CONFIG_FILE), encoding="utf-8") as f:
+            config = json.load(f)
+        self.model_name = config["model_name"]
+        self.max_seq_length = config["max_seq_length"]
+        self.dimension = config["dimension"]
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads > 0:
+            options.intra_op_num_threads = num_threads
+        # Export avec --no-quantize : seul le modèle fp32 est disponible
+        if quantized and not os.path.exists(os.path.join(model_dir, INT8_MODEL_FILE)):
+            print(
+                f"Modèle ONNX quantifié absent de {model_dir}, "
+                "utilisation du modèle fp32"
+            )
+            quantized = False
+        self.quantized = quantized
+        model_file = INT8_MODEL_FILE if quantized else FP32_MODEL_FILE
+        self.session = ort.InferenceSession(
+            os.path.join(model_dir, model_file),
+            options,
+            providers=["CPUExecutionProvider"],
+        )
+        self.input_names = [
+            model_input.name for model_input in self.session.get_inputs()
+        ]
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dimension
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        tokens = self.tokenizer(
+            texts,
+            padding=True,
+            truncation="longest_first",
+            max_length=self.max_seq_length,
+            return_tensors="np",
+        )
+        inputs = {name: tokens[name].astype(np.int64) for name in self.input_names}
+        token_embeddings = self.session.run(None, inputs)[0]
+
+        # Moyenne des embeddings des tokens réels (hors padding)
+        mask = tokens["attention_mask"][..., None].astype(np.float32)
+        summed = (token_embeddings * mask).sum(axis=1)
+        return summed / np.clip(mask.sum(axis=1), 1e-9, None)
+
+    def encode(
+        self,
+        sentences: Union[str, List[str]],
+        batch_size: int = 32,
+        show_progress_bar: bool = False,
+        convert_to_numpy: bool = True,
+    ) -> np.ndarray:
+        """Embeddings (non normalisés) d'un texte ou d'une liste de textes"""
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        embeddings = np.zeros((len(texts), self.dimension), dtype=np.float32)
+
+        # Lots de textes de longueur proche (moins de padding)
+        order = np.argsort([-len(text) for text in texts], kind="stable")
+        for start in range(0, len(texts), batch_size):
+            batch = order[start : start + batch_size]
+            embeddings[batch] = self._encode_batch([texts[i] for i in batch])
+            if show_progress_bar:
+                print(f"  {min(start + batch_size, len(texts))}/{len(texts)} textes")
+        return embeddings[0] if single else embeddings
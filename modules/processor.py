@@ -1,14 +1,13 @@
 import re
 import json
-import nltk
-from typing import Dict, Any
-from nltk.tokenize import sent_tokenize
+from typing import Callable, Dict, Any, List
 
-# Téléchargement des ressources NLTK
-try:
-    nltk.data.find("tokenizers/punkt")
-except LookupError:
-    nltk.download("punkt")
+# Découpage de secours, sans ressource NLTK : fin de phrase suivie d'une
+# majuscule, d'un guillemet ou d'une parenthèse
+SENTENCE_BOUNDARY_PATTERN = re.compile(r"(?<=[.!?…])\s+(?=[«\"(A-ZÀ-ÖØ-Þ])")
+
+# Découpeur de phrases retenu (voir load_sentence_tokenizer)
+_sent_tokenize = None
 
 
 def extract_legal_structure(text):
@@ -181,6 +180,46 @@ def extract_legal_structure(text):
     return law_structure
 
 
+def _regex_sent_tokenize(text: str) -> List[str]:
+    parts = (part.strip() for part in SENTENCE_BOUNDARY_PATTERN.split(text))
+    return [part for part in parts if part]
+
+
+def load_sentence_tokenizer(download: bool = False) -> Callable[[str], List[str]]:
+    """
+    Choisit le découpeur de phrases : punkt de NLTK si la ressource est
+    disponible localement, sinon un découpage par expression régulière.
+    Aucun accès réseau, sauf si download=True (ressource absente).
+    """
+    global _sent_tokenize
+    try:
+        from nltk.tokenize import sent_tokenize
+
+        try:
+            sent_tokenize("Article premier. Test.")
+        except LookupError:
+            if not download:
+                raise
+            import nltk
+
+            for resource in ("punkt", "punkt_tab"):
+                nltk.download(resource, quiet=True)
+            sent_tokenize("Article premier. Test.")
+        _sent_tokenize = sent_tokenize
+    except (ImportError, LookupError):
+        print(
+            "Ressource NLTK punkt indisponible: découpage des phrases par expression régulière"
+        )
+        _sent_tokenize = _regex_sent_tokenize
+    return _sent_tokenize
+
+
+def split_sentences(text: str) -> List[str]:
+    """Découpage d'un texte en phrases (utilisé pour la segmentation des articles longs)"""
+    tokenize = _sent_tokenize or load_sentence_tokenizer()
+    return tokenize(text)
+
+
 def segment_from_json(law_structure, max_chunk_size=1200, overlap=250):
     """
     Fonction de segmentation reprise depuis la base de connaissance fournie.
@@ -203,6 +242,14 @@ def segment_from_json(law_structure, max_chunk_size=1200, overlap=250):
                 if article_match:
                     article_number = article_match.group(1)
 
+                # Articles cités par cet article (renvois internes à la loi)
+                own_number = normalize_article_number(article_number or "")
+                references = [
+                    number
+                    for number in extract_article_references(article_text)
+                    if number != own_number
+                ]
+
                 # Traiter l'article selon sa longueur
                 if len(article_text) + len(header) <= max_chunk_size:
                     chunks.append(
@@ -213,12 +260,13 @@ def segment_from_json(law_structure, max_chunk_size=1200, overlap=250):
                                 "section": section_key,
                                 "article": article_key,
                                 "article_number": article_number,
+                                "references": references,
                             },
                         }
                     )
                 else:
                     # Diviser l'article en préservant le contexte
-                    sentences = sent_tokenize(article_text)
+                    sentences = split_sentences(article_text)
                     current_chunk = header + "\n\n"
 
                     for sentence in sentences:
@@ -233,6 +281,7 @@ def segment_from_json(law_structure, max_chunk_size=1200, overlap=250):
                                         "section": section_key,
                                         "article": article_key,
                                         "article_number": article_number,
+                                        "references": references,
                                         "is_partial": True,
                                     },
                                 }
@@ -256,6 +305,7 @@ def segment_from_json(law_structure, max_chunk_size=1200, overlap=250):
                                     "section": section_key,
                                     "article": article_key,
                                     "article_number": article_number,
+                                    "references": references,
                                     "is_partial": True,
                                 },
                             }
@@ -264,6 +314,80 @@ def segment_from_json(law_structure, max_chunk_size=1200, overlap=250):
     return chunks
 
 
+# Références explicites à des articles : "article 22", "articles 29 à 32",
+# "articles 5, 6 et 7", "article 4.14", "article premier"
+_ARTICLE_NUMBER = r"(?:premier|1er|\d+(?:\.\d+)?)"
+ARTICLE_REFERENCE_PATTERN = re.compile(
+    rf"\barticles?\s+({_ARTICLE_NUMBER}(?:\s*(?:,|et|ou|à|au)\s*{_ARTICLE_NUMBER})*)",
+    re.IGNORECASE,
+)
+_REFERENCE_TOKEN = re.compile(rf"{_ARTICLE_NUMBER}|à|au", re.IGNORECASE)
+MAX_REFERENCE_RANGE = 50
+
+
+def normalize_article_number(number: str) -> str:
+    """Forme canonique d'un numéro d'article ("Premier" -> "1", "4.14" -> "4")"""
+    number = number.strip().lower()
+    if number in ("premier", "1er"):
+        return "1"
+    return number.split(".")[0]
+
+
+def extract_article_references(text: str) -> List[str]:
+    """
+    Extrait les numéros d'articles cités dans un texte, dans l'ordre
+    d'apparition et sans doublon. Les intervalles ("articles 29 à 32") sont
+    développés ; un renvoi à un alinéa ("article 4.14") désigne l'article 4.
+    """
+    references = []
+    for match in ARTICLE_REFERENCE_PATTERN.finditer(text):
+        tokens = _REFERENCE_TOKEN.findall(match.group(1))
+        previous = None
+        range_pending = False
+        for token in tokens:
+            if token.lower() in ("à", "au"):
+                range_pending = previous is not None
+                continue
+            number = normalize_article_number(token)
+            if range_pending and previous.isdigit() and number.isdigit():
+                start, end = int(previous), int(number)
+                if 0 < end - start <= MAX_REFERENCE_RANGE:
+                    references.extend(str(n) for n in range(start + 1, end))
+            references.append(number)
+            previous = number
+            range_pending = False
+    return list(dict.fromkeys(references))
+
+
+def merge_partial_chunks(texts: List[str]) -> str:
+    """
+    Reconstitue le texte d'un article découpé en plusieurs chunks partiels
+    (voir segment_from_json) : l'en-tête de chaque chunk et le chevauchement
+    avec le chunk précédent sont retirés.
+
+    Args:
+        texts: Textes des chunks de l'article, dans l'ordre
+
+    Returns:
+        str: En-tête de l'article suivi de son texte reconstitué
+    """
+    header = texts[0].split("\n\n", 1)[0].replace(" [SUITE]", "")
+    merged_words = []
+    previous_words = []
+    for text in texts:
+        body = text.split("\n\n", 1)[1] if "\n\n" in text else text
+        words = body.split()
+        # Le chunk suivant reprend les derniers mots du chunk précédent (en-tête compris)
+        overlap = 0
+        for size in range(min(len(previous_words), len(words)), 0, -1):
+            if previous_words[-size:] == words[:size]:
+                overlap = size
+                break
+        merged_words.extend(words[overlap:])
+        previous_words = text.split()
+    return f"{header}\n\n{' '.join(merged_words)}"
+
+
 def load_json(filepath: str) -> Dict:
     """Charge un fichier JSON"""
     with open(filepath, "r", encoding="utf-8") as f:
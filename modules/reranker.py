@@ -0,0 +1,194 @@
+import time
+import hashlib
+import threading
+import numpy as np
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from typing import List, Dict, Any, Optional
+
+from modules.vectorizer import normalize_chunk_text
+
+
+def pair_key(query: str, text: str) -> bytes:
+    """Empreinte (16 octets) d'un couple (question, passage)"""
+    key = normalize_chunk_text(query).lower() + "\0" + normalize_chunk_text(text)
+    return hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+
+
+class CrossEncoderReranker:
+    """
+    Ré-ordonnancement des passages candidats par un cross-encoder.
+
+    Tous les couples (question, passage) d'une requête, ou d'un lot de
+    requêtes, sont évalués en un seul appel au modèle, par lots. Les scores
+    déjà calculés sont conservés dans un cache LRU. Le calcul est soumis à un
+    budget de temps : s'il est dépassé, l'ordre du bi-encoder est conservé
+    (le calcul en cours se termine en arrière-plan et alimente le cache ; les
+    calculs encore en attente sont abandonnés).
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        batch_size: int = 32,
+        cache_size: int = 8192,
+        time_budget: Optional[float] = None,
+        max_length: int = 512,
+    ):
+        """
+        Args:
+            model_name: Modèle cross-encoder (sentence-transformers)
+            batch_size: Taille des lots envoyés au modèle
+            cache_size: Nombre maximal de scores conservés en cache
+            time_budget: Durée maximale (secondes) d'un ré-ordonnancement
+                (None : pas de limite)
+            max_length: Longueur maximale (tokens) d'un couple question/passage
+        """
+        # Import différé : inutile au démarrage si le ré-ordonnancement est désactivé
+        from sentence_transformers import CrossEncoder
+
+        self.model_name = model_name
+        self.model = CrossEncoder(model_name, max_length=max_length)
+        self.batch_size = batch_size
+        self.cache_size = cache_size
+        self.time_budget = time_budget
+
+        self.cache = OrderedDict()
+        self._lock = threading.Lock()
+        # Un seul calcul à la fois : le modèle utilise déjà tous les cœurs
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="reranker"
+        )
+
+        self.hits = 0
+        self.misses = 0
+        self.timeouts = 0
+        self.dropped = 0
+
+    def _cached_scores(self, keys: List[bytes]) -> List[Optional[float]]:
+        with self._lock:
+            scores = []
+            for key in keys:
+                score = self.cache.get(key)
+                if score is not None:
+                    self.cache.move_to_end(key)
+                scores.append(score)
+            return scores
+
+    def _score_pairs(
+        self,
+        pairs: List[List[str]],
+        keys: List[bytes],
+        deadline: Optional[float] = None,
+    ) -> Optional[np.ndarray]:
+        """
+        Évalue des couples en un seul appel au modèle et met les scores en
+        cache. Un calcul dont l'échéance est passée avant son démarrage est
+        abandonné (None) : la requête a déjà conservé l'ordre du bi-encoder.
+        """
+        if deadline is not None and time.monotonic() > deadline:
+            self.dropped += 1
+            return None
+        scores = np.asarray(
+            self.model.predict(
+                pairs, batch_size=self.batch_size, show_progress_bar=False
+            ),
+            dtype=np.float32,
+        ).reshape(-1)
+        with self._lock:
+            for key, score in zip(keys, scores):
+                self.cache[key] = float(score)
+                self.cache.move_to_end(key)
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return scores
+
+    def rerank_batch(
+        self,
+        queries: List[str],
+        candidates: List[List[Dict[str, Any]]],
+        top_k: int,
+        time_budget: Optional[float] = None,
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Ré-ordonne les passages candidats de chaque question et garde les top_k.
+        Les passages retenus reçoivent un "rerank_score" (probabilité de pertinence).
+
+        Args:
+            queries: Questions, une par liste de candidats
+            candidates: Passages candidats de chaque question (ordre du bi-encoder)
+            top_k: Nombre de passages conservés par question
+            time_budget: Budget de temps (secondes), self.time_budget par défaut
+        """
+        time_budget = self.time_budget if time_budget is None else time_budget
+        keys = [
+            [pair_key(query, chunk["text"]) for chunk in chunks]
+            for query, chunks in zip(queries, candidates)
+        ]
+        flat_keys = [key for query_keys in keys for key in query_keys]
+        cached = dict(zip(flat_keys, self._cached_scores(flat_keys)))
+
+        missing_pairs, missing_keys = [], []
+        for query, chunks, query_keys in zip(queries, candidates, keys):
+            for chunk, key in zip(chunks, query_keys):
+                if cached[key] is None:
+                    missing_pairs.append([query, chunk["text"]])
+                    missing_keys.append(key)
+                    # Un même couple n'est évalué qu'une fois
+                    cached[key] = np.nan
+        self.hits += len(flat_keys) - len(missing_keys)
+        self.misses += len(missing_keys)
+
+        if missing_pairs:
+            deadline = None if time_budget is None else time.monotonic() + time_budget
+            future = self._executor.submit(
+                self._score_pairs, missing_pairs, missing_keys, deadline
+            )
+            try:
+                scores = future.result(timeout=time_budget)
+            except TimeoutError:
+                # Retire le calcul de la file s'il n'a pas encore démarré
+                if future.cancel():
+                    self.dropped += 1
+                self.timeouts += 1
+                print("Ré-ordonnancement abandonné (budget de temps dépassé)")
+                return [chunks[:top_k] for chunks in candidates]
+            cached.update(zip(missing_keys, scores.tolist()))
+
+        results = []
+        for chunks, query_keys in zip(candidates, keys):
+            scores = np.array([cached[key] for key in query_keys], dtype=np.float32)
+            order = np.argsort(-scores, kind="stable")[:top_k]
+            reranked = []
+            for i in order:
+                chunk = dict(chunks[i])
+                # predict applique déjà la sigmoïde (modèle à une seule sortie)
+                chunk["rerank_score"] = float(scores[i])
+                reranked.append(chunk)
+            results.append(reranked)
+        return results
+
+    def rerank(
+        self,
+        query: str,
+        chunks: List[Dict[str, Any]],
+        top_k: int,
+        time_budget: Optional[float] = None,
+    ) -> List[Dict[str, Any]]:
+        """Ré-ordonne les passages candidats d'une question (voir rerank_batch)"""
+        return self.rerank_batch([query], [chunks], top_k, time_budget)[0]
+
+    def stats(self) -> Dict[str, Any]:
+        """Compteurs du cache de scores et des dépassements de budget"""
+        total = self.hits + self.misses
+        return {
+            "cache_size": len(self.cache),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "timeouts": self.timeouts,
+            "dropped": self.dropped,
+        }
+
+    def close(self):
+        self._executor.shutdown(wait=False)
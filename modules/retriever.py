@@ -1,105 +1,981 @@
 import faiss
+import os
+import math
+import hashlib
 import numpy as np
-import pickle
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Callable, Iterable, Set, Optional
+
+from modules.vectorizer import normalize_chunk_text
+from modules.store import ChunkStore
+from modules.lexical import BM25Index, reciprocal_rank_fusion
+from modules.articles import ArticleIndex, ReferenceGraph
+from modules.filters import MetadataBitmapIndex
+from modules.hierarchy import LawHierarchy
+from modules.sentences import SentenceIndex
+from modules.processor import extract_article_references
+
+
+def chunk_id(chunk: Dict[str, Any]) -> int:
+    """
+    Identifiant stable d'un chunk, dérivé de son contenu (entier positif sur 63 bits).
+    Un chunk dont le texte ou la position dans la loi change reçoit un nouvel identifiant.
+    """
+    metadata = chunk["metadata"]
+    key = " | ".join(
+        [
+            metadata.get("chapter", ""),
+            metadata.get("section", ""),
+            metadata.get("article", ""),
+            normalize_chunk_text(chunk["text"]),
+        ]
+    )
+    digest = hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little") & 0x7FFFFFFFFFFFFFFF
+
+
+# Types d'index FAISS disponibles (voir INDEX_TYPE dans config.py)
+INDEX_TYPES = ("flat", "ivf_flat", "hnsw", "ivf_pq", "sq8", "fp16", "binary")
+
+# Index à scores approchés (codes compressés) : la liste restreinte renvoyée
+# par FAISS est re-classée par similarité exacte sur les vecteurs du magasin
+RESCORED_INDEX_TYPES = ("ivf_pq", "sq8", "fp16", "binary")
+
+DEFAULT_INDEX_PARAMS = {
+    "nlist": 256,  # Nombre de listes inversées (IVF)
+    "nprobe": 16,  # Listes explorées par requête (IVF)
+    "hnsw_m": 32,  # Voisins par nœud du graphe (HNSW)
+    "ef_construction": 200,  # Largeur de recherche à la construction (HNSW)
+    "ef_search": 64,  # Largeur de recherche à la requête (HNSW)
+    "pq_m": 48,  # Sous-quantifieurs par vecteur (PQ), doit diviser la dimension
+    "pq_nbits": 8,  # Bits par sous-quantifieur (PQ)
+}
+
+
+def create_index(
+    dimension: int, n_vectors: int, index_type: str = "flat", params: Dict = None
+):
+    """
+    Crée un index FAISS (produit scalaire) adressé par identifiants de chunks.
+
+    Les paramètres d'entraînement sont ramenés à des valeurs compatibles avec
+    la taille du corpus (FAISS recommande environ 39 points d'entraînement
+    par centroïde).
+    """
+    params = {**DEFAULT_INDEX_PARAMS, **(params or {})}
+    metric = faiss.METRIC_INNER_PRODUCT
+
+    if index_type == "flat":
+        return faiss.IndexIDMap2(faiss.IndexFlatIP(dimension))
+
+    if index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dimension, params["hnsw_m"], metric)
+        index.hnsw.efConstruction = params["ef_construction"]
+        return faiss.IndexIDMap2(index)
+
+    if index_type in ("ivf_flat", "ivf_pq"):
+        nlist = max(1, min(params["nlist"], n_vectors // 39))
+        if nlist != params["nlist"]:
+            print(f"IVF: nlist ramené à {nlist} pour {n_vectors} vecteurs")
+        quantizer = faiss.IndexFlatIP(dimension)
+        if index_type == "ivf_flat":
+            return faiss.IndexIVFFlat(quantizer, dimension, nlist, metric)
+
+        pq_m = params["pq_m"]
+        if dimension % pq_m != 0:
+            raise ValueError(
+                f"PQ: pq_m ({pq_m}) doit diviser la dimension des vecteurs ({dimension})"
+            )
+        max_nbits = int(math.log2(max(2, n_vectors // 39)))
+        pq_nbits = max(1, min(params["pq_nbits"], max_nbits))
+        if pq_nbits != params["pq_nbits"]:
+            print(f"PQ: pq_nbits ramené à {pq_nbits} pour {n_vectors} vecteurs")
+        return faiss.IndexIVFPQ(quantizer, dimension, nlist, pq_m, pq_nbits, metric)
+
+    if index_type in ("sq8", "fp16"):
+        # Quantification scalaire : 1 octet (sq8) ou 2 octets (fp16) par composante
+        qtype = (
+            faiss.ScalarQuantizer.QT_8bit
+            if index_type == "sq8"
+            else faiss.ScalarQuantizer.QT_fp16
+        )
+        return faiss.IndexIDMap2(faiss.IndexScalarQuantizer(dimension, qtype, metric))
+
+    if index_type == "binary":
+        # Un bit par composante (signe), distance de Hamming
+        return faiss.IndexBinaryIDMap2(faiss.IndexBinaryFlat(dimension))
+
+    raise ValueError(
+        f"Type d'index inconnu: {index_type} (valeurs possibles: {', '.join(INDEX_TYPES)})"
+    )
+
+
+def index_type_of(index) -> str:
+    """Type (au sens de INDEX_TYPES) d'un index FAISS chargé"""
+    if isinstance(index, faiss.IndexBinary):
+        return "binary"
+    if isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+        index = faiss.downcast_index(index.index)
+    if isinstance(index, faiss.IndexScalarQuantizer):
+        if index.sq.qtype == faiss.ScalarQuantizer.QT_fp16:
+            return "fp16"
+        return "sq8"
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(index, faiss.IndexIVFPQ):
+        return "ivf_pq"
+    if isinstance(index, faiss.IndexIVFFlat):
+        return "ivf_flat"
+    return "flat"
+
+
+def set_search_params(index, params: Dict = None):
+    """Applique les paramètres de recherche (nprobe, efSearch) selon le type d'index"""
+    params = {**DEFAULT_INDEX_PARAMS, **(params or {})}
+    index_type = index_type_of(index)
+    space = faiss.ParameterSpace()
+    if index_type in ("ivf_flat", "ivf_pq"):
+        space.set_index_parameter(index, "nprobe", params["nprobe"])
+    elif index_type == "hnsw":
+        space.set_index_parameter(index, "efSearch", params["ef_search"])
+
+
+def index_vectors(index, embeddings: np.ndarray) -> np.ndarray:
+    """Vecteurs au format attendu par l'index (codes binaires pour un index binaire)"""
+    embeddings = np.ascontiguousarray(embeddings, dtype="float32")
+    if isinstance(index, faiss.IndexBinary):
+        return np.packbits(embeddings > 0, axis=1)
+    return embeddings
+
+
+def write_faiss_index(index, path: str):
+    """
+    Écrit un index FAISS dans un fichier temporaire, puis le met en place par
+    os.replace : un processus qui projette l'ancien fichier en mémoire (API
+    avec INDEX_MMAP) conserve son contenu au lieu de le voir réécrit.
+    """
+    if isinstance(index, faiss.IndexBinary):
+        faiss.write_index_binary(index, path + ".tmp")
+    else:
+        faiss.write_index(index, path + ".tmp")
+    os.replace(path + ".tmp", path)
+
+
+def read_faiss_index(path: str, mmap: bool = False):
+    """
+    Lit un index FAISS, binaire ou non (d'après l'en-tête du fichier).
+
+    Avec mmap, les codes de l'index sont projetés en mémoire en lecture seule
+    au lieu d'être copiés : les processus qui servent le même fichier
+    partagent ces pages (cache du système). L'index ne peut plus être modifié.
+    """
+    flags = 0
+    if mmap:
+        flags = (
+            getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP)
+            | faiss.IO_FLAG_READ_ONLY
+        )
+    with open(path, "rb") as f:
+        header = f.read(4)
+    if header.startswith(b"IB"):
+        return faiss.read_index_binary(path, flags)
+    return faiss.read_index(path, flags)
+
+
+def exact_rescore(ids: np.ndarray, queries: np.ndarray, store, k: int) -> np.ndarray:
+    """
+    Re-classe les listes restreintes (identifiants renvoyés par un index
+    compressé) par similarité exacte avec les vecteurs pleine précision du
+    magasin (projetés en mémoire) et garde les k premiers.
+    """
+    rows = store.rows_for_ids(ids)
+    valid = rows >= 0
+    vectors = np.asarray(store.vectors[np.where(valid, rows, 0).ravel()])
+    vectors = vectors.reshape(rows.shape + (-1,))
+    similarities = np.einsum("nkd,nd->nk", vectors, queries)
+    similarities[~valid] = -np.inf
+    order = np.argsort(-similarities, axis=1, kind="stable")[:, :k]
+    ids = np.take_along_axis(np.asarray(ids), order, axis=1)
+    return np.where(np.take_along_axis(valid, order, axis=1), ids, -1)
+
+
+def filtered_search_params(index, ids: np.ndarray, params: Dict = None):
+    """
+    Paramètres de recherche FAISS restreignant la recherche à un ensemble
+    d'identifiants (IDSelectorBatch), avec nprobe / efSearch selon le type d'index.
+    """
+    params = {**DEFAULT_INDEX_PARAMS, **(params or {})}
+    selector = faiss.IDSelectorBatch(np.asarray(ids, dtype="int64"))
+    index_type = index_type_of(index)
+    if index_type in ("ivf_flat", "ivf_pq"):
+        return faiss.SearchParametersIVF(sel=selector, nprobe=params["nprobe"])
+    if index_type == "hnsw":
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=params["ef_search"])
+    return faiss.SearchParameters(sel=selector)
+
+
+def build_faiss_index(
+    ids: np.ndarray,
+    embeddings: np.ndarray,
+    index_type: str = "flat",
+    params: Dict = None,
+):
+    """Crée, entraîne si nécessaire et remplit un index FAISS"""
+    embeddings = np.ascontiguousarray(embeddings, dtype="float32")
+    index = create_index(embeddings.shape[1], len(embeddings), index_type, params)
+    if not index.is_trained:
+        index.train(embeddings)
+    index.add_with_ids(index_vectors(index, embeddings), np.asarray(ids, dtype="int64"))
+    set_search_params(index, params)
+    return index
+
+
+# Modes de recherche : dense (FAISS seul) ou hybride (FAISS + BM25)
+RETRIEVAL_MODES = ("dense", "hybrid", "sentence")
+
+
+def maximal_marginal_relevance(
+    relevance: np.ndarray, vectors: np.ndarray, k: int, lambda_mult: float = 0.7
+) -> np.ndarray:
+    """
+    Sélection par pertinence marginale maximale (MMR).
+
+    Les similarités entre candidats sont calculées en un seul produit
+    matriciel ; à chaque étape, le candidat maximisant
+    lambda * pertinence - (1 - lambda) * similarité au plus proche déjà choisi
+    est retenu.
+
+    Returns:
+        Indices des candidats retenus, dans l'ordre de sélection
+    """
+    k = min(k, len(relevance))
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    similarities = vectors @ vectors.T
+    selected = [int(np.argmax(relevance))]
+    max_similarity = similarities[selected[0]].copy()
+    available = np.ones(len(relevance), dtype=bool)
+    available[selected[0]] = False
+    while len(selected) < k:
+        scores = lambda_mult * relevance - (1 - lambda_mult) * max_similarity
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        np.maximum(max_similarity, similarities[best], out=max_similarity)
+    return np.array(selected, dtype=np.int64)
 
 
 class Retriever:
-    def __init__(self):
-        """Initialisation du service de récupération"""
+    def __init__(
+        self,
+        index_type: str = "flat",
+        index_params: Optional[Dict] = None,
+        retrieval_mode: str = "dense",
+        hybrid_candidates: int = 50,
+        rrf_k: int = 60,
+        reference_budget: int = 0,
+        max_reference_articles: int = 3,
+        diversify: bool = False,
+        mmr_lambda: float = 0.7,
+        mmr_fetch_factor: int = 4,
+        filter_exact_max: int = 4096,
+        reranker=None,
+        rerank_candidates: int = 20,
+        rescore_factor: int = 10,
+        hierarchical: bool = False,
+        top_chapters: int = 2,
+        top_sections: int = 4,
+    ):
+        """
+        Initialisation du service de récupération
+
+        Args:
+            index_type: Type d'index FAISS construit par build_index (voir INDEX_TYPES)
+            index_params: Paramètres d'entraînement et de recherche de l'index
+            retrieval_mode: Mode de recherche (voir RETRIEVAL_MODES)
+            hybrid_candidates: Candidats récupérés par chaque méthode avant fusion
+            rrf_k: Constante de la fusion par rang réciproque
+            reference_budget: Caractères de contexte ajoutables par les articles
+                cités dans les passages retenus (0 : pas d'expansion)
+            max_reference_articles: Nombre maximal d'articles cités ajoutés
+            diversify: Regroupe les passages par article et diversifie les
+                résultats par MMR
+            mmr_lambda: Compromis pertinence / diversité (1 : pertinence seule)
+            mmr_fetch_factor: Candidats récupérés par résultat final avant la MMR
+            filter_exact_max: En dessous de ce nombre de chunks sélectionnés par
+                un filtre, la recherche filtrée est exacte sur les seuls vecteurs
+                sélectionnés plutôt que dans l'index FAISS
+            reranker: CrossEncoderReranker optionnel, appliqué aux candidats
+                lorsque le texte de la requête est fourni
+            rerank_candidates: Candidats soumis au ré-ordonnancement
+            rescore_factor: Pour les index compressés (RESCORED_INDEX_TYPES),
+                taille de la liste restreinte re-classée, en multiple de k
+            hierarchical: Recherche hiérarchique (chapitres, puis sections,
+                puis chunks des sections retenues) si la hiérarchie est chargée
+            top_chapters: Chapitres retenus par la recherche hiérarchique
+            top_sections: Sections retenues (parmi ces chapitres)
+        """
         self.index = None
-        self.metadata = []
+        self.index_type = index_type
+        self.index_params = index_params or {}
+        self.retrieval_mode = retrieval_mode
+        self.hybrid_candidates = hybrid_candidates
+        self.rrf_k = rrf_k
+        self.reference_budget = reference_budget
+        self.max_reference_articles = max_reference_articles
+        self.diversify = diversify
+        self.mmr_lambda = mmr_lambda
+        self.mmr_fetch_factor = mmr_fetch_factor
+        self.filter_exact_max = filter_exact_max
+        self.reranker = reranker
+        self.rerank_candidates = rerank_candidates
+        self.rescore_factor = rescore_factor
+        self.hierarchical = hierarchical
+        self.top_chapters = top_chapters
+        self.top_sections = top_sections
+        # Métadonnées et textes des chunks, alignés sur leurs identifiants
+        self.store = None
+        # Index lexical BM25 (recherche hybride)
+        self.lexical_index = None
+        # Index des articles par numéro (accès direct "article N")
+        self.article_index = None
+        # Graphe des renvois entre articles (expansion du contexte)
+        self.reference_graph = None
+        # Index bitmap des chapitres et sections (recherche filtrée)
+        self.metadata_index = None
+        # Centroïdes des chapitres et sections (recherche hiérarchique)
+        self.hierarchy = None
+        # Embeddings des phrases de chaque article (mode "sentence")
+        self.sentence_index = None
+
+    def _index_store(self):
+        """Reconstruit les index dérivés du magasin de chunks"""
+        self.article_index = ArticleIndex(self.store)
+        self.metadata_index = MetadataBitmapIndex(self.store)
+        # Les positions des articles et les sections ont pu changer
+        self.reference_graph = None
+        self.hierarchy = None
+        self.sentence_index = None
+
+    @staticmethod
+    def _unique_new_chunks(vectors, store=None):
+        """Identifiants et chunks à ajouter (doublons et chunks déjà indexés exclus)"""
+        new_vectors = {}
+        for vec in vectors:
+            vec_id = chunk_id(vec)
+            if store is not None and store.contains(vec_id):
+                continue
+            new_vectors.setdefault(vec_id, vec)
+        ids = list(new_vectors.keys())
+        chunks = list(new_vectors.values())
+        embeddings = np.array([vec["embedding"] for vec in chunks]).astype("float32")
+        return ids, chunks, embeddings
 
     def build_index(self, vectors: List[Dict[str, Any]]):
         """Construction de l'index FAISS à partir des vecteurs"""
-        # Extraire les embeddings et les métadonnées
-        embeddings = np.array([vec["embedding"] for vec in vectors]).astype("float32")
-        metadata = vectors
+        ids, chunks, embeddings = self._unique_new_chunks(vectors)
+
+        # Index à identifiants explicites : chaque chunk est adressé par chunk_id
+        self.store = ChunkStore.from_chunks(ids, chunks, embeddings)
+        self._index_store()
+        self.rebuild_index()
+
+    def rebuild_index(self):
+        """Reconstruit l'index FAISS à partir des vecteurs du magasin (sans ré-encodage)"""
+        self.index = build_faiss_index(
+            self.store.ids, self.store.vectors, self.index_type, self.index_params
+        )
+
+    def supports_incremental(self) -> bool:
+        """Indique si l'index courant est adressé par identifiants stables"""
+        return isinstance(
+            self.index,
+            (
+                faiss.IndexIDMap,
+                faiss.IndexIDMap2,
+                faiss.IndexIVF,
+                faiss.IndexBinaryIDMap,
+                faiss.IndexBinaryIDMap2,
+            ),
+        )
 
-        # Créer l'index FAISS
-        dimension = embeddings.shape[1]
-        self.index = faiss.IndexFlatIP(dimension)
-        self.index.add(embeddings)
-        self.metadata = metadata
+    def indexed_ids(self) -> Set[int]:
+        """Identifiants des chunks présents dans l'index"""
+        return set(self.store.ids.tolist())
+
+    def add_chunks(self, vectors: List[Dict[str, Any]]) -> int:
+        """Ajoute des chunks vectorisés à l'index (les chunks déjà indexés sont ignorés)"""
+        added, _ = self.update_chunks(vectors, [])
+        return added
+
+    def remove_chunks(self, ids: Iterable[int]) -> int:
+        """Retire des chunks de l'index à partir de leurs identifiants"""
+        _, removed = self.update_chunks([], ids)
+        return removed
+
+    def update_chunks(
+        self,
+        vectors: List[Dict[str, Any]],
+        removed_ids: Iterable[int],
+        order: Optional[List[int]] = None,
+    ):
+        """
+        Applique un delta : retrait des chunks obsolètes puis ajout des nouveaux.
+        order (identifiants dans l'ordre de chunks.json) conserve l'ordre des
+        chunks partiels d'un même article dans le magasin.
+        """
+        removed_ids = [
+            vec_id for vec_id in set(removed_ids) if self.store.contains(vec_id)
+        ]
+        ids, chunks, embeddings = [], [], None
+        if vectors:
+            ids, chunks, embeddings = self._unique_new_chunks(vectors, self.store)
+        if not ids and not removed_ids:
+            return 0, 0
+
+        self.store = self.store.merge(removed_ids, ids, chunks, embeddings, order)
+        self._index_store()
+
+        if removed_ids and index_type_of(self.index) == "hnsw":
+            # Le graphe HNSW ne permet pas de retirer des vecteurs : reconstruction
+            # à partir des vecteurs déjà calculés
+            self.rebuild_index()
+        else:
+            if removed_ids:
+                self.index.remove_ids(np.array(removed_ids, dtype="int64"))
+            if ids:
+                self.index.add_with_ids(
+                    index_vectors(self.index, embeddings), np.array(ids, dtype="int64")
+                )
+        return len(ids), len(removed_ids)
 
     def save_index(self, index_path: str, metadata_path: str):
         """Sauvegarde de l'index et des métadonnées"""
-        faiss.write_index(self.index, index_path)
-        with open(metadata_path, "wb") as f:
-            pickle.dump(self.metadata, f)
+        write_faiss_index(self.index, index_path)
+        self.store.save(metadata_path)
 
-    def load_index(self, index_path: str, metadata_path: str):
-        """Chargement de l'index et des métadonnées"""
-        self.index = faiss.read_index(index_path)
-        with open(metadata_path, "rb") as f:
-            self.metadata = pickle.load(f)
+    def load_index(self, index_path: str, metadata_path: str, mmap: bool = False):
+        """
+        Chargement de l'index et des métadonnées.
 
-    def retrieve_relevant_chunks(
-        self, query_embedding, top_k=5, min_similarity_score=0.5
-    ):
+        mmap projette l'index en mémoire en lecture seule (service, pas de
+        mise à jour incrémentale).
         """
-        Fonction de récupération des chunks pertinents reprise depuis la base de connaissance.
+        self.index = read_faiss_index(index_path, mmap=mmap)
+        set_search_params(self.index, self.index_params)
+        self.store = ChunkStore.load(metadata_path)
+        self._index_store()
+
+    def build_lexical_index(self):
+        """Construit l'index BM25 sur les textes du magasin (une entrée par ligne)"""
+        self.lexical_index = BM25Index.build(
+            [self.store.text(row) for row in range(len(self.store))]
+        )
+
+    def save_lexical_index(self, path: str):
+        self.lexical_index.save(path)
+
+    def load_lexical_index(self, path: str):
+        """Charge l'index BM25 s'il correspond au magasin courant"""
+        lexical_index = BM25Index.load(path)
+        if lexical_index.n_docs != len(self.store):
+            print("Index BM25 désynchronisé du magasin de chunks: ignoré")
+            return
+        self.lexical_index = lexical_index
+
+    def build_reference_graph(self, chunks: Optional[List[Dict[str, Any]]] = None):
         """
-        try:
-            """
-            # Reshape pour s'assurer que l'embedding est au bon format
-            query_embedding = query_embedding.reshape(1, -1)
+        Construit le graphe des renvois entre articles. Les références
+        calculées lors de la segmentation (metadata["references"]) sont
+        utilisées si les chunks sont fournis ; sinon elles sont extraites du texte.
+        """
+        references = {}
+        for chunk in chunks or []:
+            numbers = chunk["metadata"].get("references")
+            if numbers is None:
+                continue
+            row = self.store.rows_for_ids([chunk_id(chunk)])[0]
+            if row < 0:
+                continue
+            position = self.article_index.position_of_row(int(row))
+            merged = references.setdefault(position, [])
+            merged.extend(n for n in numbers if n not in merged)
+        self.reference_graph = ReferenceGraph.build(self.article_index, references)
 
-            # Recherche des chunks les plus similaires
-            distances, indices = self.index.search(query_embedding, top_k)
+    def save_reference_graph(self, path: str):
+        self.reference_graph.save(path)
 
-            # Récupération des chunks et de leurs métadonnées
-            results = []
-            for i, idx in enumerate(indices[0]):
-                # Si un seuil de distance est défini, vérifier si le résultat est pertinent
-                if max_distance is not None and distances[0][i] > max_distance:
+    def load_reference_graph(self, path: str):
+        """Charge le graphe des renvois s'il correspond au magasin courant"""
+        reference_graph = ReferenceGraph.load(path)
+        if len(reference_graph) != len(self.article_index):
+            print("Graphe des renvois désynchronisé du magasin de chunks: ignoré")
+            return
+        self.reference_graph = reference_graph
+
+    def build_hierarchy(self):
+        """Calcule les centroïdes des sections et chapitres du magasin"""
+        self.hierarchy = LawHierarchy.build(self.store)
+
+    def save_hierarchy(self, path: str):
+        self.hierarchy.save(path)
+
+    def load_hierarchy(self, path: str):
+        """Charge la hiérarchie si elle correspond au magasin courant"""
+        hierarchy = LawHierarchy.load(path)
+        if hierarchy.n_rows != len(self.store):
+            print("Hiérarchie désynchronisée du magasin de chunks: ignorée")
+            return
+        self.hierarchy = hierarchy
+
+    def build_sentence_index(self, encode: Callable[[List[str]], np.ndarray]):
+        """
+        Encode les phrases de chaque article (encode : textes -> matrice
+        normalisée) pour la recherche multi-vecteurs (mode "sentence").
+        """
+        self.sentence_index = SentenceIndex.build(self.article_index, encode)
+
+    def save_sentence_index(self, path: str):
+        self.sentence_index.save(path)
+
+    def load_sentence_index(self, path: str):
+        """Charge l'index des phrases s'il correspond au magasin courant"""
+        sentence_index = SentenceIndex.load(path)
+        if len(sentence_index) != len(self.article_index):
+            print("Index des phrases désynchronisé du magasin de chunks: ignoré")
+            return
+        self.sentence_index = sentence_index
+
+    def expand_with_references(
+        self, results: List[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        """
+        Ajoute aux passages retenus les articles qu'ils citent (un saut dans le
+        graphe des renvois), par ordre de rang des passages, dans la limite du
+        budget de contexte. Aucun calcul d'embedding ni recherche n'est effectué.
+        """
+        if not results or self.reference_graph is None or self.reference_budget <= 0:
+            return results
+
+        rows = self.store.rows_for_ids([chunk["chunk_id"] for chunk in results])
+        seen = {
+            self.article_index.position_of_row(int(row)) for row in rows if row >= 0
+        }
+        budget = self.reference_budget
+        expanded = []
+        for row, chunk in zip(rows, results):
+            if row < 0:
+                continue
+            position = self.article_index.position_of_row(int(row))
+            for target in self.reference_graph.neighbors(position).tolist():
+                if len(expanded) >= self.max_reference_articles:
+                    return results + expanded
+                if target in seen:
+                    continue
+                seen.add(target)
+                reference = self.article_index.article_chunk(
+                    self.article_index.articles[self.article_index.keys[target]]
+                )
+                if len(reference["text"]) > budget:
                     continue
+                budget -= len(reference["text"])
+                reference["similarity_score"] = 0.0
+                reference["chunk_id"] = reference["chunk_ids"][0]
+                reference["referenced_by"] = chunk["metadata"].get("article")
+                expanded.append(reference)
+        return results + expanded
+
+    def retrieve_by_article_reference(
+        self, query_text: str, max_articles: int = 5, filters: Optional[Dict] = None
+    ):
+        """
+        Accès direct aux articles cités explicitement dans la requête
+        ("Que dit l'article 22 ?"), sans vectorisation ni recherche FAISS.
+        Les chunks partiels de chaque article sont réassemblés dans l'ordre.
+        Les articles exclus par les filtres éventuels sont ignorés.
+
+        Returns:
+            Liste de chunks (un par article), ou None si la requête ne cite
+            aucun article connu.
+        """
+        if self.article_index is None:
+            return None
+        numbers = extract_article_references(query_text)
+        if not numbers:
+            return None
+
+        mask = self.filter_mask(filters)
+        groups = []
+        for number in numbers:
+            groups.extend(
+                rows
+                for rows in self.article_index.lookup(number)
+                if mask is None or mask[rows[0]]
+            )
+        if not groups:
+            return None
 
-                # Convertir la distance en score de similarité
-                similarity_score = 1.0 / (1.0 + float(distances[0][i]))
+        results = []
+        for rows in groups[:max_articles]:
+            chunk = self.article_index.article_chunk(rows)
+            chunk["similarity_score"] = 1.0
+            chunk["chunk_id"] = chunk["chunk_ids"][0]
+            results.append(chunk)
+        return self.expand_with_references(results)
 
-                # Convertir le score de similarité en pourcentage de pertinence
-                relevance = similarity_score * 100
+    def _results_for_rows(
+        self, rows, query_embedding, min_similarity_score, lexical=None
+    ):
+        """
+        Reconstitue les chunks des lignes données, avec leur score de
+        similarité. Le seuil de similarité dense ne s'applique pas aux lignes
+        trouvées par la recherche lexicale (masque lexical).
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        if len(rows) == 0:
+            return []
+        # Similarité cosinus exacte à partir des vecteurs du magasin
+        similarities = np.asarray(self.store.vectors[rows]) @ query_embedding
+        if lexical is None:
+            lexical = np.zeros(len(rows), dtype=bool)
 
-                chunk = self.metadata[idx]
+        results = []
+        for row, similarity, is_lexical in zip(rows, similarities, lexical):
+            # La similarité cosinus est entre -1 et 1 : conversion vers [0,1]
+            similarity_score = float(similarity + 1) / 2
+            if is_lexical or similarity_score >= min_similarity_score:
+                chunk = self.store.get(int(row))
                 results.append(
                     {
                         "text": chunk["text"],
                         "metadata": chunk["metadata"],
-                        "distance": float(distances[0][i]),
                         "similarity_score": similarity_score,
-                        "relevance": relevance,
+                        "chunk_id": int(self.store.ids[row]),
                     }
                 )
-            """
+        return results
+
+    def filter_mask(self, filters: Optional[Dict] = None) -> Optional[np.ndarray]:
+        """
+        Masque des lignes du magasin satisfaisant les filtres
+        (clés chapter, section, article_range), ou None sans filtre.
+        """
+        if not filters or self.metadata_index is None:
+            return None
+        return self.metadata_index.mask(
+            chapter=filters.get("chapter"),
+            section=filters.get("section"),
+            article_range=filters.get("article_range"),
+        )
 
-            # Normaliser les embeddings pour le calcul de similarité cosinus
-            # query_embedding_normalized = query_embedding / np.linalg.norm(                query_embedding            )
+    def _search(self, query_embeddings, k, mask=None):
+        """
+        Recherche des k plus proches voisins de chaque requête (identifiants).
+        Avec un masque, seuls les chunks sélectionnés sont considérés : la
+        sélection est appliquée dans FAISS (IDSelectorBatch), ou par une
+        recherche exacte sur les seuls vecteurs sélectionnés si ceux-ci sont
+        peu nombreux. Le coût dépend alors de la taille de la sélection et
+        non de celle du corpus.
+        """
+        if self.hierarchical and self.hierarchy is not None:
+            return self._hierarchical_search(query_embeddings, k, mask)
+
+        index_type = index_type_of(self.index)
+        search_params = None
+        if mask is not None:
+            rows = np.flatnonzero(mask)
+            if len(rows) == 0:
+                return np.full((len(query_embeddings), k), -1, dtype=np.int64)
+            # L'index binaire ne prend pas de sélecteur : recherche exacte
+            if len(rows) <= self.filter_exact_max or index_type == "binary":
+                return self._exact_search(query_embeddings, k, rows)
+            search_params = filtered_search_params(
+                self.index, self.store.ids[rows], self.index_params
+            )
+
+        # Index compressé : liste restreinte plus large, re-classée exactement
+        rescore = index_type in RESCORED_INDEX_TYPES
+        fetch_k = k * self.rescore_factor if rescore else k
+        queries = index_vectors(self.index, query_embeddings)
+        if search_params is None:
+            _, ids = self.index.search(queries, fetch_k)
+        else:
+            _, ids = self.index.search(queries, fetch_k, params=search_params)
+        if rescore:
+            ids = exact_rescore(ids, query_embeddings, self.store, k)
+        return ids
 
-            # Calculer la similarité cosinus avec tous les embeddings de l'index
-            # Note: cela nécessite de modifier la structure de l'index FAISS
-            # pour utiliser IndexFlatIP (Inner Product) au lieu de IndexFlatL2
-            similarities, indices = self.index.search(
-                query_embedding.reshape(1, -1), top_k
+    def _hierarchical_search(self, query_embeddings, k, mask=None):
+        """
+        Recherche du grossier au fin : les chapitres puis les sections les plus
+        proches de la requête sont choisis d'après leurs centroïdes, puis
+        seuls les chunks de ces sections sont comparés à la requête. Les
+        filtres restreignent le choix aux chapitres et sections qui contiennent
+        des chunks sélectionnés.
+        """
+        ids = np.full((len(query_embeddings), k), -1, dtype=np.int64)
+        for i, query_embedding in enumerate(query_embeddings):
+            rows = self.hierarchy.candidate_rows(
+                query_embedding, self.top_chapters, self.top_sections, mask
             )
+            if len(rows):
+                ids[i] = self._exact_search(query_embedding.reshape(1, -1), k, rows)[0]
+        return ids
+
+    def _exact_search(self, query_embeddings, k, rows):
+        """Recherche exacte restreinte à certaines lignes du magasin"""
+        ids = np.full((len(query_embeddings), k), -1, dtype=np.int64)
+        similarities = query_embeddings @ np.asarray(self.store.vectors[rows]).T
+        top = min(k, len(rows))
+        best = np.argpartition(-similarities, top - 1, axis=1)[:, :top]
+        order = np.argsort(-np.take_along_axis(similarities, best, axis=1), axis=1)
+        best = np.take_along_axis(best, order, axis=1)
+        ids[:, :top] = self.store.ids[rows[best]]
+        return ids
+
+    def _diversified_results(
+        self,
+        rows,
+        query_embedding,
+        top_k,
+        min_similarity_score,
+        relevance=None,
+        lexical=None,
+    ):
+        """
+        Regroupe les passages candidats par article, puis choisit les top_k
+        articles par MMR sur les vecteurs du magasin. Chaque article retenu est
+        renvoyé en entier (tous ses fragments [SUITE] fusionnés, chevauchement
+        retiré), même si seuls certains fragments ont été retrouvés.
+
+        La pertinence utilisée par la MMR est la similarité cosinus, ou le
+        score fusionné (RRF, ramené à [0, 1]) en mode hybride ; le seuil de
+        similarité dense ne s'applique pas aux lignes trouvées par la
+        recherche lexicale.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        if len(rows) == 0:
+            return []
+        vectors = np.asarray(self.store.vectors[rows], dtype=np.float32)
+        similarities = vectors @ query_embedding
+        if relevance is None:
+            relevance = similarities
+        else:
+            relevance = np.asarray(relevance, dtype=np.float32) / np.max(relevance)
+        if lexical is None:
+            lexical = np.zeros(len(rows), dtype=bool)
+
+        # Un représentant par article : son fragment le plus pertinent
+        order = np.argsort(-relevance, kind="stable")
+        positions = self.article_index.row_positions[rows]
+        _, first = np.unique(positions[order], return_index=True)
+        representatives = order[np.sort(first)]
+
+        selected = maximal_marginal_relevance(
+            relevance[representatives],
+            vectors[representatives],
+            top_k,
+            self.mmr_lambda,
+        )
+
+        results = []
+        for candidate in representatives[selected]:
+            similarity_score = float(similarities[candidate] + 1) / 2
+            if similarity_score < min_similarity_score and not lexical[candidate]:
+                continue
+            # Tous les fragments de l'article, dans l'ordre du texte : fusionner
+            # les seuls fragments retrouvés omettrait en silence ceux du milieu
+            key = self.article_index.keys[positions[candidate]]
+            chunk = self.article_index.article_chunk(self.article_index.articles[key])
+            chunk["similarity_score"] = similarity_score
+            chunk["chunk_id"] = int(self.store.ids[rows[candidate]])
+            results.append(chunk)
+        return results
+
+    def _sentence_results(self, query_embeddings, top_k, min_similarity_score, mask):
+        """
+        Recherche multi-vecteurs : chaque article est noté par la similarité
+        maximale de ses phrases avec la requête (un seul produit matriciel
+        pour tout le lot). Renvoie, pour chaque requête, un chunk par article.
+        """
+        allowed = None
+        if mask is not None:
+            allowed = np.zeros(len(self.article_index), dtype=bool)
+            allowed[self.article_index.row_positions[mask]] = True
+        positions, scores = self.sentence_index.search(query_embeddings, top_k, allowed)
 
+        batch_results = []
+        for positions_row, scores_row in zip(positions, scores):
             results = []
-            for i, idx in enumerate(indices[0]):
-                # La similarité cosinus est déjà entre -1 et 1, nous pouvons l'ajuster à [0,1] si nécessaire
-                similarity_score = (
-                    similarities[0][i] + 1
-                ) / 2  # Optionnel: convertir de [-1,1] à [0,1]
-
-                if similarity_score >= min_similarity_score:
-                    chunk = self.metadata[idx]
-                    results.append(
-                        {
-                            "text": chunk["text"],
-                            "metadata": chunk["metadata"],
-                            "similarity_score": similarity_score,
-                        }
-                    )
-            return results
+            for position, score in zip(positions_row, scores_row):
+                similarity_score = float(score + 1) / 2
+                if position < 0 or similarity_score < min_similarity_score:
+                    continue
+                chunk = self.article_index.article_chunk(
+                    self.article_index.articles[self.article_index.keys[position]]
+                )
+                chunk["similarity_score"] = similarity_score
+                chunk["chunk_id"] = chunk["chunk_ids"][0]
+                results.append(chunk)
+            batch_results.append(results)
+        return batch_results
+
+    def _sentence_mode(self) -> bool:
+        return self.retrieval_mode == "sentence" and self.sentence_index is not None
+
+    def _select_results(self, candidates, query_embedding, top_k, min_similarity_score):
+        """Passages finaux à partir des candidats (voir _candidate_rows)"""
+        rows, relevance, lexical = candidates
+        if self.diversify and self.article_index is not None:
+            return self._diversified_results(
+                rows, query_embedding, top_k, min_similarity_score, relevance, lexical
+            )
+        return self._results_for_rows(
+            rows[:top_k],
+            query_embedding,
+            min_similarity_score,
+            None if lexical is None else lexical[:top_k],
+        )
+
+    def _candidate_rows(self, ids_row, query_text, limit, mask=None):
+        """
+        Lignes candidates pour une requête, à partir des identifiants renvoyés
+        par FAISS ; en mode hybride, fusion (RRF) avec le classement BM25.
+
+        Returns:
+            (lignes classées, scores fusionnés ou None, masque des lignes
+            trouvées par la recherche lexicale ou None)
+        """
+        rows = self.store.rows_for_ids(ids_row[ids_row >= 0])
+        rows = rows[rows >= 0]
+        if self.retrieval_mode == "hybrid" and query_text and self.lexical_index:
+            lexical_rows, _ = self.lexical_index.search(
+                query_text, self.hybrid_candidates, mask=mask
+            )
+            rows, scores = reciprocal_rank_fusion([rows, lexical_rows], k=self.rrf_k)
+            rows, scores = rows[:limit], scores[:limit]
+            return rows, scores, np.isin(rows, lexical_rows)
+        return rows[:limit], None, None
+
+    def _selection_size(self, top_k, query_text):
+        """Nombre de passages sélectionnés avant l'éventuel ré-ordonnancement"""
+        if self.reranker is not None and query_text:
+            return max(top_k, self.rerank_candidates)
+        return top_k
+
+    def _pool_size(self, top_k):
+        """Nombre de candidats conservés avant la sélection finale"""
+        if self.reranker is not None:
+            top_k = max(top_k, self.rerank_candidates)
+        if self.diversify:
+            return top_k * self.mmr_fetch_factor
+        return top_k
+
+    def _fetch_k(self, top_k):
+        if self.retrieval_mode == "hybrid" and self.lexical_index:
+            return max(self._pool_size(top_k), self.hybrid_candidates)
+        return self._pool_size(top_k)
+
+    def retrieve_relevant_chunks(
+        self,
+        query_embedding,
+        top_k=5,
+        min_similarity_score=0.5,
+        query_text=None,
+        filters=None,
+    ):
+        """
+        Fonction de récupération des chunks pertinents reprise depuis la base de connaissance.
+        Le texte de la requête n'est utilisé qu'en mode de recherche hybride.
+        filters (chapter, section, article_range) restreint la recherche aux
+        chunks correspondants (voir filter_mask).
+        """
+        try:
+            query_embedding = np.asarray(query_embedding, dtype="float32")
+            mask = self.filter_mask(filters)
+            if self._sentence_mode():
+                results = self._sentence_results(
+                    query_embedding.reshape(1, -1),
+                    self._selection_size(top_k, query_text),
+                    min_similarity_score,
+                    mask,
+                )[0]
+            else:
+                ids = self._search(
+                    query_embedding.reshape(1, -1), self._fetch_k(top_k), mask
+                )
+                candidates = self._candidate_rows(
+                    ids[0], query_text, self._pool_size(top_k), mask
+                )
+                results = self._select_results(
+                    candidates,
+                    query_embedding,
+                    self._selection_size(top_k, query_text),
+                    min_similarity_score,
+                )
+            if self.reranker is not None and query_text:
+                results = self.reranker.rerank(query_text, results, top_k)
+            return self.expand_with_references(results)
         except Exception as e:
             print(f"Erreur lors de la récupération des chunks: {str(e)}")
             return []
+
+    def retrieve_relevant_chunks_batch(
+        self,
+        query_embeddings,
+        top_k=5,
+        min_similarity_score=0.5,
+        query_texts=None,
+        filters=None,
+    ):
+        """
+        Récupération des chunks pertinents pour un lot de requêtes.
+        Une seule recherche matricielle est effectuée sur l'index FAISS ;
+        les résultats sont renvoyés dans l'ordre des requêtes. Les filtres
+        éventuels s'appliquent à toutes les requêtes du lot.
+        """
+        try:
+            query_embeddings = np.asarray(query_embeddings, dtype="float32")
+            if query_texts is None:
+                query_texts = [None] * len(query_embeddings)
+            mask = self.filter_mask(filters)
+            if self._sentence_mode():
+                selection_size = max(
+                    self._selection_size(top_k, text) for text in query_texts
+                )
+                batch_results = self._sentence_results(
+                    query_embeddings, selection_size, min_similarity_score, mask
+                )
+            else:
+                ids = self._search(query_embeddings, self._fetch_k(top_k), mask)
+
+                batch_results = []
+                for query_embedding, ids_row, query_text in zip(
+                    query_embeddings, ids, query_texts
+                ):
+                    candidates = self._candidate_rows(
+                        ids_row, query_text, self._pool_size(top_k), mask
+                    )
+                    batch_results.append(
+                        self._select_results(
+                            candidates,
+                            query_embedding,
+                            self._selection_size(top_k, query_text),
+                            min_similarity_score,
+                        )
+                    )
+
+            # Ré-ordonnancement de tous les candidats du lot en un seul appel
+            reranked = [i for i, text in enumerate(query_texts) if text]
+            if self.reranker is not None and reranked:
+                batch_reranked = self.reranker.rerank_batch(
+                    [query_texts[i] for i in reranked],
+                    [batch_results[i] for i in reranked],
+                    top_k,
+                )
+                for i, results in zip(reranked, batch_reranked):
+                    batch_results[i] = results
+            return [self.expand_with_references(results) for results in batch_results]
+        except Exception as e:
+            print(f"Erreur lors de la récupération des chunks: {str(e)}")
+            return [[] for _ in range(len(query_embeddings))]
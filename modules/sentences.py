@@ -0,0 +1,97 @@
+import numpy as np
+from typing import Callable, List, Optional, Tuple
+
+from modules.processor import split_sentences
+
+
+class SentenceIndex:
+    """
+    Représentation multi-vecteurs des articles : un embedding par phrase.
+
+    Les vecteurs de toutes les phrases sont stockés dans une seule matrice
+    contiguë, article après article ; les phrases de l'article i (position
+    dans l'ArticleIndex) sont vectors[offsets[i]:offsets[i + 1]]. Le score
+    d'un article est la similarité maximale de ses phrases avec la requête
+    (max-sim), calculée par un produit matriciel puis np.maximum.reduceat.
+    """
+
+    def __init__(self, vectors: np.ndarray, offsets: np.ndarray):
+        self.vectors = vectors
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    @staticmethod
+    def article_sentences(article_index) -> Tuple[List[str], np.ndarray]:
+        """
+        Phrases de chaque article (texte réassemblé, sans en-tête) et
+        décalages de début de chaque article dans la liste des phrases.
+        Un article sans phrase détectée est représenté par son texte entier.
+        """
+        sentences = []
+        offsets = np.zeros(len(article_index) + 1, dtype=np.int64)
+        for position, rows in enumerate(article_index.articles.values()):
+            text = article_index.article_chunk(rows)["text"]
+            body = text.split("\n\n", 1)[-1]
+            article_sentences = [
+                sentence for sentence in split_sentences(body) if sentence.strip()
+            ]
+            sentences.extend(article_sentences or [text])
+            offsets[position + 1] = len(sentences)
+        return sentences, offsets
+
+    @classmethod
+    def build(
+        cls, article_index, encode: Callable[[List[str]], np.ndarray]
+    ) -> "SentenceIndex":
+        """
+        Construit l'index des phrases des articles.
+
+        Args:
+            article_index: ArticleIndex du magasin de chunks
+            encode: Fonction de vectorisation (textes -> matrice normalisée)
+        """
+        sentences, offsets = cls.article_sentences(article_index)
+        vectors = np.ascontiguousarray(encode(sentences), dtype=np.float32)
+        return cls(vectors, offsets)
+
+    def scores(self, query_embeddings: np.ndarray) -> np.ndarray:
+        """Score max-sim de chaque article pour chaque requête (n_requêtes, n_articles)"""
+        similarities = np.atleast_2d(query_embeddings) @ self.vectors.T
+        return np.maximum.reduceat(similarities, self.offsets[:-1], axis=1)
+
+    def search(
+        self,
+        query_embeddings: np.ndarray,
+        top_k: int,
+        allowed: Optional[np.ndarray] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Positions des top_k articles les plus proches de chaque requête et
+        leurs scores max-sim (-1 et -inf au-delà des articles disponibles).
+        allowed (booléens par article) restreint la recherche.
+        """
+        scores = self.scores(query_embeddings)
+        if allowed is not None:
+            scores[:, ~allowed] = -np.inf
+        positions = np.full((len(scores), top_k), -1, dtype=np.int64)
+        best_scores = np.full((len(scores), top_k), -np.inf, dtype=np.float32)
+        top = min(top_k, scores.shape[1])
+        if top == 0:
+            return positions, best_scores
+        best = np.argpartition(-scores, top - 1, axis=1)[:, :top]
+        order = np.argsort(-np.take_along_axis(scores, best, axis=1), axis=1)
+        best = np.take_along_axis(best, order, axis=1)
+        best_scores[:, :top] = np.take_along_axis(scores, best, axis=1)
+        positions[:, :top] = np.where(np.isfinite(best_scores[:, :top]), best, -1)
+        return positions, best_scores
+
+    def save(self, path: str):
+        with open(path, "wb") as f:
+            np.savez(f, vectors=self.vectors, offsets=self.offsets)
+
+    @classmethod
+    def load(cls, path: str) -> "SentenceIndex":
+        with np.load(path, allow_pickle=False) as data:
+            return cls(np.ascontiguousarray(data["vectors"]), data["offsets"])
@@ -0,0 +1,85 @@
+import os
+import time
+from contextlib import contextmanager
+from typing import Dict, Any
+
+# Instant du chargement de ce module, importé en premier par app.py : la
+# première phase mesurée couvre les imports de l'application
+PROCESS_STARTED = time.perf_counter()
+
+
+class StartupReport:
+    """
+    Décomposition de la durée de démarrage de l'API par phase (imports,
+    chargement des modèles et des index, préchauffage...).
+    """
+
+    def __init__(self, started: float = PROCESS_STARTED):
+        self.started = started
+        self.phases = {}
+        self._last = started
+        self.ready = False
+
+    def mark(self, name: str):
+        """Enregistre la phase écoulée depuis la fin de la phase précédente"""
+        now = time.perf_counter()
+        self.phases[name] = now - self._last
+        self._last = now
+
+    @contextmanager
+    def phase(self, name: str):
+        """Mesure la durée d'un bloc"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._last = time.perf_counter()
+            self.phases[name] = self.phases.get(name, 0.0) + self._last - start
+
+    def total(self) -> float:
+        return self._last - self.started
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Durées des phases et durée totale (millisecondes)"""
+        return {
+            "ready": self.ready,
+            "total_ms": round(self.total() * 1000, 1),
+            "phases_ms": {
+                name: round(duration * 1000, 1)
+                for name, duration in self.phases.items()
+            },
+        }
+
+    def print_report(self):
+        total = self.total()
+        print(f"Démarrage en {total:.2f} s:")
+        for name, duration in self.phases.items():
+            share = duration / total * 100 if total else 0.0
+            print(f"  {name:<24} {duration * 1000:>9.1f} ms  {share:>5.1f} %")
+
+
+def process_memory(pid="self") -> Dict[str, Any]:
+    """
+    Mémoire d'un processus (Mo) lue dans /proc (Linux) : RSS, PSS (pages
+    partagées réparties entre les processus qui les utilisent), part
+    partagée et part privée. La somme des PSS des workers estime la mémoire
+    réellement occupée par le service. Dictionnaire vide hors Linux.
+    """
+    values = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup", "r") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 3 and parts[2] == "kB":
+                    values[parts[0].rstrip(":")] = int(parts[1])
+    except OSError:
+        return {}
+    shared = values.get("Shared_Clean", 0) + values.get("Shared_Dirty", 0)
+    private = values.get("Private_Clean", 0) + values.get("Private_Dirty", 0)
+    return {
+        "pid": os.getpid() if pid == "self" else int(pid),
+        "rss_mb": round(values.get("Rss", 0) / 1024, 1),
+        "pss_mb": round(values.get("Pss", 0) / 1024, 1),
+        "shared_mb": round(shared / 1024, 1),
+        "private_mb": round(private / 1024, 1),
+    }
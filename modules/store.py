@@ -0,0 +1,227 @@
+import os
+import numpy as np
+from typing import List, Dict, Any, Optional, Tuple
+
+
+def store_paths(metadata_path: str) -> Tuple[str, str, str]:
+    """Chemins des fichiers du magasin : colonnes (.npz), textes (.bin), vecteurs (.npy)"""
+    base = os.path.splitext(metadata_path)[0]
+    return metadata_path, base + ".texts.bin", base + ".vectors.npy"
+
+
+class _Interner:
+    """Table de chaînes internées : chaque valeur distincte n'est stockée qu'une fois"""
+
+    def __init__(self, values: Optional[List[str]] = None):
+        self.values = list(values or [])
+        self.positions = {value: i for i, value in enumerate(self.values)}
+
+    def add(self, value: Optional[str]) -> int:
+        if value is None:
+            return -1
+        position = self.positions.get(value)
+        if position is None:
+            position = len(self.values)
+            self.values.append(value)
+            self.positions[value] = position
+        return position
+
+
+class ChunkStore:
+    """
+    Magasin compact et colonnaire des métadonnées des chunks.
+
+    - ids : identifiants stables des chunks (int64), alignés avec les lignes ;
+    - chapitres, sections, articles et numéros d'article : indices (int32) vers
+      des tables de chaînes internées ;
+    - textes : décalages (int64) dans un unique blob UTF-8, projeté en mémoire ;
+    - vecteurs : matrice float32 séparée (.npy), projetable en mémoire.
+
+    Les chunks ne sont reconstitués sous forme de dictionnaire qu'à la demande.
+    """
+
+    def __init__(
+        self,
+        ids: np.ndarray,
+        columns: Dict[str, np.ndarray],
+        tables: Dict[str, List[str]],
+        text_offsets: np.ndarray,
+        texts,
+        vectors: np.ndarray,
+    ):
+        self.ids = ids
+        self.columns = columns
+        self.tables = tables
+        self.text_offsets = text_offsets
+        self.texts = texts
+        self.vectors = vectors
+
+        # Recherche identifiant -> ligne par dichotomie
+        self._sorted_rows = np.argsort(self.ids, kind="stable")
+        self._sorted_ids = self.ids[self._sorted_rows]
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def from_chunks(
+        cls,
+        ids: List[int],
+        chunks: List[Dict[str, Any]],
+        embeddings: np.ndarray,
+    ) -> "ChunkStore":
+        """Construit le magasin à partir de chunks (dictionnaires) et de leurs embeddings"""
+        interners = {
+            name: _Interner()
+            for name in ("chapter", "section", "article", "article_number")
+        }
+        columns = {name: np.empty(len(chunks), dtype=np.int32) for name in interners}
+        columns["is_partial"] = np.zeros(len(chunks), dtype=bool)
+
+        encoded_texts = []
+        text_offsets = np.zeros(len(chunks) + 1, dtype=np.int64)
+        for row, chunk in enumerate(chunks):
+            metadata = chunk["metadata"]
+            for name, interner in interners.items():
+                columns[name][row] = interner.add(metadata.get(name))
+            columns["is_partial"][row] = bool(metadata.get("is_partial", False))
+
+            encoded = chunk["text"].encode("utf-8")
+            encoded_texts.append(encoded)
+            text_offsets[row + 1] = text_offsets[row] + len(encoded)
+
+        texts = np.frombuffer(b"".join(encoded_texts), dtype=np.uint8)
+        return cls(
+            ids=np.asarray(ids, dtype=np.int64),
+            columns=columns,
+            tables={name: interner.values for name, interner in interners.items()},
+            text_offsets=text_offsets,
+            texts=texts,
+            vectors=np.ascontiguousarray(embeddings, dtype=np.float32),
+        )
+
+    def rows_for_ids(self, ids) -> np.ndarray:
+        """Lignes correspondant à des identifiants (-1 si absent)"""
+        ids = np.asarray(ids, dtype=np.int64)
+        if len(self._sorted_ids) == 0:
+            return np.full(ids.shape, -1, dtype=np.int64)
+        positions = np.searchsorted(self._sorted_ids, ids)
+        positions = np.minimum(positions, len(self._sorted_ids) - 1)
+        found = self._sorted_ids[positions] == ids
+        return np.where(found, self._sorted_rows[positions], -1)
+
+    def contains(self, chunk_id: int) -> bool:
+        return self.rows_for_ids([chunk_id])[0] >= 0
+
+    def text(self, row: int) -> str:
+        start, end = self.text_offsets[row], self.text_offsets[row + 1]
+        return bytes(self.texts[start:end]).decode("utf-8")
+
+    def value(self, name: str, row: int) -> Optional[str]:
+        """Valeur d'une colonne internée pour une ligne"""
+        position = self.columns[name][row]
+        return self.tables[name][position] if position >= 0 else None
+
+    def metadata(self, row: int) -> Dict[str, Any]:
+        metadata = {
+            "chapter": self.value("chapter", row),
+            "section": self.value("section", row),
+            "article": self.value("article", row),
+            "article_number": self.value("article_number", row),
+        }
+        if self.columns["is_partial"][row]:
+            metadata["is_partial"] = True
+        return metadata
+
+    def get(self, row: int) -> Dict[str, Any]:
+        """Reconstitue le chunk d'une ligne (texte et métadonnées)"""
+        return {"text": self.text(row), "metadata": self.metadata(row)}
+
+    def merge(
+        self,
+        removed_ids,
+        new_ids: List[int],
+        new_chunks: List[Dict[str, Any]],
+        new_embeddings: np.ndarray,
+        order: Optional[List[int]] = None,
+    ) -> "ChunkStore":
+        """
+        Nouveau magasin sans les chunks retirés et avec les chunks ajoutés.
+        Si order (liste d'identifiants) est fourni, les lignes suivent cet ordre
+        (les identifiants absents de order sont placés à la fin).
+        """
+        removed_rows = self.rows_for_ids(list(removed_ids))
+        keep = np.ones(len(self), dtype=bool)
+        keep[removed_rows[removed_rows >= 0]] = False
+        kept_rows = np.flatnonzero(keep)
+
+        ids = self.ids[kept_rows].tolist() + list(new_ids)
+        chunks = [self.get(int(row)) for row in kept_rows] + list(new_chunks)
+        parts = [np.asarray(self.vectors[kept_rows], dtype=np.float32)]
+        if len(new_chunks):
+            parts.append(np.asarray(new_embeddings, dtype=np.float32))
+        vectors = np.vstack(parts)
+
+        if order is not None:
+            position = {chunk_id: i for i, chunk_id in enumerate(order)}
+            permutation = sorted(
+                range(len(ids)), key=lambda i: position.get(ids[i], len(position))
+            )
+            ids = [ids[i] for i in permutation]
+            chunks = [chunks[i] for i in permutation]
+            vectors = vectors[permutation]
+        return ChunkStore.from_chunks(ids, chunks, vectors)
+
+    def save(self, metadata_path: str):
+        """
+        Écrit les colonnes, le blob de textes et les vecteurs sur disque.
+        Chaque fichier est écrit à côté puis renommé, afin de ne jamais tronquer
+        un fichier encore projeté en mémoire par un autre processus.
+        """
+        columns_path, texts_path, vectors_path = store_paths(metadata_path)
+        arrays = {"ids": self.ids, "text_offsets": self.text_offsets}
+        for name, column in self.columns.items():
+            arrays[f"column_{name}"] = column
+        for name, values in self.tables.items():
+            arrays[f"table_{name}"] = np.array(values, dtype=str)
+
+        with open(columns_path + ".tmp", "wb") as f:
+            np.savez(f, **arrays)
+        with open(texts_path + ".tmp", "wb") as f:
+            f.write(bytes(self.texts))
+        with open(vectors_path + ".tmp", "wb") as f:
+            np.save(f, np.asarray(self.vectors, dtype=np.float32))
+
+        for path in (columns_path, texts_path, vectors_path):
+            os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, metadata_path: str, mmap: bool = True) -> "ChunkStore":
+        """
+        Charge le magasin. Avec mmap=True, le blob de textes et les vecteurs sont
+        projetés en mémoire et ne sont lus qu'à la demande.
+        """
+        columns_path, texts_path, vectors_path = store_paths(metadata_path)
+        with np.load(columns_path, allow_pickle=False) as data:
+            ids = data["ids"]
+            text_offsets = data["text_offsets"]
+            columns = {
+                key[len("column_") :]: data[key]
+                for key in data.files
+                if key.startswith("column_")
+            }
+            tables = {
+                key[len("table_") :]: data[key].tolist()
+                for key in data.files
+                if key.startswith("table_")
+            }
+
+        if os.path.getsize(texts_path) == 0:
+            texts = np.zeros(0, dtype=np.uint8)
+        elif mmap:
+            texts = np.memmap(texts_path, dtype=np.uint8, mode="r")
+        else:
+            texts = np.fromfile(texts_path, dtype=np.uint8)
+        vectors = np.load(vectors_path, mmap_mode="r" if mmap else None)
+
+        return cls(ids, columns, tables, text_offsets, texts, vectors)
@@ -1,27 +1,457 @@
-from sentence_transformers import SentenceTransformer
+import os
+import re
+import time
+import queue
+import hashlib
+import threading
+import unicodedata
 import numpy as np
-from typing import List, Dict, Any
+from concurrent.futures import Future
+from typing import List, Dict, Any, Optional
+
+from modules.cache import QueryEmbeddingCache
+
+
+def normalize_chunk_text(text: str) -> str:
+    """Normalisation du texte d'un chunk avant calcul de son empreinte"""
+    text = unicodedata.normalize("NFC", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def text_digest(text: str) -> bytes:
+    """Empreinte (16 octets) du texte normalisé d'un chunk"""
+    return hashlib.blake2b(
+        normalize_chunk_text(text).encode("utf-8"), digest_size=16
+    ).digest()
+
+
+class EmbeddingStore:
+    """
+    Cache disque des embeddings, adressé par le contenu.
+
+    Les embeddings sont indexés par (nom du modèle, empreinte du texte
+    normalisé) : un répertoire par modèle contient deux tableaux NumPy,
+    keys.npy (empreintes de 16 octets, uint8) et vectors.npy (float32), alignés
+    ligne à ligne.
+    """
+
+    def __init__(self, cache_dir: str, model_name: str):
+        self.model_name = model_name
+        slug = re.sub(r"[^A-Za-z0-9_.-]+", "__", model_name)
+        self.directory = os.path.join(cache_dir, slug)
+        self.keys_path = os.path.join(self.directory, "keys.npy")
+        self.vectors_path = os.path.join(self.directory, "vectors.npy")
+
+        self.keys = np.zeros((0, 16), dtype=np.uint8)
+        self.vectors = None
+        self.rows = {}
+        self._pending_keys = []
+        self._pending_vectors = []
+
+        if os.path.exists(self.keys_path) and os.path.exists(self.vectors_path):
+            self.keys = np.load(self.keys_path)
+            self.vectors = np.load(self.vectors_path)
+            self.rows = {key.tobytes(): row for row, key in enumerate(self.keys)}
+
+    def __len__(self):
+        return len(self.rows)
+
+    def get(self, key: bytes) -> Optional[np.ndarray]:
+        """Renvoie l'embedding associé à une empreinte, ou None"""
+        row = self.rows.get(key)
+        if row is None:
+            return None
+        if row < len(self.keys):
+            return self.vectors[row]
+        return self._pending_vectors[row - len(self.keys)]
+
+    def put(self, key: bytes, vector: np.ndarray):
+        """Ajoute un embedding (écrit sur disque lors de save)"""
+        if key in self.rows:
+            return
+        self.rows[key] = len(self.keys) + len(self._pending_keys)
+        self._pending_keys.append(key)
+        self._pending_vectors.append(np.asarray(vector, dtype="float32"))
+
+    def save(self):
+        """Ajoute les nouveaux embeddings aux tableaux sur disque"""
+        if not self._pending_keys:
+            return
+        new_keys = np.frombuffer(b"".join(self._pending_keys), dtype=np.uint8)
+        new_keys = new_keys.reshape(-1, 16)
+        new_vectors = np.vstack(self._pending_vectors).astype("float32")
+        if self.vectors is None:
+            self.keys, self.vectors = new_keys, new_vectors
+        else:
+            self.keys = np.concatenate([self.keys, new_keys])
+            self.vectors = np.vstack([self.vectors, new_vectors])
+        self._pending_keys, self._pending_vectors = [], []
+
+        os.makedirs(self.directory, exist_ok=True)
+        np.save(self.keys_path, self.keys)
+        np.save(self.vectors_path, self.vectors)
 
 
 class Vectorizer:
-    def __init__(self, model_name="dangvantuan/sentence-camembert-base"):
-        """Initialisation du modèle de vectorisation"""
-        self.model = SentenceTransformer(model_name)
+    def __init__(
+        self,
+        model_name="dangvantuan/sentence-camembert-base",
+        query_cache_size=0,
+        backend="torch",
+        onnx_dir=None,
+        onnx_quantized=True,
+        onnx_threads=0,
+    ):
+        """
+        Initialisation du modèle de vectorisation.
+
+        Args:
+            model_name: Modèle sentence-transformers
+            query_cache_size: Embeddings de requêtes gardés en cache (0 : pas de cache)
+            backend: "torch" (sentence-transformers) ou "onnx" (ONNX Runtime,
+                modèle exporté par export_onnx.py)
+            onnx_dir: Répertoire du modèle ONNX exporté
+            onnx_quantized: Utilise le modèle ONNX quantifié int8
+            onnx_threads: Threads ONNX Runtime (0 : tous les cœurs)
+        """
+        self.model_name = model_name
+        self.backend = backend
+        if backend == "onnx":
+            from modules.onnx_encoder import OnnxSentenceEncoder
+
+            self.model = OnnxSentenceEncoder(
+                onnx_dir, quantized=onnx_quantized, num_threads=onnx_threads
+            )
+            if self.model.model_name != model_name:
+                print(
+                    f"Attention: modèle ONNX exporté depuis {self.model.model_name}, "
+                    f"différent de {model_name}"
+                )
+            # Les vecteurs diffèrent légèrement de ceux de PyTorch : cache distinct
+            self.cache_name = f"{model_name}@onnx" + (
+                "-int8" if self.model.quantized else ""
+            )
+        else:
+            # Import différé : sentence-transformers (et PyTorch) ne sont chargés
+            # que si ce moteur est utilisé
+            from sentence_transformers import SentenceTransformer
+
+            self.model = SentenceTransformer(model_name)
+            self.cache_name = model_name
+        # Statistiques de la dernière vectorisation de chunks
+        self.last_stats = {"reused": 0, "computed": 0}
+        # Cache des embeddings de requêtes, par texte normalisé
+        self.query_cache = None
+        if query_cache_size > 0:
+            self.query_cache = QueryEmbeddingCache(
+                self.model.get_sentence_embedding_dimension(), query_cache_size
+            )
+
+    def encode_texts(
+        self,
+        texts: List[str],
+        batch_size: int = 32,
+        num_processes: int = 0,
+        show_progress: bool = False,
+    ) -> np.ndarray:
+        """
+        Encode une liste de textes par lots et renvoie une matrice normalisée (float32).
+
+        Les textes sont triés par longueur décroissante avant l'encodage afin
+        que chaque lot regroupe des textes de taille proche (moins de padding),
+        puis les embeddings sont remis dans l'ordre d'origine.
+
+        Args:
+            texts: Textes à encoder
+            batch_size: Taille des lots envoyés au modèle
+            num_processes: Nombre de processus d'encodage (0 ou 1 : processus courant)
+            show_progress: Affiche la progression de l'encodage
+        """
+        if not texts:
+            dimension = self.model.get_sentence_embedding_dimension()
+            return np.zeros((0, dimension), dtype="float32")
+
+        order = np.argsort([-len(text) for text in texts], kind="stable")
+        sorted_texts = [texts[i] for i in order]
+
+        # ONNX Runtime répartit déjà chaque lot sur tous les cœurs
+        if num_processes > 1 and self.backend == "torch":
+            sorted_embeddings = self._encode_multi_process(
+                sorted_texts, batch_size, num_processes, show_progress
+            )
+        else:
+            sorted_embeddings = self.model.encode(
+                sorted_texts,
+                batch_size=batch_size,
+                show_progress_bar=show_progress,
+                convert_to_numpy=True,
+            )
+
+        embeddings = np.empty(sorted_embeddings.shape, dtype="float32")
+        embeddings[order] = sorted_embeddings
+
+        # Normalisation de tous les vecteurs en une seule opération
+        embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+        return embeddings
+
+    def _encode_multi_process(
+        self,
+        texts: List[str],
+        batch_size: int,
+        num_processes: int,
+        show_progress: bool,
+    ) -> np.ndarray:
+        """Encodage réparti sur plusieurs processus CPU"""
+        pool = self.model.start_multi_process_pool(
+            target_devices=["cpu"] * num_processes
+        )
+        try:
+            # Découpage en segments pour pouvoir suivre la progression
+            segment_size = batch_size * num_processes * 4
+            segments = []
+            for start in range(0, len(texts), segment_size):
+                segment = texts[start : start + segment_size]
+                segments.append(
+                    self.model.encode_multi_process(
+                        segment, pool, batch_size=batch_size
+                    )
+                )
+                if show_progress:
+                    done = min(start + segment_size, len(texts))
+                    print(f"  {done}/{len(texts)} textes vectorisés")
+            return np.vstack(segments)
+        finally:
+            self.model.stop_multi_process_pool(pool)
 
-    def vectorize_chunks(self, chunks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    def vectorize_chunks(
+        self,
+        chunks: List[Dict[str, Any]],
+        batch_size: int = 32,
+        num_processes: int = 0,
+        show_progress: bool = True,
+        store: Optional[EmbeddingStore] = None,
+    ) -> List[Dict[str, Any]]:
         """
         Vectorisation des chunks reprise depuis la base de connaissance fournie.
+        L'encodage est fait par lots (voir encode_texts). Si un EmbeddingStore
+        est fourni, seuls les chunks absents du cache sont encodés.
         """
+        embeddings = [None] * len(chunks)
+        missing = []
+        digests = []
+        for i, chunk in enumerate(chunks):
+            digest = text_digest(chunk["text"]) if store is not None else None
+            digests.append(digest)
+            cached = store.get(digest) if store is not None else None
+            if cached is None:
+                missing.append(i)
+            else:
+                embeddings[i] = cached
+
+        computed = self.encode_texts(
+            [chunks[i]["text"] for i in missing],
+            batch_size=batch_size,
+            num_processes=num_processes,
+            show_progress=show_progress,
+        )
+        for i, embedding in zip(missing, computed):
+            embeddings[i] = embedding
+            if store is not None:
+                store.put(digests[i], embedding)
+
+        self.last_stats = {
+            "reused": len(chunks) - len(missing),
+            "computed": len(missing),
+        }
+
         vectors = []
-        for chunk in chunks:
-            text = chunk["text"]
-            embedding = self.model.encode(text)
-            embedding = embedding / np.linalg.norm(embedding)
+        for chunk, embedding in zip(chunks, embeddings):
             chunk["embedding"] = embedding
             vectors.append(chunk)
         return vectors
 
     def vectorize_query(self, query: str) -> np.ndarray:
         """Vectorisation d'une requête utilisateur"""
+        if self.query_cache is not None:
+            cached = self.query_cache.get(query)
+            if cached is not None:
+                return cached
         embedding = self.model.encode(query).astype("float32")
-        return embedding / np.linalg.norm(embedding)
+        embedding = embedding / np.linalg.norm(embedding)
+        if self.query_cache is not None:
+            self.query_cache.put(query, embedding)
+        return embedding
+
+    def vectorize_queries(self, queries: List[str], lookup: bool = True) -> np.ndarray:
+        """
+        Vectorisation d'un lot de requêtes en un seul appel au modèle.
+        Seules les requêtes absentes du cache sont encodées ; lookup=False
+        encode toutes les requêtes (déjà cherchées dans le cache par l'appelant)
+        et met les résultats en cache.
+        """
+        if self.query_cache is None:
+            embeddings = self.model.encode(queries).astype("float32")
+            norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+            return embeddings / norms
+
+        cached = [self.query_cache.get(query) if lookup else None for query in queries]
+        missing = [i for i, embedding in enumerate(cached) if embedding is None]
+        if not missing:
+            return np.stack(cached)
+
+        computed = self.model.encode([queries[i] for i in missing]).astype("float32")
+        computed /= np.linalg.norm(computed, axis=1, keepdims=True)
+        embeddings = np.empty((len(queries), computed.shape[1]), dtype="float32")
+        for i, embedding in enumerate(cached):
+            if embedding is not None:
+                embeddings[i] = embedding
+        for i, embedding in zip(missing, computed):
+            embeddings[i] = embedding
+            self.query_cache.put(queries[i], embedding)
+        return embeddings
+
+
+class EmbeddingBatcher:
+    """
+    Regroupement dynamique des vectorisations de requêtes concurrentes.
+
+    Les requêtes soumises sont placées dans une file ; un thread dédié prend
+    la première et celles déjà en attente ; si d'autres requêtes étaient en
+    attente, il attend au plus max_wait secondes que le lot se complète
+    (jusqu'à max_batch_size). Une requête isolée est encodée aussitôt. Le lot
+    est encodé en un seul appel au modèle et le Future de chaque appelant est
+    résolu. Les requêtes arrivées pendant un encodage forment le lot suivant.
+    """
+
+    def __init__(self, vectorizer, max_batch_size: int = 16, max_wait: float = 0.005):
+        """
+        Args:
+            vectorizer: Vectorizer utilisé pour l'encodage (vectorize_queries)
+            max_batch_size: Nombre maximal de requêtes encodées ensemble
+            max_wait: Attente maximale (secondes) de requêtes supplémentaires
+                lorsque plusieurs requêtes sont en attente (0 : lot des seules
+                requêtes en attente)
+        """
+        self.vectorizer = vectorizer
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+
+        self.batches = 0
+        self.queries = 0
+        self.largest_batch = 0
+        self.queue_wait_total = 0.0
+        self.queue_wait_max = 0.0
+        self.encode_time_total = 0.0
+
+        self._thread = threading.Thread(
+            target=self._run, name="embedding-batcher", daemon=True
+        )
+        self._thread.start()
+
+    def submit(self, query: str) -> Future:
+        """
+        Soumet une requête ; le Future renvoie son embedding normalisé.
+        Une requête présente dans le cache du vectorizer est résolue aussitôt.
+        """
+        future = Future()
+        if self.vectorizer.query_cache is not None:
+            cached = self.vectorizer.query_cache.get(query)
+            if cached is not None:
+                future.set_result(cached)
+                return future
+        self._queue.put((query, future, time.perf_counter()))
+        return future
+
+    def _take_pending(self, batch: List) -> bool:
+        """
+        Ajoute au lot les requêtes déjà en file, sans attendre.
+        Renvoie False si l'arrêt a été demandé.
+        """
+        while len(batch) < self.max_batch_size:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return True
+            if item is None:
+                self._queue.put(None)
+                return False
+            batch.append(item)
+        return True
+
+    def _collect(self, first) -> List:
+        """
+        Complète un lot avec les requêtes en file, puis, si d'autres requêtes
+        sont arrivées en même temps (charge concurrente), avec celles arrivant
+        avant l'échéance. Une requête isolée est encodée sans attente.
+        """
+        batch = [first]
+        if not self._take_pending(batch) or len(batch) == 1:
+            return batch
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            try:
+                if timeout > 0:
+                    item = self._queue.get(timeout=timeout)
+                else:
+                    item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                # Arrêt demandé : le lot courant est encore traité
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch = self._collect(first)
+            queries = [query for query, _, _ in batch]
+            futures = [future for _, future, _ in batch]
+
+            started = time.perf_counter()
+            waits = [started - submitted for _, _, submitted in batch]
+            try:
+                embeddings = self.vectorizer.vectorize_queries(queries, lookup=False)
+            except Exception as e:
+                for future in futures:
+                    future.set_exception(e)
+                continue
+            encode_time = time.perf_counter() - started
+
+            with self._lock:
+                self.batches += 1
+                self.queries += len(batch)
+                self.largest_batch = max(self.largest_batch, len(batch))
+                self.queue_wait_total += sum(waits)
+                self.queue_wait_max = max(self.queue_wait_max, max(waits))
+                self.encode_time_total += encode_time
+            for future, embedding in zip(futures, embeddings):
+                future.set_result(embedding)
+
+    def stats(self) -> Dict[str, Any]:
+        """Taille des lots, attente en file et durée d'encodage (millisecondes)"""
+        with self._lock:
+            batches = max(self.batches, 1)
+            queries = max(self.queries, 1)
+            return {
+                "batches": self.batches,
+                "queries": self.queries,
+                "mean_batch_size": self.queries / batches,
+                "largest_batch": self.largest_batch,
+                "mean_queue_wait_ms": self.queue_wait_total / queries * 1000,
+                "max_queue_wait_ms": self.queue_wait_max * 1000,
+                "mean_encode_ms": self.encode_time_total / batches * 1000,
+                "pending": self._queue.qsize(),
+            }
+
+    def close(self):
+        """Arrête le thread après traitement des requêtes déjà soumises"""
+        self._queue.put(None)
+        self._thread.join(timeout=5)
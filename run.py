@@ -5,6 +5,8 @@ import argparse
 import webbrowser
 import signal
 import sys
+import urllib.request
+from modules.startup import process_memory
 
 api_process = None
 ui_process = None
@@ -45,6 +47,54 @@ def check_service_ready(port, max_attempts=20, wait_time=2):
     return False
 
 
+def wait_until_ready(port, max_attempts=60, wait_time=2):
+    """Attend la fin du préchauffage de l'API (endpoint /ready)"""
+    for _ in range(max_attempts):
+        try:
+            with urllib.request.urlopen(f"http://{host}:{port}/ready", timeout=2):
+                return True
+        except Exception:
+            time.sleep(wait_time)
+    return False
+
+
+def child_pids(pid):
+    """Processus descendants (workers uvicorn) d'un processus, via /proc"""
+    children = []
+    try:
+        for task in os.listdir(f"/proc/{pid}/task"):
+            with open(f"/proc/{pid}/task/{task}/children", "r") as f:
+                children.extend(int(child) for child in f.read().split())
+    except OSError:
+        return []
+    return children + [pid for child in children for pid in child_pids(child)]
+
+
+def print_worker_memory(pid):
+    """
+    Mémoire de chaque processus de l'API, pour dimensionner les conteneurs :
+    la somme des PSS compte une seule fois les pages partagées (index FAISS
+    et vecteurs projetés en mémoire, bibliothèques).
+    """
+    rows = [process_memory(p) for p in [pid] + child_pids(pid)]
+    rows = [row for row in rows if row]
+    if not rows:
+        print("Mémoire des workers indisponible (/proc requis)")
+        return
+    print(
+        f"\n{'processus':>10} {'RSS (Mo)':>10} {'PSS (Mo)':>10} {'partagée':>10} {'privée':>10}"
+    )
+    for row in rows:
+        print(
+            f"{row['pid']:>10} {row['rss_mb']:>10.1f} {row['pss_mb']:>10.1f} "
+            f"{row['shared_mb']:>10.1f} {row['private_mb']:>10.1f}"
+        )
+    print(
+        f"{'total':>10} {sum(row['rss_mb'] for row in rows):>10.1f} "
+        f"{sum(row['pss_mb'] for row in rows):>10.1f}"
+    )
+
+
 if __name__ == "__main__":
     # Configurer l'analyseur d'arguments
     parser = argparse.ArgumentParser(description="Lanceur de l'application chatbot-RAG")
@@ -62,6 +112,17 @@ if __name__ == "__main__":
     parser.add_argument(
         "--ui-port", type=int, default=7860, help="Port pour l'interface (défaut: 7860)"
     )
+    parser.add_argument(
+        "--production",
+        action="store_true",
+        help="Servir l'API sans rechargement automatique (implicite avec --workers)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Nombre de workers de l'API en production (défaut: API_WORKERS ou 1)",
+    )
     parser.add_argument(
         "--no-open",
         action="store_true",
@@ -83,9 +144,18 @@ if __name__ == "__main__":
     if not args.ui_only:
         print(f"Démarrage de l'API sur le port {args.api_port}...")
         api_cmd = [sys.executable, "app.py"]
-        api_process = subprocess.Popen(
-            api_cmd, env={**os.environ, "PORT": str(args.api_port)}
-        )
+        api_env = {**os.environ, "PORT": str(args.api_port)}
+        production = args.production or args.workers is not None
+        if production:
+            workers = args.workers or int(os.getenv("API_WORKERS", 1))
+            api_env["API_PRODUCTION"] = "true"
+            api_env["API_WORKERS"] = str(workers)
+            # Répartit les cœurs entre les workers (encodage, recherche FAISS)
+            api_env.setdefault(
+                "OMP_NUM_THREADS", str(max(1, (os.cpu_count() or 1) // workers))
+            )
+            print(f"Mode production: {workers} worker(s), sans rechargement")
+        api_process = subprocess.Popen(api_cmd, env=api_env)
 
         # Attendre que l'API soit prête
         if not check_service_ready(args.api_port):
@@ -95,6 +165,14 @@ if __name__ == "__main__":
             sys.exit(1)
         print(f"API démarrée sur http://localhost:{args.api_port}")
 
+        if production:
+            if wait_until_ready(args.api_port):
+                # Laisse les autres workers terminer leur préchauffage
+                time.sleep(5)
+                print_worker_memory(api_process.pid)
+            else:
+                print("Le préchauffage de l'API n'est pas terminé")
+
     # Démarrer l'interface si demandée
     if not args.api_only:
         print(f"Démarrage de l'interface sur le port {args.ui_port}...")
@@ -0,0 +1,92 @@
+import sys
+import time
+import types
+
+import numpy as np
+import pytest
+
+from modules.reranker import CrossEncoderReranker
+
+
+class SlowCrossEncoder:
+    """
+    Cross-encoder factice dont la durée de calcul est réglable. Comme
+    CrossEncoder.predict pour un modèle à une seule sortie, il renvoie des
+    probabilités (sigmoïde déjà appliquée).
+    """
+
+    delay = 0.0
+
+    def __init__(self, model_name, max_length=512):
+        self.calls = 0
+
+    @staticmethod
+    def probability(text):
+        # Probabilité décroissante avec la longueur du passage
+        return 1 / (1 + np.exp(len(text) / 10 - 2))
+
+    def predict(self, pairs, batch_size=32, show_progress_bar=False):
+        self.calls += 1
+        time.sleep(self.delay)
+        return np.array([self.probability(text) for _, text in pairs], dtype=np.float32)
+
+
+@pytest.fixture
+def reranker(monkeypatch):
+    module = types.ModuleType("sentence_transformers")
+    module.CrossEncoder = SlowCrossEncoder
+    monkeypatch.setitem(sys.modules, "sentence_transformers", module)
+    reranker = CrossEncoderReranker("factice", time_budget=0.05)
+    yield reranker
+    reranker.close()
+
+
+def candidates(i):
+    return [{"text": f"passage long {i} " * 3}, {"text": f"court {i}"}]
+
+
+def test_rerank_orders_by_cross_encoder_score(reranker):
+    results = reranker.rerank("question", candidates(0), top_k=2)
+    assert [chunk["text"] for chunk in results] == [
+        "court 0",
+        "passage long 0 " * 3,
+    ]
+
+
+def test_rerank_score_is_model_probability(reranker):
+    results = reranker.rerank("question", candidates(0), top_k=2)
+    for chunk in results:
+        expected = SlowCrossEncoder.probability(chunk["text"])
+        assert chunk["rerank_score"] == pytest.approx(expected, rel=1e-6)
+    # Scores en cache : même valeur sans nouvel appel au modèle
+    calls = reranker.model.calls
+    cached = reranker.rerank("question", candidates(0), top_k=2)
+    assert reranker.model.calls == calls
+    assert [chunk["rerank_score"] for chunk in cached] == [
+        chunk["rerank_score"] for chunk in results
+    ]
+
+
+def test_reranking_recovers_after_repeated_timeouts(reranker):
+    reranker.model.delay = 0.2
+    for i in range(8):
+        results = reranker.rerank(f"question {i}", candidates(i), top_k=2)
+        # Budget dépassé : ordre du bi-encoder, sans score de ré-ordonnancement
+        assert [chunk["text"] for chunk in results] == [
+            chunk["text"] for chunk in candidates(i)
+        ]
+        assert "rerank_score" not in results[0]
+    assert reranker.stats()["timeouts"] == 8
+
+    # Seul le calcul déjà démarré se termine : les calculs en attente sont abandonnés
+    reranker.model.delay = 0.0
+    time.sleep(0.5)
+    assert reranker.stats()["dropped"] >= 5
+
+    results = reranker.rerank("nouvelle question", candidates(99), top_k=2)
+    assert [chunk["text"] for chunk in results] == [
+        "court 99",
+        "passage long 99 " * 3,
+    ]
+    assert "rerank_score" in results[0]
+    assert reranker.stats()["timeouts"] == 8